@@ -9,27 +9,92 @@ Es el punto de entreda para los usuarios"""
 
 from __future__ import annotations
 
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, TypeVar
 
 import typer
+from dropbox import Dropbox, DropboxOAuth2FlowNoRedirect
+from dropbox.exceptions import ApiError, AuthError
 from rich import print
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    Progress,
+    TaskID,
+    TextColumn,
+    TimeRemainingColumn,
+    TransferSpeedColumn,
+)
 from rich.table import Table
 
-from dropbox import Dropbox, DropboxOAuth2FlowNoRedirect
-from dropbox.exceptions import AuthError
-
+from .columnar import (
+    COMPRESSION,
+    HASH_COLUMNS,
+    INVENTORY_COLUMNS,
+    ROW_GROUP_SIZE,
+    ColumnarWriter,
+    check_compression,
+    export_case,
+    output_file,
+    require_pyarrow,
+)
 from .config import Settings
-from .custody import ChainOfCustody, CustodyEntry
-from .explorer import InventoryItem, list_inventory, save_inventory_csv, save_inventory_json
-from .downloader import download_files
-from .logging_utils import setup_logging
-from .reports import generate_pdf_report, write_csv
+from .crypto import TokenBundle, TokenStore
+from .custody import BrokenChainError, ChainOfCustody, CustodyEntry, verify_chain
+from .delta import CarryOver, DeltaTracker, InventoryDiff, apply_listing_changes, load_case
+from .downloader import DEDUP_HARDLINK, DEDUP_REFERENCE, SegmentPolicy, iter_download_files
+from .explorer import (
+    ENGINE_LIST,
+    InventoryItem,
+    InventoryWriter,
+    discover_inventory,
+    iter_inventory_csv,
+    iter_listing_changes,
+    load_cursors,
+    save_cursors,
+    tee_inventory,
+)
+from .filters import FilterSpec, normalize_ext, parse_date, parse_size
+from .hashcache import CACHE_FILE, HashCache
+from .index import INDEX_FILE, QUERY_COLUMNS, CaseIndex, rebuild_index
+from .integrity import HASH_RECORD_FIELDS, HashRecord, hash_file_multi
+from .journal import AcquisitionJournal
+from .logging_utils import setup_logging, shutdown_logging
+from .merkle import (
+    MANIFEST_FILE,
+    build_case_tree,
+    compare_cases,
+    find_leaf,
+    leaf_hash,
+    recorded_root,
+    verify_proof,
+    write_case_manifest,
+)
+from .metrics import METRICS_FILE, AcquisitionMetrics
+from .reports import generate_pdf_report, write_csv, write_json
+from .scheduler import AdaptiveScheduler
 from .session import Session
-from .utils import utc_now_iso
-from .crypto import TokenStore, TokenBundle
+from .utils import prefetch, utc_now_iso
+from .verify import record_path, verify_case
+
+T = TypeVar("T")
+# Registros de hash: HashRecord o filas de hashes.csv
+R = TypeVar("R", bound=Mapping[str, Any])
+
+# Columnas de `afrec query` en la tabla de consola (csv/json incluyen todas)
+QUERY_TABLE_COLUMNS = ["path_display", "size", "server_modified", "sha256", "dropbox_hash_match"]
 
 app = typer.Typer(help="AFREC - Adquisición Forense de Recursos en la Nube (Dropbox)")
+merkle_app = typer.Typer(help="Manifiesto Merkle del caso: construir, probar inclusión, comparar")
+app.add_typer(merkle_app, name="merkle")
+custody_app = typer.Typer(help="Cadena de custodia del caso: verificar los enlaces de hashes")
+app.add_typer(custody_app, name="custody")
 
 
 @app.command()
@@ -46,7 +111,9 @@ def auth(
         raise typer.BadParameter("Faltan credenciales DROPBOX_APP_KEY / DROPBOX_APP_SECRET")
     flow = DropboxOAuth2FlowNoRedirect(app_key, app_secret, token_access_type="offline")
     authorize_url = flow.start()
-    print("[bold]1)[/bold] Abra la siguiente URL, autorice la app y copie el código de autorización:")
+    print(
+        "[bold]1)[/bold] Abra la siguiente URL, autorice la app y copie el código de autorización:"
+    )
     print(authorize_url)
     code = typer.prompt("Código de autorización")
     oauth_result = flow.finish(code)
@@ -64,19 +131,76 @@ def auth(
 @app.command()
 def preview(
     path: str = typer.Option("/", help="Carpeta raíz de Dropbox a analizar"),
-    ext: Optional[str] = typer.Option(None, help="Extensiones separadas por coma, p.ej. .pdf,.docx"),
+    ext: Optional[str] = typer.Option(
+        None, help="Extensiones separadas por coma, p.ej. .pdf,.docx"
+    ),
     date_from: Optional[str] = typer.Option(None, help="Fecha desde (YYYY-MM-DD o ISO8601)"),
     date_to: Optional[str] = typer.Option(None, help="Fecha hasta (YYYY-MM-DD o ISO8601)"),
-    save: bool = typer.Option(True, help="Guardar inventario en casos/SESSION/inventario.(json|csv)"),
+    include: Optional[List[str]] = typer.Option(
+        None, help="Glob sobre la ruta completa a incluir (repetible), p.ej. '*/Facturas/*'"
+    ),
+    exclude: Optional[List[str]] = typer.Option(None, help="Glob de rutas a excluir (repetible)"),
+    include_regex: Optional[List[str]] = typer.Option(
+        None, help="Expresión regular que debe aparecer en la ruta (repetible)"
+    ),
+    exclude_regex: Optional[List[str]] = typer.Option(
+        None, help="Expresión regular de rutas a excluir (repetible)"
+    ),
+    min_size: Optional[str] = typer.Option(None, help="Tamaño mínimo, p.ej. 10K, 5MB"),
+    max_size: Optional[str] = typer.Option(None, help="Tamaño máximo, p.ej. 2GB"),
+    client_date_from: Optional[str] = typer.Option(
+        None, help="Fecha de modificación en el cliente desde (YYYY-MM-DD o ISO8601)"
+    ),
+    client_date_to: Optional[str] = typer.Option(
+        None, help="Fecha de modificación en el cliente hasta (YYYY-MM-DD o ISO8601)"
+    ),
+    save: bool = typer.Option(
+        True, help="Guardar inventario en casos/SESSION/inventario.(json|csv)"
+    ),
+    partitions: int = typer.Option(
+        1, min=1, help="Subcarpetas de primer nivel listadas en paralelo"
+    ),
+    delta: Optional[Path] = typer.Option(
+        None, help="Caso anterior: solo pedir los cambios desde sus cursores guardados"
+    ),
+    discovery: str = typer.Option(
+        ENGINE_LIST,
+        help="Descubrimiento: list (listado completo), search (índice de búsqueda, puede no "
+        "reflejar cambios recientes) o auto (search con pocas extensiones)",
+    ),
 ):
     """Muestra y (opcionalmente) guarda el inventario lógico de la carpeta especificada."""
     settings = Settings.load()
     client, actor, fingerprint = ensure_client(settings)
 
+    state: Optional[Dict[str, Any]] = None
+    if delta is not None:
+        if not (delta / "cursores.json").exists() or not (delta / "inventario.csv").exists():
+            raise typer.BadParameter(f"{delta} no contiene cursores.json e inventario.csv")
+        # Los filtros deben ser los mismos del listado que produjo los cursores
+        state = load_cursors(delta / "cursores.json")
+        path = state["root"]
+        spec = _saved_filter_spec(state)
+    else:
+        spec = _filter_spec(
+            ext,
+            date_from,
+            date_to,
+            include=include,
+            exclude=exclude,
+            include_regex=include_regex,
+            exclude_regex=exclude_regex,
+            min_size=min_size,
+            max_size=max_size,
+            client_date_from=client_date_from,
+            client_date_to=client_date_to,
+        )
+
     session = Session.start(actor=actor)
     case_dir = settings.cases_dir / f"{session.started_at[:10]}_{session.id[:8]}"
     inventory_json = case_dir / "inventario.json"
     inventory_csv = case_dir / "inventario.csv"
+    changes_json = case_dir / "cambios.json"
     log_file = case_dir / "log.txt"
     log_file.parent.mkdir(parents=True, exist_ok=True)
     logger = setup_logging(log_file)
@@ -87,57 +211,224 @@ def preview(
         "actor": actor,
         "ip": session.ip_address,
         "path": path,
+        "delta": str(delta) if delta else None,
     },
 )
 
 
-    exts = [e.strip() for e in ext.split(",")] if ext else None
-    items = list_inventory(client, root=path, exts=exts, date_from=date_from, date_to=date_to)
+    cursors: List[Dict[str, Any]] = []
+    diff: Optional[InventoryDiff] = None
+    items: Iterable[InventoryItem]
+    engine = ENGINE_LIST
+    if state is not None and delta is not None:
+        changes = iter_listing_changes(
+            client, state["cursors"], AdaptiveScheduler(max_concurrency=1), cursors
+        )
+        try:
+            items, diff = apply_listing_changes(
+                iter_inventory_csv(delta / "inventario.csv"), changes, filters=spec
+            )
+        except ApiError as e:
+            raise typer.BadParameter(
+                f"Los cursores de {delta} ya no son válidos ({e.error}); "
+                "ejecute un preview completo"
+            ) from e
+    else:
+        engine, items = _discover(client, path, spec, discovery, partitions, cursors)
+
+    # Solo se retienen en memoria las filas que se muestran; el resto va directo a disco
+    shown: List[InventoryItem] = []
+    count = 0
+    with ExitStack() as stack:
+        if save:
+            writer = stack.enter_context(InventoryWriter(inventory_json, inventory_csv))
+            index = stack.enter_context(CaseIndex(case_dir / INDEX_FILE))
+            items = _indexed(tee_inventory(items, writer), index.add_item)
+        for i in items:
+            if len(shown) < 50:
+                shown.append(i)
+            count += 1
 
-    table = Table(title=f"Inventario de {path} ({len(items)} archivos)")
+    table = Table(title=f"Inventario de {path} ({count} archivos)")
     table.add_column("path")
     table.add_column("size")
     table.add_column("server_modified")
-    for i in items[:50]:
+    for i in shown:
         table.add_row(i.path_display, str(i.size), i.server_modified)
     print(table)
-    if len(items) > 50:
-        print(f"... mostrando 50 de {len(items)} elementos")
+    if count > 50:
+        print(f"... mostrando 50 de {count} elementos")
+
+    if diff is not None:
+        print(
+            "Cambios desde {}: {added} nuevos, {modified} modificados, {deleted} eliminados, "
+            "{unchanged} sin cambios".format(delta, **diff.counts())
+        )
 
     if save:
         session.save(case_dir / "session.json")
-        save_inventory_json(items, inventory_json)
-        save_inventory_csv(items, inventory_csv)
-        ChainOfCustody(case_dir / "cadena_custodia.jsonl").append(
-            CustodyEntry.create(actor=actor, action="PREVIEW", path=path, count=len(items))
-        )
+        details: Dict[str, Any] = {
+            "path": path,
+            "count": count,
+            "discovery": engine,
+            "filters": spec.to_dict(),
+        }
+        if engine == ENGINE_LIST:
+            save_cursors(_cursor_state(path, spec, cursors), case_dir / "cursores.json")
+        if diff is not None:
+            write_json({"delta_of": str(delta), **diff.to_report()}, changes_json)
+            details.update(
+                delta_of=str(delta), counts=diff.counts(), changes_file=changes_json.name
+            )
+        with _open_custody(case_dir) as custody:
+            custody.append(CustodyEntry.create(actor=actor, action="PREVIEW", **details))
+        with CaseIndex(case_dir / INDEX_FILE) as index:
+            index.sync_custody(custody.file)
         print(f"Inventario guardado en: {inventory_json} y {inventory_csv}")
     logger.info(
     "end_preview",
-    extra={"count": len(items), "session_id": session.id},
+    extra={"count": count, "session_id": session.id},
 )
+    shutdown_logging()
 
 
 
 @app.command()
 def acquire(
     path: str = typer.Option("/", help="Carpeta raíz de Dropbox a adquirir"),
-    ext: Optional[str] = typer.Option(None, help="Extensiones separadas por coma, p.ej. .pdf,.docx"),
+    ext: Optional[str] = typer.Option(
+        None, help="Extensiones separadas por coma, p.ej. .pdf,.docx"
+    ),
     date_from: Optional[str] = typer.Option(None, help="Fecha desde (YYYY-MM-DD o ISO8601)"),
     date_to: Optional[str] = typer.Option(None, help="Fecha hasta (YYYY-MM-DD o ISO8601)"),
+    include: Optional[List[str]] = typer.Option(
+        None, help="Glob sobre la ruta completa a incluir (repetible), p.ej. '*/Facturas/*'"
+    ),
+    exclude: Optional[List[str]] = typer.Option(None, help="Glob de rutas a excluir (repetible)"),
+    include_regex: Optional[List[str]] = typer.Option(
+        None, help="Expresión regular que debe aparecer en la ruta (repetible)"
+    ),
+    exclude_regex: Optional[List[str]] = typer.Option(
+        None, help="Expresión regular de rutas a excluir (repetible)"
+    ),
+    min_size: Optional[str] = typer.Option(None, help="Tamaño mínimo, p.ej. 10K, 5MB"),
+    max_size: Optional[str] = typer.Option(None, help="Tamaño máximo, p.ej. 2GB"),
+    client_date_from: Optional[str] = typer.Option(
+        None, help="Fecha de modificación en el cliente desde (YYYY-MM-DD o ISO8601)"
+    ),
+    client_date_to: Optional[str] = typer.Option(
+        None, help="Fecha de modificación en el cliente hasta (YYYY-MM-DD o ISO8601)"
+    ),
+    workers: int = typer.Option(1, min=1, help="Descargas concurrentes (1 = secuencial)"),
+    stream: bool = typer.Option(True, help="Hashear mientras se descarga (sin releer de disco)"),
+    segment_threshold_mb: int = typer.Option(
+        512, min=0, help="Archivos mayores a este tamaño (MB) se bajan por segmentos; 0 = nunca"
+    ),
+    segment_workers: int = typer.Option(4, min=1, help="Segmentos paralelos por archivo grande"),
+    dedup: str = typer.Option(
+        "none", help="Deduplicación por content_hash: none (por defecto), hardlink o reference"
+    ),
+    resume: Optional[Path] = typer.Option(
+        None, help="Reanudar la adquisición interrumpida de esta carpeta de caso"
+    ),
+    since_case: Optional[Path] = typer.Option(
+        None, help="Caso anterior: solo se descargan archivos nuevos o modificados desde entonces"
+    ),
+    partitions: int = typer.Option(
+        1, min=1, help="Subcarpetas de primer nivel listadas en paralelo"
+    ),
+    discovery: str = typer.Option(
+        ENGINE_LIST,
+        help="Descubrimiento: list (listado completo), search (índice de búsqueda, puede no "
+        "reflejar cambios recientes) o auto (search con pocas extensiones)",
+    ),
+    listing_queue: int = typer.Option(
+        10000, min=0, help="Elementos listados por delante de las descargas; 0 = sin solapar"
+    ),
+    pdf_annex: bool = typer.Option(
+        True, help="Incluir en el PDF el anexo con el hash de cada archivo"
+    ),
+    columnar: Optional[str] = typer.Option(
+        None, help="Escribir también inventario y hashes en parquet o arrow (requiere pyarrow)"
+    ),
+    progress: bool = typer.Option(True, help="Panel de progreso con throughput y ETA"),
+    prometheus_textfile: Optional[Path] = typer.Option(
+        None, help="Archivo .prom para el textfile collector de Prometheus (node_exporter)"
+    ),
 ):
     """Realiza la adquisición forense: descarga, hashes, reportes y cadena de custodia."""
+    if dedup not in ("none", DEDUP_HARDLINK, DEDUP_REFERENCE):
+        raise typer.BadParameter("--dedup debe ser hardlink, reference o none")
+    if columnar is not None:
+        _check_columnar(columnar)
+    if resume is not None and since_case is not None:
+        raise typer.BadParameter("--resume y --since-case no se pueden combinar")
     settings = Settings.load()
     client, actor, fingerprint = ensure_client(settings)
 
     session = Session.start(actor=actor)
-    case_dir = settings.cases_dir / f"{session.started_at[:10]}_{session.id[:8]}"
+    if resume is not None:
+        case_dir = resume
+        if not (case_dir / "adquisicion.json").exists() or not (case_dir / "session.json").exists():
+            raise typer.BadParameter(f"{case_dir} no contiene una adquisición previa reanudable")
+    else:
+        case_dir = settings.cases_dir / f"{session.started_at[:10]}_{session.id[:8]}"
     evidence_dir = case_dir / "evidence"
     hashes_csv = case_dir / "hashes.csv"
     log_file = case_dir / "log.txt"
     report_pdf = case_dir / "reporte.pdf"
     inventory_json = case_dir / "inventario.json"
     inventory_csv = case_dir / "inventario.csv"
+    changes_json = case_dir / "cambios.json"
+    params_json = case_dir / "adquisicion.json"
+    cursors_json = case_dir / "cursores.json"
+
+    requested = _filter_spec(
+        ext,
+        date_from,
+        date_to,
+        include=include,
+        exclude=exclude,
+        include_regex=include_regex,
+        exclude_regex=exclude_regex,
+        min_size=min_size,
+        max_size=max_size,
+        client_date_from=client_date_from,
+        client_date_to=client_date_to,
+    )
+    # Parámetros de la adquisición: permiten reanudar aunque el listado no haya terminado
+    if resume is not None:
+        with open(params_json, "r", encoding="utf-8") as fh:
+            params = json.load(fh)
+        spec = _saved_filter_spec(params)
+        conflicts = _resume_conflicts(params, spec, requested, path, discovery, dedup)
+        if conflicts:
+            raise typer.BadParameter(
+                "--resume continúa con los parámetros de adquisicion.json; no coinciden: "
+                + ", ".join(conflicts)
+            )
+        path = params["path"]
+        discovery = params.get("discovery_engine") or params.get("discovery", ENGINE_LIST)
+        dedup = params.get("dedup", dedup)
+        since_case = Path(params["since_case"]) if params.get("since_case") else None
+        if columnar is None and params.get("columnar"):
+            columnar = params["columnar"]
+            _check_columnar(columnar)
+    else:
+        spec = requested
+        params = {
+            "path": path,
+            "ext": ext,
+            "date_from": date_from,
+            "date_to": date_to,
+            "filters": spec.to_dict(),
+            "discovery": discovery,
+            "dedup": dedup,
+            "since_case": str(since_case) if since_case else None,
+            "columnar": columnar,
+            "inventario_completo": False,
+        }
+        write_json(params, params_json)
 
     log_file.parent.mkdir(parents=True, exist_ok=True)
     logger = setup_logging(log_file)
@@ -149,56 +440,740 @@ def acquire(
         "actor": actor,
         "ip": session.ip_address,
         "path": path,
+        "resume": str(resume) if resume else None,
+        "since_case": str(since_case) if since_case else None,
     },
     )
-    exts = [e.strip() for e in ext.split(",")] if ext else None
-    items = list_inventory(client, root=path, exts=exts, date_from=date_from, date_to=date_to)
-   
-    session.save(case_dir / "session.json")
-    save_inventory_json(items, inventory_json)
-    save_inventory_csv(items, inventory_csv)
+    custody = _open_custody(case_dir)
+    metrics = AcquisitionMetrics(session_id=session.id)
+
+    cursors: List[Dict[str, Any]] = []
 
-    raw_items = [i.__dict__ for i in items]
-    hash_records = download_files(client, raw_items, evidence_dir)
-    write_csv(hash_records, hashes_csv)
+    # Motor realmente usado (auto se resuelve al listar); al reanudar, el de la primera corrida
+    engine = params.get("discovery_engine", ENGINE_LIST)
+
+    def _delta_done(tracker: DeltaTracker) -> None:
+        # Se registra al terminar el listado, antes de las descargas: si la adquisición se
+        # interrumpe, la reanudación solo lo escribe si la corrida anterior no llegó a hacerlo
+        diff = tracker.finish()
+        logger.info("delta", extra={"since_case": str(since_case), **diff.counts()})
+        if changes_json.exists():
+            return
+        report = diff.to_report()
+        custody.append(
+            CustodyEntry.create(
+                actor=actor,
+                action="DELTA",
+                since_case=str(since_case),
+                counts=diff.counts(),
+                deleted=report["deleted"],
+                changes_file=changes_json.name,
+            )
+        )
+        write_json({"since_case": str(since_case), **report}, changes_json)
+
+    def _inventory_done() -> None:
+        if engine == ENGINE_LIST:
+            save_cursors(_cursor_state(path, spec, cursors), cursors_json)
+        params["inventario_completo"] = True
+        write_json(params, params_json)
+
+    with ExitStack() as stack:
+        if resume is not None:
+            # Se conservan la sesión original y, si quedó completo, el inventario original
+            case_session = Session.load(case_dir / "session.json")
+            custody.append(
+                CustodyEntry.create(
+                    actor=actor,
+                    action="RESUME",
+                    session_id=session.id,
+                    original_session_id=case_session.id,
+                    case_dir=str(case_dir),
+                )
+            )
+        else:
+            case_session = session
+            session.save(case_dir / "session.json")
+        # Si la adquisición se interrumpe, metrics.json queda con lo medido hasta entonces
+        stack.callback(metrics.write, case_dir)
+        # El índice se rehace completo en cada ejecución, igual que inventario y hashes.csv
+        index = stack.enter_context(CaseIndex(case_dir / INDEX_FILE))
+        index.reset()
+        if resume is not None and params["inventario_completo"]:
+            items: Iterable[InventoryItem] = _indexed(
+                iter_inventory_csv(inventory_csv), index.add_item
+            )
+        else:
+            writer = stack.enter_context(InventoryWriter(inventory_json, inventory_csv))
+            metrics.begin("listing")
+            engine, listing = _discover(
+                client, path, spec, discovery, partitions, cursors, metrics
+            )
+            logger.info("discovery", extra={"engine": engine})
+            params["discovery_engine"] = engine
+            write_json(params, params_json)
+            items = _indexed(tee_inventory(listing, writer), index.add_item)
+            items = _on_exhausted(items, _inventory_done)
+        if columnar is not None:
+            inv_columnar = stack.enter_context(ColumnarWriter(
+                output_file(case_dir, "inventario", columnar), INVENTORY_COLUMNS, columnar
+            ))
+            items = _indexed(items, inv_columnar.add_item)
+
+        carry: Optional[CarryOver] = None
+        if since_case is not None:
+            try:
+                prev_items, prev_records = load_case(since_case)
+            except FileNotFoundError as e:
+                raise typer.BadParameter(str(e)) from e
+            tracker = DeltaTracker(prev_items)
+            carry = CarryOver(since_case, prev_records)
+            items = _on_exhausted(_tracked(items, tracker), lambda: _delta_done(tracker))
+
+        items = _on_exhausted(_indexed(items, metrics.item_listed), metrics.listing_finished)
+        if listing_queue > 0:
+            # El listado avanza en su propio hilo mientras se descarga lo ya recibido
+            items = prefetch(items, maxsize=listing_queue, name="afrec-listing")
+
+        journal = stack.enter_context(AcquisitionJournal(case_dir / "journal.jsonl"))
+        records = iter_download_files(
+            client,
+            (i.to_dict() for i in items),
+            evidence_dir,
+            workers=workers,
+            stream=stream,
+            journal=journal,
+            segments=SegmentPolicy(
+                threshold=segment_threshold_mb * 1024 * 1024, workers=segment_workers
+            ),
+            dedup=None if dedup == "none" else dedup,
+            reuse=carry,
+            metrics=metrics,
+        )
+        counts = {"dedup": 0, "carried": 0}
+        records = _indexed(_counted(records, counts), index.add_record)
+        if columnar is not None:
+            hash_columnar = stack.enter_context(ColumnarWriter(
+                output_file(case_dir, "hashes", columnar), HASH_COLUMNS, columnar
+            ))
+            records = _indexed(records, hash_columnar.write)
+        labels = {"case": case_dir.name}
+        tick = stack.enter_context(
+            _progress_panel(metrics, progress, prometheus_textfile, labels)
+        )
+        with metrics.phase("download"):
+            written = write_csv(_indexed(records, tick), hashes_csv, headers=HASH_RECORD_FIELDS)
+    with metrics.phase("merkle"):
+        merkle_root = write_case_manifest(case_dir)["root"]
 
     summary = {
-        "archivos_en_inventario": len(items),
-        "archivos_descargados": len(hash_records),
+        "archivos_en_inventario": written,
+        "archivos_descargados": written - counts["dedup"] - counts["carried"],
+        "referencias_deduplicadas": counts["dedup"],
+        "trasladados_de_caso_anterior": counts["carried"],
         "ruta_evidencia": str(evidence_dir),
         "hashes_csv": str(hashes_csv),
+        # La raíz en dos líneas para que quepa en la columna del PDF
+        "raiz_merkle": f"{merkle_root[:32]}<br/>{merkle_root[32:]}" if merkle_root else "-",
         "fingerprint_token": fingerprint,
         "fecha_utc": utc_now_iso(),
     }
-    generate_pdf_report(report_pdf, summary, session.__dict__)
+    with metrics.phase("report"):
+        report_files = generate_pdf_report(
+            report_pdf,
+            summary,
+            case_session.__dict__,
+            hashes_csv=hashes_csv if pdf_annex else None,
+        )
+    metrics.write(case_dir)
+    if prometheus_textfile is not None:
+        metrics.write_prometheus(prometheus_textfile, labels)
 
-    ChainOfCustody(case_dir / "cadena_custodia.jsonl").append(
+    custody.append(
         CustodyEntry.create(
             actor=actor,
             action="ACQUIRE",
             path=path,
-            count=len(hash_records),
+            count=written,
             case_dir=str(case_dir),
+            resumed=resume is not None,
+            since_case=str(since_case) if since_case else None,
+            discovery=engine,
+            filters=spec.to_dict(),
+            merkle_root=merkle_root,
+            report_files=[f.name for f in report_files],
         )
     )
+    custody.close()
+    with CaseIndex(case_dir / INDEX_FILE) as index:
+        index.sync_custody(custody.file)
 
     print(f"[bold green]Adquisición completada.[/bold green] Carpeta del caso: {case_dir}")
     print(f"  - Inventario: {inventory_json.name}, {inventory_csv.name}")
-    print(f"  - Hashes: {hashes_csv.name}")
-    print(f"  - Reporte: {report_pdf.name}")
+    print(f"  - Hashes: {hashes_csv.name} (raíz Merkle {merkle_root})")
+    print(f"  - Reporte: {', '.join(f.name for f in report_files)}")
+    print(f"  - Métricas: {METRICS_FILE}")
     
     logger.info(
     "end_acquire",
-    extra={"count": len(items), "session_id": session.id},)
+    extra={"count": written, "session_id": session.id},)
+    shutdown_logging()
+
+
+@app.command()
+def query(
+    case_dir: Path = typer.Argument(..., help="Carpeta del caso a consultar"),
+    min_size: Optional[str] = typer.Option(None, help="Tamaño mínimo, p.ej. 100MB"),
+    max_size: Optional[str] = typer.Option(None, help="Tamaño máximo, p.ej. 2GB"),
+    date_from: Optional[str] = typer.Option(None, help="Modificado en el servidor desde"),
+    date_to: Optional[str] = typer.Option(None, help="Modificado en el servidor hasta"),
+    path_glob: Optional[str] = typer.Option(
+        None, "--path", help="Glob sobre la ruta (sin distinguir mayúsculas), p.ej. '/caso/*'"
+    ),
+    ext: Optional[str] = typer.Option(None, help="Extensiones separadas por coma"),
+    mismatch: bool = typer.Option(False, help="Solo archivos cuyo content_hash no coincide"),
+    sha256: Optional[str] = typer.Option(None, help="Buscar por SHA-256"),
+    limit: int = typer.Option(50, min=0, help="Máximo de filas a mostrar; 0 = todas"),
+    count: bool = typer.Option(False, help="Mostrar solo el número de coincidencias"),
+    custody: Optional[str] = typer.Option(
+        None, help="Listar eventos de custodia de esta acción (ALL = todos) en lugar de archivos"
+    ),
+    fmt: str = typer.Option("table", "--format", help="Salida: table, csv o json"),
+    rebuild: bool = typer.Option(False, help="Rehacer indice.db desde los archivos del caso"),
+):
+    """Consulta el índice SQLite del caso (indice.db) sin cargar el caso en memoria."""
+    if fmt not in ("table", "csv", "json"):
+        raise typer.BadParameter("--format debe ser table, csv o json")
+    if not (case_dir / INDEX_FILE).exists() and not (case_dir / "inventario.csv").exists():
+        raise typer.BadParameter(f"{case_dir} no contiene {INDEX_FILE} ni inventario.csv")
+    try:
+        filters: Dict[str, Any] = {
+            "min_size": parse_size(min_size),
+            "max_size": parse_size(max_size),
+            "modified_from": _iso_bound(date_from),
+            "modified_to": _iso_bound(date_to),
+            "path_glob": path_glob,
+            "exts": [normalize_ext(e) for e in ext.split(",")] if ext else None,
+            "mismatch": mismatch,
+            "sha256": sha256,
+        }
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
+
+    if rebuild or not (case_dir / INDEX_FILE).exists():
+        # Casos anteriores al índice: se construye una vez desde inventario, hashes y custodia
+        index = rebuild_index(case_dir)
+    else:
+        index = CaseIndex(case_dir / INDEX_FILE)
+    with index:
+        if custody is not None:
+            action = None if custody.upper() == "ALL" else custody
+            rows = list(index.custody_events(action))
+            columns = ["seq", "ts", "actor", "action", "details"]
+        elif count:
+            print(index.count(**filters))
+            return
+        else:
+            rows = list(index.query(limit=limit or None, **filters))
+            columns = QUERY_COLUMNS
+
+    if fmt == "json":
+        for r in rows:
+            typer.echo(json.dumps(r, ensure_ascii=False))
+    elif fmt == "csv":
+        out = csv.DictWriter(sys.stdout, fieldnames=columns, lineterminator="\n")
+        out.writeheader()
+        out.writerows(rows)
+    else:
+        table = Table(title=f"{case_dir.name}: {len(rows)} resultados")
+        shown = columns if custody is not None else QUERY_TABLE_COLUMNS
+        for c in shown:
+            table.add_column(c)
+        for r in rows:
+            table.add_row(*("" if r[c] is None else str(r[c]) for c in shown))
+        print(table)
+
+
+@app.command()
+def verify(
+    case_dir: Path = typer.Argument(..., help="Carpeta del caso a verificar"),
+    workers: int = typer.Option(os.cpu_count() or 4, min=1, help="Archivos hasheados en paralelo"),
+    full: bool = typer.Option(False, help="Verificar también MD5 y el content hash de Dropbox"),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        "--paranoid",
+        help=f"Leer todos los archivos sin usar {CACHE_FILE} (verificación probatoria)",
+    ),
+    actor: Optional[str] = typer.Option(None, help="Quién verifica (por defecto, usuario local)"),
+):
+    """Re-hashea la evidencia del caso y la compara con su hashes.csv."""
+    if not (case_dir / "hashes.csv").exists():
+        raise typer.BadParameter(f"{case_dir} no contiene hashes.csv")
+    session = Session.start(actor=actor)
+    with ExitStack() as stack:
+        cache = None if no_cache else stack.enter_context(HashCache(case_dir / CACHE_FILE))
+        report = verify_case(case_dir, workers=workers, full=full, cache=cache)
+    data = report.to_report()
+    stamp = session.started_at[:19].replace(":", "").replace("-", "")
+    report_json = case_dir / f"verificacion_{stamp}.json"
+    write_json({"session_id": session.id, "full": full, "paranoid": no_cache, **data}, report_json)
+
+    with _open_custody(case_dir) as custody:
+        custody.append(
+            CustodyEntry.create(
+                actor=session.actor,
+                action="VERIFY",
+                session_id=session.id,
+                ip=session.ip_address,
+                intact=report.intact,
+                counts=report.counts(),
+                full=full,
+                paranoid=no_cache,
+                cache_hits=report.cache_hits,
+                merkle_root_ok=report.merkle_root_ok,
+                report_file=report_json.name,
+            )
+        )
+    if (case_dir / INDEX_FILE).exists():
+        with CaseIndex(case_dir / INDEX_FILE) as index:
+            index.sync_custody(custody.file)
+
+    c = report.counts()
+    color = "green" if report.intact else "red"
+    print(
+        f"[bold {color}]{c['ok']}/{c['checked']} archivos íntegros[/bold {color}]: "
+        f"{c['missing']} faltantes, {c['modified']} modificados, {c['extra']} sobrantes, "
+        f"{c['unreadable']} ilegibles "
+        f"({data['throughput_mb_s']} MB/s, {report.cache_hits} desde la caché)"
+    )
+    for name in report.missing[:20]:
+        print(f"  [red]falta[/red] {name}")
+    for m in report.modified[:20]:
+        print(f"  [red]modificado[/red] {m['path_dropbox']} ({m['field']})")
+    for name in report.extra[:20]:
+        print(f"  [yellow]sobrante[/yellow] {name}")
+    for u in report.unreadable[:20]:
+        print(f"  [red]ilegible[/red] {u['path_dropbox']} ({u['error']})")
+    if report.merkle_root_ok is False:
+        print(f"  [red]hashes.csv no corresponde a la raíz de {MANIFEST_FILE}[/red]")
+    print(f"Reporte: {report_json}")
+    if not report.intact:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def export(
+    case_dir: Path = typer.Argument(..., help="Carpeta del caso a exportar"),
+    fmt: str = typer.Option("parquet", "--format", help="Formato: parquet o arrow"),
+    out: Optional[Path] = typer.Option(None, help="Carpeta de salida (por defecto, la del caso)"),
+    row_group_size: int = typer.Option(ROW_GROUP_SIZE, min=1, help="Filas por row group"),
+    compression: str = typer.Option(
+        COMPRESSION, help="Compresión: zstd, snappy, lz4, gzip o none (arrow: zstd, lz4 o none)"
+    ),
+    actor: Optional[str] = typer.Option(None, help="Quién exporta (por defecto, usuario local)"),
+):
+    """Exporta inventario y hashes del caso a formato columnar (tipado y comprimido)."""
+    codec = None if compression == "none" else compression
+    _check_columnar(fmt, codec)
+    if not (case_dir / "inventario.csv").exists() and not (case_dir / "hashes.csv").exists():
+        raise typer.BadParameter(f"{case_dir} no contiene inventario.csv ni hashes.csv")
+    written = export_case(
+        case_dir,
+        out_dir=out,
+        fmt=fmt,
+        row_group_size=row_group_size,
+        compression=codec,
+    )
+    session = Session.start(actor=actor)
+    with _open_custody(case_dir) as custody:
+        custody.append(
+            CustodyEntry.create(
+                actor=session.actor,
+                action="EXPORT",
+                session_id=session.id,
+                format=fmt,
+                files={name: {"file": str(f), "rows": n} for name, (f, n) in written.items()},
+            )
+        )
+    if (case_dir / INDEX_FILE).exists():
+        with CaseIndex(case_dir / INDEX_FILE) as index:
+            index.sync_custody(custody.file)
+    for name, (f, n) in written.items():
+        print(f"[bold green]{name}[/bold green]: {n} filas → {f}")
+
+
+def _open_custody(case_dir: Path) -> ChainOfCustody:
+    try:
+        return ChainOfCustody(case_dir / "cadena_custodia.jsonl")
+    except BrokenChainError as e:
+        raise typer.BadParameter(str(e)) from e
+
+
+def _check_columnar(fmt: str, compression: Optional[str] = COMPRESSION) -> None:
+    try:
+        check_compression(fmt, compression)
+        require_pyarrow()
+    except (ValueError, RuntimeError) as e:
+        raise typer.BadParameter(str(e)) from e
+
+
+@merkle_app.command("build")
+def merkle_build(
+    case_dir: Path = typer.Argument(..., help="Carpeta del caso"),
+    actor: Optional[str] = typer.Option(None, help="Quién lo genera (por defecto, usuario local)"),
+):
+    """Genera merkle.json y merkle.bin para un caso adquirido sin manifiesto."""
+    if not (case_dir / "hashes.csv").exists():
+        raise typer.BadParameter(f"{case_dir} no contiene hashes.csv")
+    previous = recorded_root(case_dir)
+    manifest = write_case_manifest(case_dir)
+    session = Session.start(actor=actor)
+    with _open_custody(case_dir) as custody:
+        custody.append(
+            CustodyEntry.create(
+                actor=session.actor,
+                action="MERKLE",
+                session_id=session.id,
+                leaves=manifest["leaves"],
+                merkle_root=manifest["root"],
+                previous_root=previous,
+            )
+        )
+    if (case_dir / INDEX_FILE).exists():
+        with CaseIndex(case_dir / INDEX_FILE) as index:
+            index.sync_custody(custody.file)
+    print(f"[bold green]Raíz Merkle[/bold green] {manifest['root']} ({manifest['leaves']} hojas)")
+    if previous is not None and previous != manifest["root"]:
+        print(f"[yellow]La raíz anterior era {previous}[/yellow]")
+
+
+@merkle_app.command("proof")
+def merkle_proof(
+    case_dir: Path = typer.Argument(..., help="Carpeta del caso"),
+    path_dropbox: str = typer.Argument(..., help="Ruta del archivo en Dropbox"),
+    check: bool = typer.Option(False, help="Re-hashear el archivo local (no usar hashes.csv)"),
+    out: Optional[Path] = typer.Option(None, help="Guardar la prueba de inclusión en JSON"),
+):
+    """Prueba de inclusión de un archivo contra la raíz registrada del caso."""
+    root = recorded_root(case_dir)
+    if root is None:
+        raise typer.BadParameter(f"{case_dir} no contiene {MANIFEST_FILE} (use afrec merkle build)")
+    tree, leaves = build_case_tree(case_dir)
+    i = find_leaf(leaves, path_dropbox)
+    if i is None:
+        raise typer.BadParameter(f"{path_dropbox} no figura en hashes.csv")
+    path, sha256 = leaves[i]
+    if check:
+        local = record_path(case_dir, _hash_record(case_dir, path))
+        sha256 = hash_file_multi(local, content_hash=False, md5=False).hexdigests()["sha256"]
+    proof = tree.proof(i)
+    ok = verify_proof(leaf_hash(path, sha256), proof, root)
+    custody_root = _custody_merkle_root(case_dir / "cadena_custodia.jsonl")
+    if out is not None:
+        steps = [{"side": side, "hash": h} for side, h in proof]
+        write_json(
+            {"path_dropbox": path, "sha256": sha256, "index": i, "root": root, "proof": steps},
+            out,
+        )
+
+    color = "green" if ok else "red"
+    verdict = "incluido" if ok else "NO coincide con la raíz"
+    print(f"[bold {color}]{path}: {verdict}[/bold {color}] ({len(proof)} pasos, hoja {i})")
+    print(f"  sha256 {sha256}")
+    print(f"  raíz   {root}")
+    if custody_root is not None and custody_root != root:
+        print(f"  [red]La cadena de custodia registra otra raíz: {custody_root}[/red]")
+        ok = False
+    if not ok:
+        raise typer.Exit(code=1)
+
+
+@merkle_app.command("compare")
+def merkle_compare(
+    case_a: Path = typer.Argument(..., help="Primer caso"),
+    case_b: Path = typer.Argument(..., help="Segundo caso"),
+    as_json: bool = typer.Option(False, "--json", help="Imprimir el resultado completo en JSON"),
+):
+    """Compara dos casos por raíz Merkle y lista los archivos que difieren."""
+    for case in (case_a, case_b):
+        if not (case / "hashes.csv").exists():
+            raise typer.BadParameter(f"{case} no contiene hashes.csv")
+    result = compare_cases(case_a, case_b)
+    if as_json:
+        typer.echo(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    if result["identical"]:
+        print(f"[bold green]Casos idénticos[/bold green] (raíz {result['root_a']})")
+        return
+    print(
+        f"[bold yellow]Los casos difieren[/bold yellow]: {len(result['changed'])} modificados, "
+        f"{len(result['added'])} nuevos, {len(result['removed'])} ausentes"
+    )
+    for key, label in (("changed", "modificado"), ("added", "nuevo"), ("removed", "ausente")):
+        for name in result[key][:20]:
+            print(f"  {label} {name}")
+
+
+@custody_app.command("verify")
+def custody_verify(
+    case_dir: Path = typer.Argument(..., help="Carpeta del caso (o el archivo .jsonl)"),
+    head: Optional[str] = typer.Option(
+        None, help="Hash de la última entrada registrado aparte (detecta entradas truncadas)"
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Imprimir el resultado completo en JSON"),
+):
+    """Valida en una pasada los enlaces de hashes de cadena_custodia.jsonl."""
+    custody_file = case_dir if case_dir.is_file() else case_dir / "cadena_custodia.jsonl"
+    if not custody_file.exists():
+        raise typer.BadParameter(f"{case_dir} no contiene cadena_custodia.jsonl")
+    report = verify_chain(custody_file)
+    head_ok = head is None or head.lower() == report.last_hash
+    if as_json:
+        data = {**report.to_dict(), "head_ok": head_ok}
+        typer.echo(json.dumps(data, ensure_ascii=False, indent=2))
+    else:
+        color = "green" if report.ok and head_ok else "red"
+        state = "íntegra" if report.ok and head_ok else "alterada"
+        print(
+            f"[bold {color}]Cadena {state}[/bold {color}]: {report.entries} entradas "
+            f"({report.legacy} sin enlace, anteriores a la cadena), última {report.last_hash}"
+        )
+        for number, error in report.errors[:20]:
+            print(f"  [red]línea {number}[/red] {error}")
+        if not head_ok:
+            print(f"  [red]La última entrada no corresponde al hash indicado {head}[/red]")
+    if not (report.ok and head_ok):
+        raise typer.Exit(code=1)
+
+
+def _hash_record(case_dir: Path, path_dropbox: str) -> HashRecord:
+    with open(case_dir / "hashes.csv", "r", newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            if row["path_dropbox"] == path_dropbox:
+                return HashRecord.from_mapping(row)
+    raise typer.BadParameter(f"{path_dropbox} no figura en hashes.csv")
+
+
+def _custody_merkle_root(custody_file: Path) -> Optional[str]:
+    """Última raíz Merkle registrada en la custodia (ACQUIRE o MERKLE)."""
+    root = None
+    if custody_file.exists():
+        with open(custody_file, "r", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    root = json.loads(line).get("details", {}).get("merkle_root", root)
+    return root
+
+
+def _iso_bound(value: Optional[str]) -> Optional[str]:
+    dt = parse_date(value)
+    return dt.isoformat() if dt is not None else None
+
+
+def _filter_spec(
+    ext: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str],
+    min_size: Optional[str] = None,
+    max_size: Optional[str] = None,
+    client_date_from: Optional[str] = None,
+    client_date_to: Optional[str] = None,
+    **patterns: Optional[List[str]],
+) -> FilterSpec:
+    """Arma y valida (compilando una vez) los filtros de la línea de comandos."""
+    exts = ext.split(",") if ext else None
+    try:
+        spec = FilterSpec.create(
+            exts,
+            date_from,
+            date_to,
+            min_size=parse_size(min_size),
+            max_size=parse_size(max_size),
+            client_date_from=client_date_from,
+            client_date_to=client_date_to,
+            **{k: v or () for k, v in patterns.items()},
+        )
+        spec.compile()
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
+    return spec
+
+
+def _resume_conflicts(
+    params: Dict[str, Any],
+    saved: FilterSpec,
+    requested: FilterSpec,
+    path: str,
+    discovery: str,
+    dedup: str,
+) -> List[str]:
+    """Opciones indicadas junto con --resume que contradicen la adquisición guardada.
+
+    Solo cuentan las que difieren de su valor por defecto: las demás no se indicaron."""
+    given: Dict[str, Any] = {
+        k: v for k, v in requested.to_dict().items() if v not in (None, [])
+    }
+    expected: Dict[str, Any] = saved.to_dict()
+    if path != "/":
+        given["path"], expected["path"] = path, params["path"]
+    if discovery != ENGINE_LIST:
+        given["discovery"], expected["discovery"] = discovery, params.get("discovery")
+    if dedup != "none" and "dedup" in params:
+        given["dedup"], expected["dedup"] = dedup, params["dedup"]
+    return sorted(k for k, v in given.items() if v != expected[k])
+
+
+def _saved_filter_spec(state: Dict[str, Any]) -> FilterSpec:
+    """Filtros guardados en cursores.json o adquisicion.json (los casos antiguos solo
+    tienen extensiones y fechas)."""
+    if state.get("filters") is not None:
+        return FilterSpec.from_dict(state["filters"])
+    exts = state.get("exts")
+    if exts is None and state.get("ext"):
+        exts = state["ext"].split(",")
+    return FilterSpec.create(exts, state.get("date_from"), state.get("date_to"))
+
+
+def _discover(
+    client: Dropbox,
+    path: str,
+    spec: FilterSpec,
+    discovery: str,
+    partitions: int,
+    cursors: List[Dict[str, Any]],
+    metrics: Optional[AcquisitionMetrics] = None,
+) -> Tuple[str, Iterator[InventoryItem]]:
+    try:
+        return discover_inventory(
+            client,
+            root=path,
+            engine=discovery,
+            partitions=partitions,
+            scheduler=AdaptiveScheduler(
+                max_concurrency=partitions, metrics=metrics, name="listing"
+            ),
+            cursors=cursors,
+            filters=spec,
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
+
+
+def _cursor_state(
+    path: str,
+    spec: FilterSpec,
+    cursors: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    return {
+        "root": path,
+        "exts": list(spec.exts) or None,
+        "date_from": spec.date_from,
+        "date_to": spec.date_to,
+        "filters": spec.to_dict(),
+        "saved_at": utc_now_iso(),
+        "cursors": sorted(cursors, key=lambda c: (c["recursive"], c["path"])),
+    }
+
+
+# Cada cuánto se actualizan el panel de progreso y el textfile de Prometheus (segundos)
+PROGRESS_INTERVAL = 0.2
+PROMETHEUS_INTERVAL = 15.0
+
+
+@contextmanager
+def _progress_panel(
+    metrics: AcquisitionMetrics,
+    enabled: bool,
+    textfile: Optional[Path],
+    labels: Dict[str, str],
+) -> Iterator[Callable[[Any], None]]:
+    """Panel de Rich con bytes, throughput y ETA; devuelve la función a llamar por archivo.
+
+    El total crece mientras el listado avanza, así que el ETA es definitivo cuando termina
+    el listado. También reescribe el textfile de Prometheus cada PROMETHEUS_INTERVAL."""
+    last = {"panel": 0.0, "textfile": time.monotonic()}
+    panel: Optional[Progress] = None
+    task = TaskID(0)
+    if enabled:
+        panel = Progress(
+            TextColumn("[bold]{task.description}"),
+            BarColumn(),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+            TimeRemainingColumn(),
+            TextColumn("{task.fields[detail]}"),
+        )
+        task = panel.add_task("Listando y descargando", total=None, detail="")
+
+    def _refresh(panel: Progress) -> None:
+        p = metrics.progress()
+        detail = (
+            f"{p['files']}/{p['listed']} archivos · red {p['bytes_per_s'] / 1e6:.1f} MB/s · "
+            f"cola {p['queue']} · reintentos {p['retries']} · limitado {p['throttled']}"
+        )
+        panel.update(
+            task,
+            description="Descargando" if p["listing_done"] else "Listando y descargando",
+            completed=p["bytes"],
+            total=max(p["listed_bytes"], p["bytes"]),
+            detail=detail,
+        )
+
+    def _tick(_: Any) -> None:
+        now = time.monotonic()
+        if panel is not None and now - last["panel"] >= PROGRESS_INTERVAL:
+            last["panel"] = now
+            _refresh(panel)
+        if textfile is not None and now - last["textfile"] >= PROMETHEUS_INTERVAL:
+            last["textfile"] = now
+            metrics.write_prometheus(textfile, labels)
+
+    if panel is None:
+        yield _tick
+        return
+    with panel:
+        try:
+            yield _tick
+        finally:
+            _refresh(panel)
+
+
+def _on_exhausted(items: Iterable[InventoryItem], callback) -> Iterator[InventoryItem]:
+    yield from items
+    callback()
+
+
+def _indexed(items: Iterable[T], add: Callable[[T], None]) -> Iterator[T]:
+    for i in items:
+        add(i)
+        yield i
+
+
+def _tracked(items: Iterable[InventoryItem], tracker: DeltaTracker) -> Iterator[InventoryItem]:
+    for i in items:
+        tracker.classify(i)
+        yield i
+
+
+def _counted(records: Iterable[R], counts: Dict[str, int]) -> Iterator[R]:
+    for r in records:
+        if r.get("dedup_of"):
+            counts["dedup"] += 1
+        if r.get("carried_from"):
+            counts["carried"] += 1
+        yield r
 
 def _build_client(bundle: TokenBundle, settings: Settings) -> Dropbox:
+    # Los 429 se propagan al planificador adaptativo en lugar de reintentarse dentro del SDK
     if bundle.refresh_token:
         return Dropbox(
             app_key=settings.dropbox_app_key,
             app_secret=settings.dropbox_app_secret,
             oauth2_refresh_token=bundle.refresh_token,
+            max_retries_on_rate_limit=0,
         )
-    return Dropbox(oauth2_access_token=bundle.access_token)
+    return Dropbox(oauth2_access_token=bundle.access_token, max_retries_on_rate_limit=0)
 
 
 def ensure_client(settings: Settings) -> Tuple[Dropbox, str, str]:
@@ -208,7 +1183,9 @@ def ensure_client(settings: Settings) -> Tuple[Dropbox, str, str]:
     try:
         acct = dbx.users_get_current_account()
     except AuthError as e:  
-        raise typer.BadParameter("Token inválido o expirado. Ejecute 'afrec auth' nuevamente.") from e
+        raise typer.BadParameter(
+            "Token inválido o expirado. Ejecute 'afrec auth' nuevamente."
+        ) from e
     actor = acct.name.display_name or "unknown"
     return dbx, actor, bundle.fingerprint()
 
@@ -0,0 +1,234 @@
+""" Aquí se Exporta el inventario y los hashes a formato columnar (Parquet o Arrow).
+Para analizar casos grandes con pandas, DuckDB o Polars sin volver a interpretar CSV:
+* Columnas tipadas: tamaños int64, fechas como timestamp UTC y digests
+  (SHA-256, MD5, content hash) como binario en lugar de texto hexadecimal.
+* Escritura en streaming por grupos de filas (row groups): las filas se acumulan por
+  columna y se escriben cada ``row_group_size`` filas, así que la memoria no depende del
+  tamaño del caso. Sirve tanto para exportar un caso (afrec export) como durante la
+  adquisición (afrec acquire --columnar).
+* pyarrow es una dependencia opcional (pip install "afrec[parquet]"); sin ella las
+  funciones de conversión siguen disponibles y los escritores lanzan RuntimeError. """
+
+from __future__ import annotations
+
+import csv
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from dateutil import parser as dtparser
+
+from .compact import pack_hex, pack_ts
+from .explorer import InventoryItem, iter_inventory_csv
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None  # type: ignore
+    pa_ipc = None  # type: ignore
+    pq = None  # type: ignore
+
+FORMAT_PARQUET = "parquet"
+FORMAT_ARROW = "arrow"
+FORMATS = (FORMAT_PARQUET, FORMAT_ARROW)
+ROW_GROUP_SIZE = 64 * 1024
+COMPRESSION = "zstd"
+# Códecs que acepta cada formato (Arrow IPC solo comprime con lz4 o zstd)
+COMPRESSIONS: Dict[str, Tuple[str, ...]] = {
+    FORMAT_PARQUET: ("zstd", "snappy", "lz4", "gzip"),
+    FORMAT_ARROW: ("zstd", "lz4"),
+}
+
+# (columna, tipo): "str", "int", "ts" (fecha UTC) o "bin" (digest hexadecimal → bytes)
+INVENTORY_COLUMNS: List[Tuple[str, str]] = [
+    ("path_display", "str"),
+    ("id", "str"),
+    ("size", "int"),
+    ("client_modified", "ts"),
+    ("server_modified", "ts"),
+    ("rev", "str"),
+    ("content_hash", "bin"),
+]
+HASH_COLUMNS: List[Tuple[str, str]] = [
+    ("path_local", "str"),
+    ("path_dropbox", "str"),
+    ("id", "str"),
+    ("size", "int"),
+    ("sha256", "bin"),
+    ("md5", "bin"),
+    ("dropbox_content_hash_local", "bin"),
+    ("dropbox_content_hash_remote", "bin"),
+    ("server_modified", "ts"),
+    ("rev", "str"),
+    ("dropbox_hash_match", "str"),
+    ("dedup_of", "str"),
+    ("carried_from", "str"),
+]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError(
+            'La exportación columnar requiere pyarrow: pip install "afrec[parquet]"'
+        )
+
+
+def to_timestamp(value: Any) -> Optional[datetime]:
+    """Fecha ISO-8601 (UTC sin zona, como Dropbox) → datetime UTC con zona."""
+    if value is None or value == "":
+        return None
+    packed = pack_ts(value)
+    if isinstance(packed, int):
+        return _EPOCH + timedelta(seconds=packed)
+    dt = value if isinstance(value, datetime) else dtparser.parse(value)
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def to_binary(value: Any) -> Optional[bytes]:
+    """Digest hexadecimal → bytes; un valor que no es hex se guarda como texto UTF-8."""
+    if value is None or value == "":
+        return None
+    packed = pack_hex(value)
+    if isinstance(packed, bytes):
+        return packed
+    return str(value).encode("utf-8")
+
+
+def _to_int(value: Any) -> Optional[int]:
+    return None if value is None or value == "" else int(value)
+
+
+def _to_str(value: Any) -> Optional[str]:
+    return None if value is None or value == "" else str(value)
+
+
+_CONVERTERS = {"str": _to_str, "int": _to_int, "ts": to_timestamp, "bin": to_binary}
+
+
+def convert_row(row: Mapping[str, Any], columns: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Fila (dict de CSV, HashRecord o InventoryItem.to_dict()) con los tipos columnares."""
+    return {name: _CONVERTERS[kind](row.get(name)) for name, kind in columns}
+
+
+def _schema(columns: List[Tuple[str, str]]) -> Any:
+    types = {
+        "str": pa.string(),
+        "int": pa.int64(),
+        "ts": pa.timestamp("us", tz="UTC"),
+        "bin": pa.binary(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def check_compression(fmt: str, compression: Optional[str]) -> None:
+    """Comprueba que el formato exista y admita la compresión pedida (None = sin comprimir)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt} (use {' o '.join(FORMATS)})")
+    if compression is not None and compression not in COMPRESSIONS[fmt]:
+        codecs = ", ".join(COMPRESSIONS[fmt])
+        raise ValueError(f"{fmt} no admite la compresión {compression} (use {codecs} o none)")
+
+
+class ColumnarWriter:
+    """Escribe filas en Parquet (o Arrow IPC) por grupos de ``row_group_size`` filas."""
+
+    def __init__(
+        self,
+        out_file: Path,
+        columns: List[Tuple[str, str]],
+        fmt: str = FORMAT_PARQUET,
+        row_group_size: int = ROW_GROUP_SIZE,
+        compression: Optional[str] = COMPRESSION,
+    ) -> None:
+        require_pyarrow()
+        check_compression(fmt, compression)
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        self.file = out_file
+        self.count = 0
+        self._columns = columns
+        self._schema = _schema(columns)
+        self._row_group_size = row_group_size
+        self._buffer: Dict[str, List[Any]] = {name: [] for name, _ in columns}
+        self._buffered = 0
+        if fmt == FORMAT_PARQUET:
+            self._writer = pq.ParquetWriter(str(out_file), self._schema, compression=compression)
+        else:
+            options = pa_ipc.IpcWriteOptions(compression=compression)
+            self._writer = pa_ipc.new_file(str(out_file), self._schema, options=options)
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def write(self, row: Mapping[str, Any]) -> None:
+        for name, kind in self._columns:
+            self._buffer[name].append(_CONVERTERS[kind](row.get(name)))
+        self._buffered += 1
+        if self._buffered >= self._row_group_size:
+            self._flush()
+
+    def add_item(self, item: InventoryItem) -> None:
+        self.write(item.to_dict())
+
+    def _flush(self) -> None:
+        if not self._buffered:
+            return
+        batch = pa.RecordBatch.from_pydict(self._buffer, schema=self._schema)
+        if isinstance(self._writer, pq.ParquetWriter):
+            # Cada llamada escribe (al menos) un row group completo
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        self.count += self._buffered
+        self._buffer = {name: [] for name, _ in self._columns}
+        self._buffered = 0
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        self._writer = None
+
+
+def output_file(case_dir: Path, name: str, fmt: str) -> Path:
+    return case_dir / f"{name}.{fmt}"
+
+
+def export_case(
+    case_dir: Path,
+    out_dir: Optional[Path] = None,
+    fmt: str = FORMAT_PARQUET,
+    row_group_size: int = ROW_GROUP_SIZE,
+    compression: Optional[str] = COMPRESSION,
+) -> Dict[str, Tuple[Path, int]]:
+    """Convierte inventario.csv y hashes.csv del caso; devuelve {nombre: (archivo, filas)}."""
+    require_pyarrow()
+    out_dir = out_dir or case_dir
+    sources: List[Tuple[str, List[Tuple[str, str]], Iterable[Mapping[str, Any]]]] = []
+    inventory = case_dir / "inventario.csv"
+    if inventory.exists():
+        items = (i.to_dict() for i in iter_inventory_csv(inventory))
+        sources.append(("inventario", INVENTORY_COLUMNS, items))
+    hashes = case_dir / "hashes.csv"
+    if hashes.exists():
+        sources.append(("hashes", HASH_COLUMNS, _iter_csv(hashes)))
+    written: Dict[str, Tuple[Path, int]] = {}
+    for name, columns, rows in sources:
+        target = output_file(out_dir, name, fmt)
+        with ColumnarWriter(target, columns, fmt, row_group_size, compression) as writer:
+            for row in rows:
+                writer.write(row)
+        written[name] = (target, writer.count)
+    return written
+
+
+def _iter_csv(path: Path) -> Iterable[Dict[str, str]]:
+    with open(path, "r", newline="", encoding="utf-8") as fh:
+        yield from csv.DictReader(fh)
@@ -0,0 +1,78 @@
+""" Aquí se Definen las conversiones para guardar registros en forma compacta.
+Los inventarios y registros de hash de un caso grande pueden tener millones de filas;
+en memoria se guardan:
+* fechas como segundos desde epoch (int) en lugar de cadenas ISO-8601,
+* digests hexadecimales (SHA-256, MD5, content_hash) como bytes.
+La conversión es exacta: al volver a texto se obtiene la misma cadena original, por lo
+que JSON y CSV no cambian. Los valores que no se pueden reconstruir byte a byte (fechas
+con zona o fracciones de segundo, hex en mayúsculas) se conservan tal cual. """
+
+from __future__ import annotations
+
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Optional, Union
+
+_EPOCH = datetime(1970, 1, 1)
+_ISO_SECONDS = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\Z")
+
+Timestamp = Union[int, str, None]
+Digest = Union[bytes, str, None]
+
+
+def pack_ts(value: Union[datetime, str, None]) -> Timestamp:
+    """Fecha UTC sin zona (datetime o ISO-8601 al segundo) → segundos desde epoch."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None and value.microsecond == 0:
+            return (value - _EPOCH) // timedelta(seconds=1)
+        return value.isoformat()
+    if _ISO_SECONDS.match(value):
+        return (datetime.fromisoformat(value) - _EPOCH) // timedelta(seconds=1)
+    return value
+
+
+def unpack_ts(value: Timestamp) -> Optional[str]:
+    if isinstance(value, int):
+        return (_EPOCH + timedelta(seconds=value)).isoformat()
+    return value
+
+
+def pack_hex(value: Any) -> Digest:
+    """Digest hexadecimal en minúsculas → bytes (la mitad de tamaño y sin objeto str)."""
+    if isinstance(value, str) and len(value) in (32, 64):
+        try:
+            raw = bytes.fromhex(value)
+        except ValueError:
+            return value
+        if raw.hex() == value:
+            return raw
+    return value
+
+
+def unpack_hex(value: Digest) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def pack_int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def pack_str(value: Any) -> Optional[str]:
+    """Cadena o None; "" (celda vacía de un CSV) se guarda como None."""
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def pack_label(value: Any) -> Optional[str]:
+    """Valores categóricos ("yes", "no", "n/a"): una sola instancia compartida."""
+    if value is None or value == "":
+        return None
+    return sys.intern(str(value))
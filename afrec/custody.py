@@ -4,16 +4,47 @@ Cada entrada incluye:
 Timestamp UTC.
 Actor (perito/usuario).
 Acción realizada.
-Detalles asociados (ruta, número de archivos, carpeta del caso). 
-Es clave para trazabilidad y validez probatoria."""
+Detalles asociados (ruta, número de archivos, carpeta del caso).
+Es clave para trazabilidad y validez probatoria.
+
+Las entradas forman una cadena de hashes: cada línea lleva su número de secuencia
+(``seq``) y el SHA-256 de la línea anterior (``prev_hash``), así que editar, borrar o
+reordenar una entrada rompe el enlace siguiente y lo detecta verify_chain
+(afrec custody verify). Las líneas antiguas sin enlace se aceptan solo al comienzo del
+archivo y la primera entrada encadenada se enlaza con la última de ellas.
+
+El escritor mantiene el archivo abierto y confirma las entradas por grupos
+(``batch_size``) con una política de fsync configurable:
+* "entry": escribe y sincroniza cada entrada (ignora batch_size).
+* "batch": escribe y sincroniza cada grupo (por defecto).
+* "close": escribe cada grupo y sincroniza solo al cerrar.
+* "never": deja la sincronización al sistema operativo.
+Con batch_size > 1 hay que cerrar el escritor (close o bloque with) para no perder
+las entradas pendientes."""
 
 from __future__ import annotations
 
+import hashlib
 import json
-from dataclasses import asdict, dataclass
+import os
+import threading
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+GENESIS_HASH = "0" * 64
+FSYNC_ENTRY = "entry"
+FSYNC_BATCH = "batch"
+FSYNC_CLOSE = "close"
+FSYNC_NEVER = "never"
+FSYNC_POLICIES = (FSYNC_ENTRY, FSYNC_BATCH, FSYNC_CLOSE, FSYNC_NEVER)
+FSYNC_POLICY = os.getenv("AFREC_CUSTODY_FSYNC", FSYNC_BATCH)
+TAIL_BLOCK = 64 * 1024
+
+
+class BrokenChainError(ValueError):
+    """La cadena no se puede continuar: su última línea está incompleta o no es JSON."""
 
 
 @dataclass
@@ -33,11 +64,190 @@ class CustodyEntry:
         )
 
 
+def line_hash(line: bytes) -> str:
+    """SHA-256 de una línea del archivo tal como está escrita (sin el salto de línea)."""
+    return hashlib.sha256(line.rstrip(b"\r\n")).hexdigest()
+
+
+def _last_line(fh: BinaryIO) -> bytes:
+    """Última línea no vacía del archivo, leyendo desde el final por bloques."""
+    fh.seek(0, os.SEEK_END)
+    end = fh.tell()
+    pos, tail = end, b""
+    while pos > 0:
+        step = min(TAIL_BLOCK, pos)
+        pos -= step
+        fh.seek(pos)
+        tail = fh.read(step) + tail
+        stripped = tail.rstrip(b"\r\n")
+        if b"\n" in stripped:
+            return stripped.rsplit(b"\n", 1)[1]
+    return tail.rstrip(b"\r\n")
+
+
+def _count_lines(fh: BinaryIO) -> int:
+    fh.seek(0)
+    return sum(1 for line in fh if line.strip())
+
+
 class ChainOfCustody:
-    def __init__(self, file: Path) -> None:
+    def __init__(
+        self,
+        file: Path,
+        batch_size: int = 1,
+        fsync: Optional[str] = None,
+    ) -> None:
+        fsync = fsync or FSYNC_POLICY
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(
+                f"Política de fsync no soportada: {fsync} (use {', '.join(FSYNC_POLICIES)})"
+            )
         self.file = file
         self.file.parent.mkdir(parents=True, exist_ok=True)
+        self._batch_size = 1 if fsync == FSYNC_ENTRY else max(1, batch_size)
+        self._fsync = fsync
+        self._lock = threading.Lock()
+        self._pending: List[bytes] = []
+        self._fh: Optional[BinaryIO] = open(self.file, "a+b")
+        try:
+            self._seq, self._prev = self._resume()
+        except BrokenChainError:
+            self._handle().close()
+            self._fh = None
+            raise
+
+    def _handle(self) -> BinaryIO:
+        if self._fh is None:
+            raise ValueError(f"La cadena de custodia {self.file} está cerrada")
+        return self._fh
+
+    def _resume(self) -> Tuple[int, str]:
+        """Número de secuencia y hash de la última entrada, para continuar la cadena."""
+        fh = self._handle()
+        last = _last_line(fh)
+        if not last:
+            return 0, GENESIS_HASH
+        try:
+            entry = json.loads(last)
+        except ValueError:
+            raise BrokenChainError(
+                f"{self.file} termina en una línea incompleta o inválida; "
+                "revísela con afrec custody verify"
+            ) from None
+        seq = entry.get("seq")
+        if seq is None:
+            # Archivo anterior a la cadena: la primera entrada enlaza con la última línea
+            seq = _count_lines(fh)
+        return int(seq), line_hash(last)
+
+    def __enter__(self) -> "ChainOfCustody":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
 
     def append(self, entry: CustodyEntry) -> None:
-        with open(self.file, "a", encoding="utf-8") as fh:
-            fh.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+        with self._lock:
+            self._handle()
+            self._seq += 1
+            data = {"seq": self._seq, **asdict(entry), "prev_hash": self._prev}
+            line = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self._prev = line_hash(line)
+            self._pending.append(line + b"\n")
+            if len(self._pending) >= self._batch_size:
+                self._commit()
+
+    def _commit(self) -> None:
+        if not self._pending:
+            return
+        # Confirmación por grupo: una escritura (y un fsync) por lote de entradas
+        fh = self._handle()
+        fh.write(b"".join(self._pending))
+        fh.flush()
+        if self._fsync in (FSYNC_ENTRY, FSYNC_BATCH):
+            os.fsync(fh.fileno())
+        self._pending = []
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is None:
+                return
+            self._commit()
+            fh = self._handle()
+            if self._fsync == FSYNC_CLOSE:
+                os.fsync(fh.fileno())
+            fh.close()
+            self._fh = None
+
+    @property
+    def last_hash(self) -> str:
+        return self._prev
+
+
+@dataclass
+class ChainReport:
+    entries: int = 0
+    legacy: int = 0
+    last_seq: int = 0
+    last_hash: str = GENESIS_HASH
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "entries": self.entries,
+            "legacy": self.legacy,
+            "last_seq": self.last_seq,
+            "last_hash": self.last_hash,
+            "errors": [{"line": n, "error": msg} for n, msg in self.errors],
+        }
+
+
+def verify_chain(file: Path, max_errors: int = 100) -> ChainReport:
+    """Valida toda la cadena en una sola pasada, línea por línea, sin cargarla en memoria."""
+    report = ChainReport()
+    prev, chained = GENESIS_HASH, False
+    with open(file, "rb") as fh:
+        for number, raw in enumerate(fh, 1):
+            line = raw.rstrip(b"\r\n")
+            if not line.strip():
+                continue
+            report.entries += 1
+            current = line_hash(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                report.errors.append((number, "línea inválida (JSON incompleto o alterado)"))
+                prev = current
+                continue
+            if "prev_hash" not in entry:
+                if chained:
+                    report.errors.append((number, "entrada sin enlace después de la cadena"))
+                else:
+                    report.legacy += 1
+                    report.last_seq = report.entries
+                prev = current
+                continue
+            chained = True
+            if entry["prev_hash"] != prev:
+                report.errors.append((number, "prev_hash no coincide con la entrada anterior"))
+            if entry.get("seq") != report.last_seq + 1:
+                report.errors.append(
+                    (number, f"secuencia {entry.get('seq')}, se esperaba {report.last_seq + 1}")
+                )
+            seq = entry.get("seq")
+            report.last_seq = seq if isinstance(seq, int) else report.last_seq + 1
+            prev = current
+            if len(report.errors) >= max_errors:
+                break
+    report.last_hash = prev
+    return report
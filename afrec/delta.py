@@ -0,0 +1,210 @@
+""" Aquí se Compara un inventario nuevo contra el de un caso anterior.
+Permite la re-adquisición incremental (afrec acquire --since-case):
+* Diferencia por id, rev y content_hash → nuevos, modificados, sin cambios y eliminados.
+* Clasificación en streaming (DeltaTracker) mientras se lista la cuenta.
+* Los archivos sin cambios se trasladan por referencia con los hashes ya verificados
+  en el hashes.csv del caso anterior, sin volver a descargarlos.
+* Aplica los cambios obtenidos desde cursores guardados (afrec preview --delta) sobre
+  el inventario anterior, sin volver a listar la cuenta.
+* Genera el reporte de cambios (cambios.json) que acompaña a la cadena de custodia. """
+
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from dropbox import files as dbx_files
+
+from .explorer import InventoryItem, _compile_filter, _to_items, iter_inventory_csv
+from .filters import FilterSpec
+from .integrity import HashRecord, hash_record_from_digests
+
+ADDED = "added"
+MODIFIED = "modified"
+UNCHANGED = "unchanged"
+
+
+@dataclass
+class InventoryDiff:
+    added: List[InventoryItem] = field(default_factory=list)
+    modified: List[InventoryItem] = field(default_factory=list)
+    unchanged: int = 0
+    deleted: List[InventoryItem] = field(default_factory=list)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "modified": len(self.modified),
+            "unchanged": self.unchanged,
+            "deleted": len(self.deleted),
+        }
+
+    def to_report(self) -> Dict[str, object]:
+        def brief(items: List[InventoryItem]) -> List[Dict[str, object]]:
+            return [{"id": i.id, "path_display": i.path_display, "rev": i.rev} for i in items]
+
+        return {
+            "counts": self.counts(),
+            "added": brief(self.added),
+            "modified": brief(self.modified),
+            "deleted": brief(self.deleted),
+        }
+
+
+class DeltaTracker:
+    """Clasifica el inventario actual elemento a elemento a medida que se lista.
+
+    Solo conserva los cambios; los archivos sin cambios se cuentan. Los eliminados se
+    conocen al terminar el recorrido (lo que queda sin emparejar del inventario anterior).
+    """
+
+    def __init__(self, previous: Iterable[InventoryItem]) -> None:
+        self._pending = {i.id: i for i in previous}
+        self.diff = InventoryDiff()
+
+    def classify(self, item: InventoryItem) -> str:
+        old = self._pending.pop(item.id, None)
+        if old is None:
+            self.diff.added.append(item)
+            return ADDED
+        if old.rev == item.rev and old.content_hash == item.content_hash:
+            self.diff.unchanged += 1
+            return UNCHANGED
+        self.diff.modified.append(item)
+        return MODIFIED
+
+    def finish(self) -> InventoryDiff:
+        self.diff.deleted = list(self._pending.values())
+        return self.diff
+
+
+def diff_inventories(
+    previous: Iterable[InventoryItem], current: Iterable[InventoryItem]
+) -> InventoryDiff:
+    """Clasifica el inventario actual respecto al anterior usando el id estable de Dropbox."""
+    tracker = DeltaTracker(previous)
+    for item in current:
+        tracker.classify(item)
+    return tracker.finish()
+
+
+def apply_listing_changes(
+    previous: Iterable[InventoryItem],
+    changes: Iterable[dbx_files.Metadata],
+    exts: Optional[Sequence[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    filters: Optional[FilterSpec] = None,
+) -> Tuple[List[InventoryItem], InventoryDiff]:
+    """Aplica al inventario anterior las entradas de files_list_folder_continue.
+
+    Devuelve el inventario nuevo (orden anterior, con los añadidos al final) y el reporte
+    de cambios. Un archivo que deja de cumplir los filtros cuenta como eliminado del
+    inventario; una carpeta eliminada elimina todo lo que contenía.
+    """
+    flt = _compile_filter(exts, date_from, date_to, filters)
+    current: Dict[str, InventoryItem] = {}
+    prev_by_id: Dict[str, InventoryItem] = {}
+    for item in previous:
+        current[item.path_display.lower()] = item
+        prev_by_id[item.id] = item
+    diff = InventoryDiff()
+    touched = set()
+
+    def _remove(key: str) -> None:
+        old = current.pop(key, None)
+        if old is not None and old.id not in touched:
+            diff.deleted.append(old)
+
+    for entry in changes:
+        if isinstance(entry, dbx_files.DeletedMetadata):
+            key = entry.path_lower
+            _remove(key)
+            prefix = key + "/"
+            for k in [k for k in current if k.startswith(prefix)]:
+                _remove(k)
+        elif isinstance(entry, dbx_files.FileMetadata):
+            key = entry.path_display.lower()
+            matched = list(_to_items([entry], flt))
+            if not matched:
+                _remove(key)
+                continue
+            item = matched[0]
+            old = prev_by_id.get(item.id)
+            if item.id in touched:
+                pass
+            elif old is None:
+                diff.added.append(item)
+            elif old.rev != item.rev or old.content_hash != item.content_hash:
+                diff.modified.append(item)
+            elif old.path_display.lower() != key:
+                # Movido sin cambios de contenido: se informa como modificado (nueva ruta)
+                diff.modified.append(item)
+            touched.add(item.id)
+            current[key] = item
+    # Un movimiento llega como eliminación de la ruta vieja + archivo en la nueva ruta
+    moved = {i.id for i in diff.modified}
+    diff.deleted = [i for i in diff.deleted if i.id not in moved]
+    items = list(current.values())
+    diff.unchanged = len(items) - len(diff.added) - len(diff.modified)
+    return items, diff
+
+
+def load_hash_records(hashes_csv: Path) -> Dict[str, HashRecord]:
+    """Lee el hashes.csv de un caso indexado por id de Dropbox (registros compactos)."""
+    with open(hashes_csv, "r", newline="", encoding="utf-8") as fh:
+        return {
+            row["id"]: HashRecord.from_mapping(row) for row in csv.DictReader(fh) if row.get("id")
+        }
+
+
+class CarryOver:
+    """Decide, para cada archivo, si se reutiliza el registro verificado del caso anterior.
+
+    Es una función pura del hashes.csv previo (id, rev y content_hash), por lo que puede
+    llamarse desde los workers de descarga.
+    """
+
+    def __init__(self, since_case: Path, previous: Dict[str, HashRecord]) -> None:
+        self.since_case = since_case
+        self._previous = previous
+
+    def __call__(self, item: Dict[str, str | int | None]) -> Optional[HashRecord]:
+        prev = self._previous.get(str(item.get("id")))
+        if prev is None or prev.get("rev") != item.get("rev"):
+            return None
+        if (prev.get("dropbox_content_hash_remote") or None) != item.get("content_hash"):
+            return None
+        return carried_record(item, prev, self.since_case)
+
+
+def carried_record(
+    item: Dict[str, str | int | None], previous: HashRecord, since_case: Path
+) -> Optional[HashRecord]:
+    """Registro de un archivo sin cambios reutilizando los hashes del caso anterior.
+
+    Devuelve None si el registro previo no quedó verificado contra Dropbox, en cuyo
+    caso el archivo debe descargarse de nuevo.
+    """
+    remote = previous.get("dropbox_content_hash_remote")
+    if previous.get("dropbox_hash_match") != "yes" and remote:
+        return None
+    digests = {
+        "sha256": previous["sha256"],
+        "md5": previous["md5"],
+        "dropbox_content_hash": previous["dropbox_content_hash_local"],
+    }
+    rec = hash_record_from_digests(Path(previous["path_local"]), item, digests)
+    rec["carried_from"] = str(since_case)
+    return rec
+
+
+def load_case(case_dir: Path) -> Tuple[Iterator[InventoryItem], Dict[str, HashRecord]]:
+    """Inventario (en streaming) y registros de hash de un caso existente."""
+    inventory = case_dir / "inventario.csv"
+    hashes = case_dir / "hashes.csv"
+    if not inventory.exists() or not hashes.exists():
+        raise FileNotFoundError(f"{case_dir} no contiene inventario.csv y hashes.csv")
+    return iter_inventory_csv(inventory), load_hash_records(hashes)
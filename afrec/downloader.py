@@ -1,54 +1,531 @@
 """ Aquí se Maneja la descarga controlada de archivos desde Dropbox (files/download).
-Incluye un sistema de reintentos automáticos en caso de fallos o rate limits.
+Los reintentos y la concurrencia efectiva los gobierna scheduler.AdaptiveScheduler,
+que respeta el backoff de Dropbox y no reintenta errores permanentes.
 Guarda cada archivo en la carpeta cases/.../evidence/.
 Tras cada descarga, genera registros de integridad con integrity.py.
+En modo streaming (por defecto) cada bloque recibido se escribe en disco y alimenta
+los hashers a la vez, sin releer el archivo; las transferencias truncadas se detectan
+al terminar el cuerpo de la respuesta y se reintentan.
+Permite descargas concurrentes con un pool acotado de workers (--workers),
+manteniendo el orden determinista de hashes.csv. iter_download_files consume el
+inventario en streaming con una ventana acotada de descargas en curso.
+Con deduplicación, cada content_hash distinto se descarga una sola vez y las rutas
+repetidas se materializan como hardlinks o como referencias al archivo descargado.
+Los archivos muy grandes se descargan en segmentos paralelos (cabecera Range) alineados
+a bloques de 4 MiB, de modo que el content hash se combina por segmento.
+Con ``metrics`` se registran el tiempo de descarga y de hash de cada archivo y la
+profundidad de la ventana de descargas (ver metrics.py).
 Garantiza descargas completas y confiables. """
 
 from __future__ import annotations
 
+import logging
+import os
+import shutil
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from dropbox import Dropbox
-from dropbox.exceptions import ApiError
 
-from .integrity import build_hash_record
+from . import journal as jr
+from .integrity import (
+    DROPBOX_BLOCK_SIZE,
+    BlockHasher,
+    HashRecord,
+    MultiHasher,
+    build_hash_record,
+    content_hash_from_blocks,
+    hash_record_from_digests,
+)
+from .metrics import AcquisitionMetrics
+from .scheduler import AdaptiveScheduler
 
+logger = logging.getLogger("afrec")
 
-def _retry(fn, *, retries: int = 5, base_delay: float = 1.0):
-    last = None
-    for attempt in range(retries):
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+ReuseFn = Callable[[Dict[str, Any]], Optional[HashRecord]]
+
+# Modos de deduplicación por content_hash
+DEDUP_HARDLINK = "hardlink"
+DEDUP_REFERENCE = "reference"
+
+
+class IncompleteDownloadError(ConnectionError):
+    """La respuesta de files/download terminó antes de entregar todos los bytes."""
+
+
+@dataclass(frozen=True)
+class SegmentPolicy:
+    """Cuándo y cómo partir un archivo en segmentos descargados en paralelo."""
+
+    threshold: int = 512 * 1024 * 1024
+    segment_size: int = 16 * DROPBOX_BLOCK_SIZE
+    workers: int = 4
+
+    def __post_init__(self) -> None:
+        if self.segment_size <= 0 or self.segment_size % DROPBOX_BLOCK_SIZE:
+            raise ValueError("segment_size debe ser múltiplo de 4 MiB")
+        if self.workers < 1:
+            raise ValueError("workers debe ser >= 1")
+
+    def applies(self, size: int | None) -> bool:
+        return size is not None and self.threshold > 0 and size > self.threshold
+
+
+@dataclass(frozen=True)
+class _Primary:
+    """Lo mínimo de una descarga primaria para materializar sus duplicados."""
+
+    path_local: str
+    path_dropbox: str
+    sha256: str
+    md5: str
+    content_hash: str
+
+    @classmethod
+    def from_record(cls, rec: HashRecord) -> "_Primary":
+        return cls(
+            str(rec["path_local"]),
+            str(rec["path_dropbox"]),
+            str(rec["sha256"]),
+            str(rec["md5"]),
+            str(rec["dropbox_content_hash_local"]),
+        )
+
+
+@dataclass
+class _Slot:
+    """Posición de la ventana de descargas, en el orden del inventario.
+
+    ``future`` queda en None mientras la ruta espera a su descarga primaria; ``primary_of``
+    indica el content_hash del que esta descarga es la primaria.
+    """
+
+    item: Dict[str, str | int | None]
+    future: Optional[Future] = None
+    primary_of: Optional[str] = None
+
+
+def _stream_to_file(
+    dbx: Dropbox,
+    dropbox_path: str,
+    local_path: Path,
+    expected_size: int | None,
+    timings: Optional[Dict[str, float]] = None,
+    rev: str | None = None,
+) -> MultiHasher:
+    """Descarga con files_download escribiendo y hasheando cada bloque en una sola pasada.
+
+    Menos bytes que ``expected_size`` es un corte reintentable; más bytes no se arregla
+    reintentando, así que el archivo se conserva y su registro queda sin coincidencia.
+    """
+    part_path = local_path.with_name(local_path.name + ".part")
+    hasher = MultiHasher()
+    hashing = 0.0
+    _, response = dbx.files_download(dropbox_path, rev=rev)
+    try:
+        with open(part_path, "wb") as fh:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                fh.write(chunk)
+                started = time.perf_counter()
+                hasher.update(chunk)
+                hashing += time.perf_counter() - started
+    except BaseException:
+        # Un corte a mitad no debe dejar el .part dentro de evidence/
+        part_path.unlink(missing_ok=True)
+        raise
+    finally:
+        response.close()
+        if timings is not None:
+            timings["hash"] = timings.get("hash", 0.0) + hashing
+    if expected_size is not None and hasher.size > expected_size:
+        logger.warning(
+            "%s: recibidos %d bytes, el listado indica %d", dropbox_path, hasher.size,
+            expected_size,
+        )
+    elif expected_size is not None and hasher.size < expected_size:
+        part_path.unlink(missing_ok=True)
+        raise IncompleteDownloadError(
+            f"{dropbox_path}: recibidos {hasher.size} de {expected_size} bytes"
+        )
+    part_path.replace(local_path)
+    return hasher
+
+
+def _fetch_segment(
+    dbx: Dropbox,
+    dropbox_path: str,
+    rev: str | None,
+    part_path: Path,
+    offset: int,
+    length: int,
+) -> List[bytes]:
+    """Descarga un rango de bytes en su posición y devuelve los SHA-256 de sus bloques."""
+    blocks = BlockHasher()
+    received = 0
+    headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+    _, response = dbx.files_download(dropbox_path, rev=rev, extra_headers=headers)
+    try:
+        with open(part_path, "r+b") as fh:
+            fh.seek(offset)
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                if received + len(chunk) > length:
+                    raise ValueError(
+                        f"{dropbox_path}: el servidor ignoró el rango {headers['Range']}"
+                    )
+                fh.write(chunk)
+                blocks.update(chunk)
+                received += len(chunk)
+    finally:
+        response.close()
+    if received != length:
+        raise IncompleteDownloadError(
+            f"{dropbox_path}: segmento {offset}: recibidos {received} de {length} bytes"
+        )
+    return blocks.digests()
+
+
+def _segmented_to_file(
+    dbx: Dropbox,
+    dropbox_path: str,
+    rev: str | None,
+    local_path: Path,
+    size: int,
+    policy: SegmentPolicy,
+    scheduler: AdaptiveScheduler,
+    timings: Optional[Dict[str, float]] = None,
+) -> Dict[str, str]:
+    """Descarga en segmentos paralelos y devuelve los mismos digests que la descarga continua.
+
+    El content hash se arma con los bloques de cada segmento (sin releer). SHA-256 y MD5
+    necesitan los bytes en orden: cada segmento se relee (desde la caché de páginas) en
+    cuanto terminan él y los anteriores, mientras los siguientes siguen descargándose.
+    Si algo falla, el ``.part`` se borra.
+    """
+    part_path = local_path.with_name(local_path.name + ".part")
+    step = policy.segment_size
+    ranges = [(off, min(step, size - off)) for off in range(0, size, step)]
+
+    def _segment(r: Tuple[int, int]) -> List[bytes]:
+        return scheduler.run(lambda: _fetch_segment(dbx, dropbox_path, rev, part_path, r[0], r[1]))
+
+    hasher = MultiHasher(content_hash=False)
+    segment_blocks: List[List[bytes]] = []
+    hash_seconds = 0.0
+    buf = bytearray(DROPBOX_BLOCK_SIZE)
+    view = memoryview(buf)
+    try:
+        with open(part_path, "wb") as fh:
+            fh.truncate(size)
+        with ThreadPoolExecutor(
+            max_workers=policy.workers, thread_name_prefix="afrec-seg"
+        ) as pool, open(part_path, "rb", buffering=0) as reader:
+            futures = [pool.submit(_segment, r) for r in ranges]
+            try:
+                for (offset, length), future in zip(ranges, futures):
+                    segment_blocks.append(future.result())
+                    started = time.perf_counter()
+                    reader.seek(offset)
+                    remaining = length
+                    while remaining:
+                        n = reader.readinto(view[: min(remaining, len(buf))])
+                        if not n:
+                            raise ValueError(f"{dropbox_path}: segmento incompleto en {offset}")
+                        hasher.update(view[:n])
+                        remaining -= n
+                    hash_seconds += time.perf_counter() - started
+            finally:
+                # Ante un error no se siguen pidiendo los segmentos que aún no empezaron
+                for future in futures:
+                    future.cancel()
+        part_path.replace(local_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    if timings is not None:
+        timings["hash"] = timings.get("hash", 0.0) + hash_seconds
+    digests = hasher.hexdigests()
+    digests["dropbox_content_hash"] = content_hash_from_blocks(
+        d for blocks in segment_blocks for d in blocks
+    )
+    return digests
+
+
+def _download_one(
+    dbx: Dropbox,
+    item: Dict[str, str | int | None],
+    evidence_root: Path,
+    stream: bool = True,
+    journal: Optional[jr.AcquisitionJournal] = None,
+    scheduler: Optional[AdaptiveScheduler] = None,
+    segments: Optional[SegmentPolicy] = None,
+    reuse: Optional[ReuseFn] = None,
+    timings: Optional[Dict[str, float]] = None,
+    segment_scheduler: Optional[AdaptiveScheduler] = None,
+) -> HashRecord:
+    """Descarga un elemento y devuelve su registro de hash.
+
+    Si se pasa ``timings``, al descargar (no al reutilizar un registro) se agregan
+    "download" (segundos totales, con reintentos) y "hash" (segundos de hash).
+    Los segmentos usan ``segment_scheduler`` (por defecto, uno propio con
+    ``segments.workers`` turnos), no los turnos de las descargas de archivos."""
+    scheduler = scheduler or AdaptiveScheduler()
+    path_display = str(item["path_display"])
+    dropbox_path = path_display
+    local_path = evidence_root / path_display.strip("/")
+
+    if reuse is not None:
+        existing = reuse(item)
+        if existing is not None:
+            return existing
+
+    if journal is not None:
+        previous = journal.verified_record(item, local_path)
+        if previous is not None:
+            return previous
+        journal.mark(item, jr.PENDING)
+
+    # Solo se crea la carpeta cuando de verdad se escribe un archivo
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    size = item.get("size")
+    expected = int(size) if size is not None else None
+    rev = str(item["rev"]) if item.get("rev") else None
+    started = time.perf_counter()
+    if stream and segments is not None and segments.applies(expected):
+        seg_scheduler = segment_scheduler or AdaptiveScheduler(max_concurrency=segments.workers)
+        digests = _segmented_to_file(
+            dbx, dropbox_path, rev, local_path, int(expected or 0), segments, seg_scheduler,
+            timings,
+        )
+        rec = hash_record_from_digests(local_path, item, digests)
+    elif stream:
+        hasher = scheduler.run(
+            lambda: _stream_to_file(dbx, dropbox_path, local_path, expected, timings, rev)
+        )
+        rec = hash_record_from_digests(local_path, item, hasher.hexdigests())
+    else:
+        def _dl():
+            dbx.files_download_to_file(str(local_path), dropbox_path)
+
+        scheduler.run(_dl)
+        hashed = time.perf_counter()
+        rec = build_hash_record(local_path, item)
+        if timings is not None:
+            timings["hash"] = time.perf_counter() - hashed
+    if timings is not None:
+        timings["download"] = time.perf_counter() - started
+
+    if journal is not None:
+        journal.mark_record(item, rec)
+    return rec
+
+
+def _materialize_duplicate(
+    item: Dict[str, str | int | None],
+    primary: _Primary,
+    evidence_root: Path,
+    mode: str,
+) -> HashRecord:
+    """Registro de una ruta cuyo contenido ya se descargó bajo otra ruta."""
+    primary_local = Path(primary.path_local)
+    if mode == DEDUP_HARDLINK:
+        local_path = evidence_root / str(item["path_display"]).strip("/")
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        if local_path.exists():
+            local_path.unlink()
         try:
-            return fn()
-        except ApiError as e:
-            delay = base_delay * (2 ** attempt)
-            time.sleep(delay)
-            last = e
-        except Exception as e:  # pragma: no cover
-            last = e
-            time.sleep(base_delay * (2 ** attempt))
-    if last:
-        raise last
+            os.link(primary_local, local_path)
+        except OSError:
+            # Sistemas de archivos sin hardlinks: copia fiel del contenido
+            shutil.copy2(primary_local, local_path)
+    else:
+        local_path = primary_local
+    digests = {
+        "sha256": primary.sha256,
+        "md5": primary.md5,
+        "dropbox_content_hash": primary.content_hash,
+    }
+    rec = hash_record_from_digests(local_path, item, digests)
+    rec["dedup_of"] = primary.path_dropbox
+    return rec
 
 
-def download_files(
+def iter_download_files(
     dbx: Dropbox,
     items: Iterable[Dict[str, str | int | None]],
     evidence_root: Path,
-) -> List[Dict[str, str | int | None]]:
+    workers: int = 1,
+    stream: bool = True,
+    journal: Optional[jr.AcquisitionJournal] = None,
+    scheduler: Optional[AdaptiveScheduler] = None,
+    segments: Optional[SegmentPolicy] = None,
+    dedup: Optional[str] = None,
+    reuse: Optional[ReuseFn] = None,
+    metrics: Optional[AcquisitionMetrics] = None,
+) -> Iterator[HashRecord]:
+    """Descarga los elementos a medida que llegan y entrega sus registros de hash en orden.
+
+    Consume ``items`` de forma perezosa con una ventana acotada de descargas en curso, de
+    modo que la memoria no crece con el tamaño del inventario y las descargas pueden
+    empezar antes de que termine el listado.
+
+    Con ``workers > 1`` las descargas se reparten en un pool de hilos; los
+    registros se devuelven siempre en el orden del inventario. Con ``stream=False``
+    se usa files_download_to_file y se rehashea el archivo desde disco. Si se pasa un
+    ``journal``, los archivos ya verificados se omiten y cada estado queda registrado.
+    El ``scheduler`` (compartido entre workers) decide reintentos y concurrencia efectiva.
+    Con ``segments``, los archivos que superan el umbral se descargan por rangos en paralelo,
+    con un planificador propio de ``workers * segments.workers`` turnos.
+    Con ``dedup`` ("hardlink" o "reference") cada content_hash se descarga una sola vez;
+    las demás rutas con el mismo contenido llevan ``dedup_of`` con la ruta descargada.
+    ``reuse`` puede devolver un registro ya existente (p.ej. de un caso anterior) para omitir
+    la descarga de ese elemento. Con ``metrics`` se registran los tiempos de cada archivo,
+    la profundidad de la ventana y (si no se pasa ``scheduler``) la latencia de cada petición.
+    """
+    if workers < 1:
+        raise ValueError("workers debe ser >= 1")
+    if dedup not in (None, DEDUP_HARDLINK, DEDUP_REFERENCE):
+        raise ValueError(f"Modo de deduplicación no soportado: {dedup}")
     evidence_root.mkdir(parents=True, exist_ok=True)
-    hash_records: List[Dict[str, str | int | None]] = []
-    for i in items:
-        path_display = str(i["path_display"])
-        dropbox_path = path_display
-        local_path = evidence_root / path_display.strip("/")
-        local_path.parent.mkdir(parents=True, exist_ok=True)
+    scheduler = scheduler or AdaptiveScheduler(max_concurrency=workers, metrics=metrics)
+    # Cada archivo en descarga puede usar hasta segments.workers rangos a la vez; si los
+    # segmentos compartieran los turnos de ``scheduler``, con --workers 1 irían de a uno
+    segment_scheduler = (
+        AdaptiveScheduler(
+            max_concurrency=workers * segments.workers, metrics=metrics, name="segment"
+        )
+        if segments is not None
+        else None
+    )
+    started = time.monotonic()
+    totals = {"files": 0, "bytes": 0, "bytes_transferred": 0, "dedup_references": 0}
 
-        def _dl():
-            dbx.files_download_to_file(str(local_path), dropbox_path)
+    def _count(rec: HashRecord) -> HashRecord:
+        size = int(rec.get("size") or 0)
+        totals["files"] += 1
+        totals["bytes"] += size
+        if rec.get("dedup_of"):
+            totals["dedup_references"] += 1
+        elif not rec.get("carried_from"):
+            totals["bytes_transferred"] += size
+        return rec
+
+    def _one(i: Dict[str, str | int | None]) -> HashRecord:
+        timings: Optional[Dict[str, float]] = {} if metrics is not None else None
+        rec = _download_one(
+            dbx, i, evidence_root, stream, journal, scheduler, segments, reuse, timings,
+            segment_scheduler,
+        )
+        if metrics is not None:
+            metrics.file_done(rec, timings or {})
+        return rec
+
+    def _dup(i: Dict[str, str | int | None], primary: _Primary) -> HashRecord:
+        rec = _materialize_duplicate(i, primary, evidence_root, str(dedup))
+        if journal is not None:
+            journal.mark_record(i, rec)
+        if metrics is not None:
+            metrics.file_done(rec, {})
+        return rec
+
+    # Por content_hash: la primaria ya entregada (None si no sirve para deduplicar) o las
+    # rutas que esperan a que termine. No se guardan futuros ni registros completos
+    primaries: Dict[str, Optional[_Primary]] = {}
+    waiting: Dict[str, List[_Slot]] = {}
+    window: Deque[_Slot] = deque()
+    max_pending = workers * 2
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="afrec-dl") as pool:
+
+        def _deliver(slot: _Slot) -> HashRecord:
+            # La primaria va antes en el inventario, así que ya se entregó y sus rutas
+            # duplicadas ya tienen su propia descarga o materialización encolada
+            assert slot.future is not None
+            rec = slot.future.result()
+            ch = slot.primary_of
+            if ch is not None:
+                # Solo se reutiliza contenido cuya descarga coincidió con el hash remoto
+                ok = rec.get("dropbox_hash_match") == "yes"
+                primary = primaries[ch] = _Primary.from_record(rec) if ok else None
+                for dup in waiting.pop(ch):
+                    dup.future = _submit(dup.item, primary)
+            return _count(rec)
+
+        def _submit(i: Dict[str, str | int | None], primary: Optional[_Primary]) -> Future:
+            return pool.submit(_dup, i, primary) if primary else pool.submit(_one, i)
 
-        _retry(_dl, retries=6, base_delay=1.5)
-        rec = build_hash_record(local_path, i)
-        hash_records.append(rec)
-    return hash_records
+        try:
+            for i in items:
+                ch = str(i["content_hash"]) if dedup and i.get("content_hash") else None
+                slot = _Slot(i)
+                if ch is not None and ch in primaries:
+                    slot.future = _submit(i, primaries[ch])
+                elif ch is not None and ch in waiting:
+                    waiting[ch].append(slot)
+                else:
+                    slot.future = pool.submit(_one, i)
+                    if ch is not None:
+                        slot.primary_of = ch
+                        waiting[ch] = []
+                window.append(slot)
+                if metrics is not None:
+                    metrics.file_submitted(len(window))
+                while len(window) >= max_pending:
+                    yield _deliver(window.popleft())
+            while window:
+                yield _deliver(window.popleft())
+        finally:
+            for slot in window:
+                if slot.future is not None:
+                    slot.future.cancel()
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        "download_stats",
+        extra={
+            **totals,
+            "seconds": round(elapsed, 3),
+            "bytes_per_s": round(totals["bytes_transferred"] / elapsed, 1) if elapsed > 0 else None,
+            "workers": workers,
+            **scheduler.stats(),
+        },
+    )
+
+
+def download_files(
+    dbx: Dropbox,
+    items: Iterable[Dict[str, str | int | None]],
+    evidence_root: Path,
+    workers: int = 1,
+    stream: bool = True,
+    journal: Optional[jr.AcquisitionJournal] = None,
+    scheduler: Optional[AdaptiveScheduler] = None,
+    segments: Optional[SegmentPolicy] = None,
+    dedup: Optional[str] = None,
+    reuse: Optional[ReuseFn] = None,
+    metrics: Optional[AcquisitionMetrics] = None,
+) -> List[HashRecord]:
+    """Versión materializada de :func:`iter_download_files`."""
+    return list(
+        iter_download_files(
+            dbx,
+            items,
+            evidence_root,
+            workers=workers,
+            stream=stream,
+            journal=journal,
+            scheduler=scheduler,
+            segments=segments,
+            dedup=dedup,
+            reuse=reuse,
+            metrics=metrics,
+        )
+    )
@@ -1,53 +1,403 @@
 """ Aquí se Gestiona la exploración del espacio de archivos en Dropbox (files/list_folder).
 Permite:
-* Listado recursivo de carpetas.
-* Filtrado por extensión y rango de fechas.
-* Generación de inventarios (inventario.json, inventario.csv).
+* Listado recursivo de carpetas, opcionalmente particionado por subcarpeta de primer
+  nivel y recorrido en paralelo (--partitions).
+* Filtrado con un filtro precompilado (ver filters.py): extensión, rutas, tamaño y fechas.
+* Descubrimiento alternativo con files/search_v2 (filtro de extensión en el servidor),
+  elegido por un planificador cuando los filtros son estrechos (--discovery).
+* Generación de inventarios (inventario.json, inventario.csv) y su relectura.
+* Cursores finales del listado (cursores.json) para pedir solo los cambios posteriores.
+* Recorrido en streaming (iter_inventory): cada elemento se entrega apenas llega su página,
+  y InventoryWriter lo escribe sin mantener la lista completa en memoria.
 * Cada elemento incluye metadatos: nombre, ruta, tamaño, fechas, hash remoto (content_hash).
 Es la base del inventario lógico de evidencias. """
 
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
-from dateutil import parser as dtparser
 from dropbox import Dropbox
 from dropbox import files as dbx_files
 
+from .compact import pack_hex, pack_ts, unpack_hex, unpack_ts
+from .filters import EntryFilter, FilterSpec, ext_matches, normalize_ext
+from .scheduler import AdaptiveScheduler
+from .utils import prefetch_many
+
 
-@dataclass
 class InventoryItem:
-    path_display: str
-    id: str
-    size: int
-    client_modified: str
-    server_modified: str
-    rev: str
-    content_hash: str | None
+    """Archivo del inventario.
+
+    Se guarda en forma compacta (ver compact.py): fechas como epoch y content_hash en
+    bytes; los atributos client_modified, server_modified y content_hash devuelven las
+    mismas cadenas de siempre, de modo que inventario.json/csv no cambian.
+    """
+
+    __slots__ = (
+        "path_display",
+        "id",
+        "size",
+        "_client_modified",
+        "_server_modified",
+        "rev",
+        "_content_hash",
+    )
+
+    def __init__(
+        self,
+        path_display: str,
+        id: str,
+        size: int,
+        client_modified: Union[datetime, str],
+        server_modified: Union[datetime, str],
+        rev: str,
+        content_hash: Optional[str],
+    ) -> None:
+        self.path_display = path_display
+        self.id = id
+        self.size = size
+        self._client_modified = pack_ts(client_modified)
+        self._server_modified = pack_ts(server_modified)
+        self.rev = rev
+        self._content_hash = pack_hex(content_hash)
+
+    @property
+    def client_modified(self) -> str:
+        return unpack_ts(self._client_modified)  # type: ignore[return-value]
+
+    @property
+    def server_modified(self) -> str:
+        return unpack_ts(self._server_modified)  # type: ignore[return-value]
 
+    @property
+    def content_hash(self) -> Optional[str]:
+        return unpack_hex(self._content_hash)
 
-def _parse_date(d: str | None) -> Optional[datetime]:
-    if not d:
-        return None
-    return dtparser.parse(d)
+    def to_dict(self) -> Dict[str, Any]:
+        """Diccionario con las columnas de INVENTORY_FIELDS, tal como se escriben."""
+        return {
+            "path_display": self.path_display,
+            "id": self.id,
+            "size": self.size,
+            "client_modified": self.client_modified,
+            "server_modified": self.server_modified,
+            "rev": self.rev,
+            "content_hash": self.content_hash,
+        }
+
+    def _key(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, f) for f in self.__slots__)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, InventoryItem):
+            return NotImplemented
+        return self._key() == other._key()
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        args = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items())
+        return f"InventoryItem({args})"
 
 
 def _ext_matches(path: str, exts: Optional[Sequence[str]]) -> bool:
+    return ext_matches(path, exts)
+
+
+def _compile_filter(
+    exts: Optional[Sequence[str]],
+    date_from: Optional[str],
+    date_to: Optional[str],
+    filters: Optional[FilterSpec],
+) -> EntryFilter:
+    """``filters`` (si se da) reemplaza a los parámetros sueltos exts/date_from/date_to."""
+    if filters is None:
+        filters = FilterSpec.create(exts, date_from, date_to)
+    return filters.compile()
+
+
+def _to_items(
+    entries: Iterable[dbx_files.Metadata],
+    flt: EntryFilter,
+) -> Iterator[InventoryItem]:
+    for entry in entries:
+        if isinstance(entry, dbx_files.FileMetadata) and flt.matches(entry):
+            yield InventoryItem(
+                path_display=entry.path_display,
+                id=entry.id,
+                size=entry.size,
+                client_modified=entry.client_modified,
+                server_modified=entry.server_modified,
+                rev=entry.rev,
+                content_hash=getattr(entry, "content_hash", None),
+            )
+
+
+def _iter_pages(
+    dbx: Dropbox,
+    path: str,
+    recursive: bool,
+    scheduler: Optional[AdaptiveScheduler] = None,
+    cursors: Optional[List[Dict[str, Any]]] = None,
+    start_cursor: Optional[str] = None,
+) -> Iterator[dbx_files.ListFolderResult]:
+    """Sigue la cadena de cursores de files_list_folder y entrega cada página.
+
+    Si se pasa ``cursors``, al terminar la cadena se agrega allí el cursor final para
+    poder pedir más adelante solo los cambios. Con ``start_cursor`` la cadena continúa
+    desde un cursor guardado en lugar de listar desde cero.
+    """
+    run = scheduler.run if scheduler is not None else (lambda fn: fn())
+    if start_cursor is not None:
+        result = run(lambda: dbx.files_list_folder_continue(start_cursor))
+    else:
+        result = run(
+            lambda: dbx.files_list_folder(
+                path, recursive=recursive, include_non_downloadable_files=True, limit=2000
+            )
+        )
+    while True:
+        yield result
+        if not result.has_more:
+            break
+        cursor = result.cursor
+        result = run(lambda: dbx.files_list_folder_continue(cursor))
+    if cursors is not None:
+        cursors.append({"path": path, "recursive": recursive, "cursor": result.cursor})
+
+
+def iter_inventory(
+    dbx: Dropbox,
+    root: str = "/",
+    exts: Optional[Sequence[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    partitions: int = 1,
+    scheduler: Optional[AdaptiveScheduler] = None,
+    cursors: Optional[List[Dict[str, Any]]] = None,
+    filters: Optional[FilterSpec] = None,
+) -> Iterator[InventoryItem]:
+    """Recorre la carpeta página a página y entrega cada archivo apenas llega su página.
+
+    Con ``partitions > 1`` se lista la raíz sin recursión y luego se recorre la cadena de
+    cursores recursiva de cada subcarpeta de primer nivel en paralelo (hasta ``partitions``
+    a la vez). El resultado se entrega en orden estable: archivos de la raíz y después cada
+    subcarpeta completa en el orden en que la devolvió Dropbox. Los cursores finales de
+    cada cadena se agregan a ``cursors`` (ver :func:`save_cursors`).
+    """
+    flt = _compile_filter(exts, date_from, date_to, filters)
+
+    if partitions <= 1:
+        for page in _iter_pages(dbx, root, True, scheduler, cursors):
+            yield from _to_items(page.entries, flt)
+        return
+
+    folders: List[str] = []
+    for page in _iter_pages(dbx, root, False, scheduler, cursors):
+        for entry in page.entries:
+            if isinstance(entry, dbx_files.FolderMetadata):
+                folders.append(entry.path_lower or entry.path_display)
+        yield from _to_items(page.entries, flt)
+
+    def _partition(folder: str) -> Callable[[], Iterator[InventoryItem]]:
+        def _walk() -> Iterator[InventoryItem]:
+            for page in _iter_pages(dbx, folder, True, scheduler, cursors):
+                yield from _to_items(page.entries, flt)
+
+        return _walk
+
+    yield from prefetch_many([_partition(f) for f in folders], workers=partitions)
+
+
+# Dropbox no pagina más allá de este número de coincidencias en files/search_v2
+SEARCH_RESULT_CAP = 10_000
+# Más extensiones que esto deja de ser una consulta "estrecha"
+SEARCH_MAX_EXTS = 10
+
+ENGINE_LIST = "list"
+ENGINE_SEARCH = "search"
+ENGINE_AUTO = "auto"
+
+
+def _iter_search(
+    dbx: Dropbox,
+    root: str,
+    exts: Sequence[str],
+    scheduler: Optional[AdaptiveScheduler] = None,
+) -> Iterator[Tuple[str, dbx_files.Metadata]]:
+    """Busca en el servidor los archivos con las extensiones dadas bajo ``root``.
+
+    Hace una consulta por extensión y entrega cada resultado junto a la extensión de la
+    consulta que lo produjo.
+    """
+    run = scheduler.run if scheduler is not None else (lambda fn: fn())
+    scope = None if root in ("", "/") else root
+    for ext in dict.fromkeys(normalize_ext(e) for e in exts):
+        options = dbx_files.SearchOptions(
+            path=scope,
+            max_results=1000,
+            file_status=dbx_files.FileStatus.active,
+            filename_only=True,
+            file_extensions=[ext[1:]],
+        )
+        result = run(lambda: dbx.files_search_v2(ext[1:], options=options))
+        while True:
+            for match in result.matches:
+                if match.metadata.is_metadata():
+                    yield ext, match.metadata.get_metadata()
+            if not result.has_more:
+                break
+            cursor = result.cursor
+            result = run(lambda: dbx.files_search_continue_v2(cursor))
+
+
+def search_inventory(
+    dbx: Dropbox,
+    root: str = "/",
+    exts: Optional[Sequence[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    scheduler: Optional[AdaptiveScheduler] = None,
+    filters: Optional[FilterSpec] = None,
+) -> Optional[List[InventoryItem]]:
+    """Descubre archivos con files_search_v2 filtrando por extensión en el servidor.
+
+    Produce los mismos InventoryItem que el listado completo (mismos filtros locales).
+    Devuelve None si alguna consulta (una por extensión) alcanza el tope de resultados de
+    Dropbox, porque en ese caso el resultado podría estar truncado y hay que listar la
+    carpeta completa.
+    """
+    if filters is not None:
+        exts = filters.exts
     if not exts:
-        return True
-    p = Path(path.lower())
-    return p.suffix in {e.lower().strip() if e.startswith(".") else "." + e.lower().strip() for e in exts}
+        raise ValueError("La búsqueda en servidor requiere al menos una extensión")
+    flt = _compile_filter(exts, date_from, date_to, filters)
+    items: Dict[str, InventoryItem] = {}
+    # El tope de Dropbox se aplica a cada consulta, no a la suma de todas
+    matches: Dict[str, int] = {}
+    for ext, entry in _iter_search(dbx, root, exts, scheduler):
+        matches[ext] = matches.get(ext, 0) + 1
+        if matches[ext] >= SEARCH_RESULT_CAP:
+            return None
+        for item in _to_items([entry], flt):
+            items.setdefault(item.id, item)
+    return sorted(items.values(), key=lambda i: i.path_display.lower())
+
+
+def plan_discovery(
+    engine: str,
+    exts: Optional[Sequence[str]],
+) -> str:
+    """Elige el motor de descubrimiento: búsqueda en servidor solo para filtros estrechos."""
+    if engine not in (ENGINE_AUTO, ENGINE_LIST, ENGINE_SEARCH):
+        raise ValueError(f"Motor de descubrimiento no soportado: {engine}")
+    if engine != ENGINE_AUTO:
+        return engine
+    if exts and len(exts) <= SEARCH_MAX_EXTS:
+        return ENGINE_SEARCH
+    return ENGINE_LIST
+
+
+def discover_inventory(
+    dbx: Dropbox,
+    root: str = "/",
+    exts: Optional[Sequence[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    engine: str = ENGINE_AUTO,
+    partitions: int = 1,
+    scheduler: Optional[AdaptiveScheduler] = None,
+    cursors: Optional[List[Dict[str, Any]]] = None,
+    filters: Optional[FilterSpec] = None,
+) -> Tuple[str, Iterator[InventoryItem]]:
+    """Planifica y ejecuta el descubrimiento; devuelve el motor usado y los elementos.
+
+    Con ``engine="auto"`` se intenta la búsqueda en servidor cuando hay filtro de
+    extensiones y, si supera el tope de resultados, se recurre al listado completo.
+    Solo el listado deja cursores para inventarios delta. El índice de búsqueda de Dropbox
+    puede tardar en reflejar cambios muy recientes; use ``engine="list"`` si eso importa.
+    """
+    if filters is not None:
+        exts = filters.exts
+    if plan_discovery(engine, exts) == ENGINE_SEARCH:
+        found = search_inventory(dbx, root, exts, date_from, date_to, scheduler, filters)
+        if found is not None:
+            return ENGINE_SEARCH, iter(found)
+        if engine == ENGINE_SEARCH:
+            raise ValueError(
+                f"La búsqueda superó {SEARCH_RESULT_CAP} coincidencias; use el listado completo"
+            )
+    listing = iter_inventory(
+        dbx,
+        root=root,
+        exts=exts,
+        date_from=date_from,
+        date_to=date_to,
+        partitions=partitions,
+        scheduler=scheduler,
+        cursors=cursors,
+        filters=filters,
+    )
+    return ENGINE_LIST, listing
+
+
+def iter_listing_changes(
+    dbx: Dropbox,
+    saved: Sequence[Dict[str, Any]],
+    scheduler: Optional[AdaptiveScheduler] = None,
+    cursors: Optional[List[Dict[str, Any]]] = None,
+) -> Iterator[dbx_files.Metadata]:
+    """Entrega las entradas añadidas, modificadas o eliminadas desde los cursores guardados.
+
+    En listados particionados, una subcarpeta nueva de primer nivel aparece en el cursor
+    no recursivo de la raíz y se recorre completa; las subcarpetas eliminadas no se continúan.
+    """
+    partitions = [c for c in saved if c["recursive"]]
+    deleted_tops = set()
+    for c in saved:
+        if c["recursive"]:
+            continue
+        for page in _iter_pages(dbx, c["path"], False, scheduler, cursors, c["cursor"]):
+            for entry in page.entries:
+                if isinstance(entry, dbx_files.DeletedMetadata):
+                    deleted_tops.add(entry.path_lower)
+                elif isinstance(entry, dbx_files.FolderMetadata):
+                    partitions.append(
+                        {"path": entry.path_lower, "recursive": True, "cursor": None}
+                    )
+                yield entry
+    for c in partitions:
+        if c["cursor"] is not None and c["path"].lower() in deleted_tops:
+            continue
+        for page in _iter_pages(dbx, c["path"], True, scheduler, cursors, c["cursor"]):
+            yield from page.entries
+
+
+def save_cursors(state: Dict[str, Any], out_file: Path) -> None:
+    """Guarda los cursores finales del listado (cursores.json) junto con sus filtros."""
+    import json
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_file, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, ensure_ascii=False, indent=2)
 
 
-def _date_in_range(server_modified: datetime, date_from: Optional[datetime], date_to: Optional[datetime]) -> bool:
-    if date_from and server_modified < date_from:
-        return False
-    if date_to and server_modified > date_to:
-        return False
-    return True
+def load_cursors(in_file: Path) -> Dict[str, Any]:
+    import json
+    with open(in_file, "r", encoding="utf-8") as fh:
+        return json.load(fh)
 
 
 def list_inventory(
@@ -56,53 +406,117 @@ def list_inventory(
     exts: Optional[Sequence[str]] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    partitions: int = 1,
+    filters: Optional[FilterSpec] = None,
 ) -> List[InventoryItem]:
-    from_dt = _parse_date(date_from)
-    to_dt = _parse_date(date_to)
-
-    result = dbx.files_list_folder(root, recursive=True, include_non_downloadable_files=True, limit=2000)
-    items: List[InventoryItem] = []
-
-    def handle_entries(entries: Iterable[dbx_files.Metadata]) -> None:
-        for entry in entries:
-            if isinstance(entry, dbx_files.FileMetadata):
-                if not _ext_matches(entry.path_display, exts):
-                    continue
-                if not _date_in_range(entry.server_modified, from_dt, to_dt):
-                    continue
-                items.append(
-                    InventoryItem(
-                        path_display=entry.path_display,
-                        id=entry.id,
-                        size=entry.size,
-                        client_modified=entry.client_modified.isoformat(),
-                        server_modified=entry.server_modified.isoformat(),
-                        rev=entry.rev,
-                        content_hash=getattr(entry, "content_hash", None),
-                    )
-                )
+    return list(
+        iter_inventory(
+            dbx,
+            root=root,
+            exts=exts,
+            date_from=date_from,
+            date_to=date_to,
+            partitions=partitions,
+            filters=filters,
+        )
+    )
+
+
+INVENTORY_FIELDS = [
+    "path_display",
+    "id",
+    "size",
+    "client_modified",
+    "server_modified",
+    "rev",
+    "content_hash",
+]
+
+
+class InventoryWriter:
+    """Escribe inventario.json e inventario.csv a medida que llegan los elementos.
+
+    El JSON resultante es idéntico al de ``json.dump(..., indent=2)`` sobre la lista completa,
+    sin necesidad de tenerla en memoria.
+    """
+
+    def __init__(self, json_file: Path, csv_file: Path) -> None:
+        import csv
+        json_file.parent.mkdir(parents=True, exist_ok=True)
+        csv_file.parent.mkdir(parents=True, exist_ok=True)
+        self._json = open(json_file, "w", encoding="utf-8")
+        self._csv_fh = open(csv_file, "w", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._csv_fh, fieldnames=INVENTORY_FIELDS)
+        self._csv.writeheader()
+        self.count = 0
+
+    def __enter__(self) -> "InventoryWriter":
+        return self
 
-    handle_entries(result.entries)
-    while result.has_more:
-        result = dbx.files_list_folder_continue(result.cursor)
-        handle_entries(result.entries)
-    return items
+    def __exit__(self, *exc: object) -> None:
+        self.close()
 
+    def write(self, item: InventoryItem) -> None:
+        import json
+        data = item.to_dict()
+        body = json.dumps(data, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        self._json.write(("[\n  " if self.count == 0 else ",\n  ") + body)
+        self._csv.writerow(data)
+        self.count += 1
 
-def save_inventory_json(items: List[InventoryItem], out_file: Path) -> None:
+    def close(self) -> None:
+        if self._json.closed:
+            return
+        self._json.write("\n]" if self.count else "[]")
+        self._json.close()
+        self._csv_fh.close()
+
+
+def tee_inventory(
+    items: Iterable[InventoryItem], writer: InventoryWriter
+) -> Iterator[InventoryItem]:
+    """Guarda cada elemento en el inventario y lo deja pasar al siguiente paso del pipeline."""
+    for item in items:
+        writer.write(item)
+        yield item
+
+
+def save_inventory_json(items: Iterable[InventoryItem], out_file: Path) -> None:
     import json
     out_file.parent.mkdir(parents=True, exist_ok=True)
-    data = [asdict(i) for i in items]
+    data = [i.to_dict() for i in items]
     with open(out_file, "w", encoding="utf-8") as fh:
         json.dump(data, fh, ensure_ascii=False, indent=2)
 
 
-def save_inventory_csv(items: List[InventoryItem], out_file: Path) -> None:
+def load_inventory_json(in_file: Path) -> List[InventoryItem]:
+    import json
+    with open(in_file, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    return [InventoryItem(**d) for d in data]
+
+
+def iter_inventory_csv(in_file: Path) -> Iterator[InventoryItem]:
+    """Relee inventario.csv fila a fila (sin cargar el inventario completo)."""
+    import csv
+    with open(in_file, "r", newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            yield InventoryItem(
+                path_display=row["path_display"],
+                id=row["id"],
+                size=int(row["size"]),
+                client_modified=row["client_modified"],
+                server_modified=row["server_modified"],
+                rev=row["rev"],
+                content_hash=row["content_hash"] or None,
+            )
+
+
+def save_inventory_csv(items: Iterable[InventoryItem], out_file: Path) -> None:
     import csv
     out_file.parent.mkdir(parents=True, exist_ok=True)
-    headers = ["path_display", "id", "size", "client_modified", "server_modified", "rev", "content_hash"]
     with open(out_file, "w", newline="", encoding="utf-8") as fh:
-        writer = csv.DictWriter(fh, fieldnames=headers)
+        writer = csv.DictWriter(fh, fieldnames=INVENTORY_FIELDS)
         writer.writeheader()
         for i in items:
-            writer.writerow(asdict(i))
+            writer.writerow(i.to_dict())
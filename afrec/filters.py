@@ -0,0 +1,199 @@
+""" Aquí se Compilan los filtros del inventario antes de recorrer la cuenta.
+Permite:
+* Extensiones, rutas incluidas/excluidas (glob o expresión regular), rango de tamaño
+  y rangos de fecha de modificación en el servidor y en el cliente.
+* FilterSpec describe los filtros tal como los escribe el usuario; es lo que se guarda
+  en el caso (adquisicion.json, cursores.json) para reanudar o pedir cambios.
+* compile() lo traduce una sola vez a un EntryFilter: conjunto de extensiones, una sola
+  expresión regular por sentido (inclusión/exclusión) y límites ya convertidos, de modo
+  que evaluar cada entrada no crea objetos nuevos.
+* Las fechas se normalizan a UTC sin zona, como las entrega Dropbox; una fecha escrita
+  sin zona se interpreta en UTC y una con zona se convierte. """
+
+from __future__ import annotations
+
+import fnmatch
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Pattern, Sequence, Tuple
+
+from dateutil import parser as dtparser
+from dropbox import files as dbx_files
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def normalize_ext(e: str) -> str:
+    e = e.lower().strip()
+    return e if e.startswith(".") else "." + e
+
+
+def parse_size(value: Optional[str]) -> Optional[int]:
+    """Convierte "500", "10K", "1.5MB" o "2GiB" a bytes (unidades binarias)."""
+    if value is None or value == "":
+        return None
+    m = _SIZE_RE.match(str(value))
+    if not m:
+        raise ValueError(f"Tamaño no válido: {value!r} (use p.ej. 500, 10K, 1.5MB, 2G)")
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2).upper()])
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Interpreta la fecha y la devuelve en UTC sin zona, comparable con la de Dropbox."""
+    if not value:
+        return None
+    return _utc_naive(dtparser.parse(value))
+
+
+def _utc_naive(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _suffix(path_lower: str) -> str:
+    """Sufijo como Path.suffix: "" para archivos ocultos o sin punto en el nombre."""
+    dot = path_lower.rfind(".")
+    if dot <= path_lower.rfind("/") + 1:
+        return ""
+    return path_lower[dot:]
+
+
+def ext_matches(path: str, exts: Optional[Iterable[str]]) -> bool:
+    if not exts:
+        return True
+    return _suffix(path.lower()) in {normalize_ext(e) for e in exts}
+
+
+def _combine(globs: Sequence[str], regexes: Sequence[str]) -> Optional[Pattern[str]]:
+    """Une globs (ruta completa) y regex (búsqueda en la ruta) en una sola expresión."""
+    parts = [fnmatch.translate(g) for g in globs]
+    parts += [f".*?(?:{r})" for r in regexes]
+    if not parts:
+        return None
+    try:
+        return re.compile("|".join(f"(?:{p})" for p in parts), re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"Expresión regular no válida: {e}") from e
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    exts: Tuple[str, ...] = ()
+    include: Tuple[str, ...] = ()
+    exclude: Tuple[str, ...] = ()
+    include_regex: Tuple[str, ...] = ()
+    exclude_regex: Tuple[str, ...] = ()
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    client_date_from: Optional[str] = None
+    client_date_to: Optional[str] = None
+
+    @classmethod
+    def create(
+        cls,
+        exts: Optional[Iterable[str]] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "FilterSpec":
+        """Normaliza extensiones y convierte listas en tuplas (los campos son inmutables)."""
+        fields: Dict[str, Any] = {
+            k: tuple(v) if isinstance(v, (list, tuple)) else v for k, v in kwargs.items()
+        }
+        exts_t = tuple(dict.fromkeys(normalize_ext(e) for e in exts or () if e.strip()))
+        return cls(exts=exts_t, date_from=date_from, date_to=date_to, **fields)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FilterSpec":
+        return cls.create(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: list(v) if isinstance(v, tuple) else v for k, v in asdict(self).items()}
+
+    def compile(self) -> "EntryFilter":
+        """Valida y precompila; los errores del usuario se informan como ValueError."""
+        min_size, max_size = self.min_size, self.max_size
+        if min_size is not None and max_size is not None and min_size > max_size:
+            raise ValueError("El tamaño mínimo es mayor que el máximo")
+        return EntryFilter(
+            exts=frozenset(self.exts) if self.exts else None,
+            include=_combine(self.include, self.include_regex),
+            exclude=_combine(self.exclude, self.exclude_regex),
+            min_size=min_size,
+            max_size=max_size,
+            server_range=(parse_date(self.date_from), parse_date(self.date_to)),
+            client_range=(parse_date(self.client_date_from), parse_date(self.client_date_to)),
+        )
+
+
+class EntryFilter:
+    """Filtro compilado; matches() se evalúa una vez por cada FileMetadata listado."""
+
+    __slots__ = (
+        "exts",
+        "include",
+        "exclude",
+        "min_size",
+        "max_size",
+        "server_from",
+        "server_to",
+        "client_from",
+        "client_to",
+    )
+
+    def __init__(
+        self,
+        exts: Optional[FrozenSet[str]] = None,
+        include: Optional[Pattern[str]] = None,
+        exclude: Optional[Pattern[str]] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        server_range: Tuple[Optional[datetime], Optional[datetime]] = (None, None),
+        client_range: Tuple[Optional[datetime], Optional[datetime]] = (None, None),
+    ) -> None:
+        self.exts = exts
+        self.include = include
+        self.exclude = exclude
+        self.min_size = min_size
+        self.max_size = max_size
+        self.server_from, self.server_to = server_range
+        self.client_from, self.client_to = client_range
+
+    def matches(self, entry: dbx_files.FileMetadata) -> bool:
+        # Primero las comparaciones baratas; las expresiones regulares al final
+        if self.min_size is not None and entry.size < self.min_size:
+            return False
+        if self.max_size is not None and entry.size > self.max_size:
+            return False
+        if self.server_from is not None or self.server_to is not None:
+            if not _in_range(entry.server_modified, self.server_from, self.server_to):
+                return False
+        if self.client_from is not None or self.client_to is not None:
+            if not _in_range(entry.client_modified, self.client_from, self.client_to):
+                return False
+        if self.exts is not None or self.include is not None or self.exclude is not None:
+            path = entry.path_display
+            if self.exts is not None:
+                lower = entry.path_lower or path.lower()
+                if _suffix(lower) not in self.exts:
+                    return False
+            if self.include is not None and self.include.match(path) is None:
+                return False
+            if self.exclude is not None and self.exclude.match(path) is not None:
+                return False
+        return True
+
+
+def _in_range(value: datetime, lo: Optional[datetime], hi: Optional[datetime]) -> bool:
+    if value.tzinfo is not None:
+        value = _utc_naive(value)
+    if lo is not None and value < lo:
+        return False
+    if hi is not None and value > hi:
+        return False
+    return True
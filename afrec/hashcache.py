@@ -0,0 +1,135 @@
+""" Aquí se Mantiene la caché de hashes del caso (cache_hashes.db).
+Evita volver a leer archivos que no cambiaron entre una verificación y la siguiente:
+* La clave es la identidad del archivo: ruta, tamaño, mtime_ns e inodo; si cualquiera
+  cambia, el archivo se vuelve a hashear.
+* Guarda los digests como bytes (SHA-256 y, si se calcularon, MD5 y content hash).
+* Un archivo que cambia mientras se hashea no se guarda.
+* Es opcional: --no-cache (modo paranoico) ignora la caché y lee todo, como exige una
+  verificación con valor probatorio; cambiar el mtime a mano no se detecta con la caché. """
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .integrity import hash_file_digests
+
+CACHE_FILE = "cache_hashes.db"
+BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    sha256 BLOB NOT NULL,
+    md5 BLOB,
+    dropbox_content_hash BLOB
+);
+"""
+_DIGESTS = ("sha256", "md5", "dropbox_content_hash")
+
+Identity = Tuple[str, int, int, int]
+
+
+def file_identity(path: Path) -> Identity:
+    st = os.stat(path)
+    return str(Path(path).resolve()), st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class HashCache:
+    """Caché SQLite de digests; seguro para consultar y escribir desde varios hilos."""
+
+    def __init__(self, db_file: Path, batch_size: int = BATCH_SIZE) -> None:
+        self.file = db_file
+        self.batch_size = batch_size
+        conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        # None tras close()
+        self._conn: Optional[sqlite3.Connection] = conn
+        self._lock = threading.Lock()
+        # Filas aún no escritas, por ruta (get() también las consulta)
+        self._pending: Dict[str, Tuple[Any, ...]] = {}
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError(f"La caché de hashes {self.file} está cerrada")
+        return self._conn
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def get(self, identity: Identity, wanted: Tuple[str, ...]) -> Optional[Dict[str, str]]:
+        """Digests guardados si la identidad coincide y están todos los pedidos."""
+        path, size, mtime_ns, inode = identity
+        with self._lock:
+            row = self._pending.get(path)
+            if row is not None:
+                row = row[1:]
+            else:
+                row = self._db.execute(
+                    "SELECT size, mtime_ns, inode, sha256, md5, dropbox_content_hash "
+                    "FROM digests WHERE path = ?",
+                    (path,),
+                ).fetchone()
+        if row is None or tuple(row[:3]) != (size, mtime_ns, inode):
+            return None
+        stored = dict(zip(_DIGESTS, row[3:]))
+        if any(stored[name] is None for name in wanted):
+            return None
+        return {name: stored[name].hex() for name in wanted}
+
+    def put(self, identity: Identity, digests: Dict[str, str]) -> None:
+        row = identity + tuple(
+            bytes.fromhex(digests[name]) if name in digests else None for name in _DIGESTS
+        )
+        with self._lock:
+            self._pending[identity[0]] = row
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    list(self._pending.values()),
+                )
+            self._pending.clear()
+
+    def close(self) -> None:
+        conn = self._conn
+        if conn is None:
+            return
+        with self._lock:
+            self._flush()
+        conn.close()
+        self._conn = None
+
+    def hash_file(
+        self, path: Path, content_hash: bool = True, md5: bool = True, block_workers: int = 1
+    ) -> Tuple[int, Dict[str, str], bool]:
+        """(tamaño, digests, vino_de_caché); lanza FileNotFoundError como hash_file_multi."""
+        wanted = ("sha256",) + (("md5",) if md5 else ()) + (
+            ("dropbox_content_hash",) if content_hash else ()
+        )
+        before = file_identity(path)
+        cached = self.get(before, wanted)
+        if cached is not None:
+            return before[1], cached, True
+        size, digests = hash_file_digests(
+            path, content_hash=content_hash, md5=md5, block_workers=block_workers
+        )
+        if file_identity(path) == before:
+            self.put(before, digests)
+        return size, digests, False
@@ -0,0 +1,294 @@
+""" Aquí se Mantiene el índice SQLite del caso (indice.db).
+Complementa los artefactos planos (inventario.csv, hashes.csv, cadena_custodia.jsonl),
+que siguen siendo la fuente de verdad, con una base consultable:
+* Tablas inventory, hashes y custody con índices por tamaño, fecha, ruta y hash.
+* Escritura por lotes: las filas se acumulan y se insertan en una transacción por lote.
+* Reconstrucción desde los archivos del caso para casos anteriores al índice.
+* Consultas filtradas (afrec query) sin cargar el caso en memoria. """
+
+from __future__ import annotations
+
+import csv
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .explorer import INVENTORY_FIELDS, InventoryItem, iter_inventory_csv
+from .integrity import HASH_RECORD_FIELDS
+
+INDEX_FILE = "indice.db"
+BATCH_SIZE = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (
+    id TEXT PRIMARY KEY,
+    path_display TEXT NOT NULL,
+    path_lower TEXT NOT NULL,
+    size INTEGER,
+    client_modified TEXT,
+    server_modified TEXT,
+    rev TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS inventory_size ON inventory(size);
+CREATE INDEX IF NOT EXISTS inventory_server_modified ON inventory(server_modified);
+CREATE INDEX IF NOT EXISTS inventory_path ON inventory(path_lower);
+CREATE TABLE IF NOT EXISTS hashes (
+    id TEXT PRIMARY KEY,
+    path_local TEXT,
+    path_dropbox TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    md5 TEXT,
+    dropbox_content_hash_local TEXT,
+    dropbox_content_hash_remote TEXT,
+    server_modified TEXT,
+    rev TEXT,
+    dropbox_hash_match TEXT,
+    dedup_of TEXT,
+    carried_from TEXT
+);
+CREATE INDEX IF NOT EXISTS hashes_sha256 ON hashes(sha256);
+CREATE INDEX IF NOT EXISTS hashes_match ON hashes(dropbox_hash_match);
+CREATE TABLE IF NOT EXISTS custody (
+    seq INTEGER PRIMARY KEY,
+    ts TEXT,
+    actor TEXT,
+    action TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS custody_action ON custody(action);
+"""
+
+_INVENTORY_COLUMNS = ["id", "path_display", "path_lower"] + [
+    f for f in INVENTORY_FIELDS if f not in ("id", "path_display")
+]
+_HASH_COLUMNS = ["id"] + [f for f in HASH_RECORD_FIELDS if f != "id"]
+
+# Columnas que devuelve query(): inventario más el resultado de la verificación
+QUERY_COLUMNS = [
+    "path_display",
+    "size",
+    "server_modified",
+    "client_modified",
+    "rev",
+    "content_hash",
+    "sha256",
+    "md5",
+    "dropbox_hash_match",
+    "path_local",
+]
+_HASH_QUERY_COLUMNS = {"sha256", "md5", "dropbox_hash_match", "path_local"}
+_SELECT = "SELECT {} FROM inventory i LEFT JOIN hashes h ON h.id = i.id".format(
+    ", ".join(("h." if c in _HASH_QUERY_COLUMNS else "i.") + c for c in QUERY_COLUMNS)
+)
+
+
+def _insert_sql(table: str, columns: Sequence[str]) -> str:
+    marks = ", ".join("?" for _ in columns)
+    return f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({marks})"
+
+
+def _int_or_none(v: Any) -> Optional[int]:
+    return None if v is None or v == "" else int(v)
+
+
+class CaseIndex:
+    """Índice SQLite de un caso; seguro para escribir desde el hilo del listado y el principal."""
+
+    def __init__(self, db_file: Path, batch_size: int = BATCH_SIZE) -> None:
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.file = db_file
+        self.batch_size = batch_size
+        conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        # None tras close()
+        self._conn: Optional[sqlite3.Connection] = conn
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[Any, ...]]] = {"inventory": [], "hashes": []}
+        self._sql = {
+            "inventory": _insert_sql("inventory", _INVENTORY_COLUMNS),
+            "hashes": _insert_sql("hashes", _HASH_COLUMNS),
+        }
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError(f"El índice {self.file} está cerrado")
+        return self._conn
+
+    def __enter__(self) -> "CaseIndex":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def reset(self) -> None:
+        """Vacía inventario y hashes (la adquisición los vuelve a escribir completos)."""
+        with self._lock:
+            for table in self._pending:
+                self._pending[table].clear()
+            with self._db:
+                self._db.execute("DELETE FROM inventory")
+                self._db.execute("DELETE FROM hashes")
+
+    def add_item(self, item: InventoryItem) -> None:
+        self._add("inventory", (
+            item.id,
+            item.path_display,
+            item.path_display.lower(),
+            item.size,
+            item.client_modified,
+            item.server_modified,
+            item.rev,
+            item.content_hash,
+        ))
+
+    def add_record(self, record: Mapping[str, Any]) -> None:
+        # Las filas releídas de hashes.csv traen "" donde el registro original tenía None
+        row = [record.get(c) if record.get(c) != "" else None for c in _HASH_COLUMNS]
+        row[_HASH_COLUMNS.index("size")] = _int_or_none(record.get("size"))
+        self._add("hashes", tuple(row))
+
+    def _add(self, table: str, row: Tuple[Any, ...]) -> None:
+        with self._lock:
+            rows = self._pending[table]
+            rows.append(row)
+            if len(rows) >= self.batch_size:
+                self._flush_table(table)
+
+    def _flush_table(self, table: str) -> None:
+        rows = self._pending[table]
+        if rows:
+            with self._db:
+                self._db.executemany(self._sql[table], rows)
+            rows.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            for table in self._pending:
+                self._flush_table(table)
+
+    def sync_custody(self, custody_file: Path) -> int:
+        """Replica cadena_custodia.jsonl en la tabla custody; devuelve el número de eventos."""
+        rows = []
+        if custody_file.exists():
+            with open(custody_file, "r", encoding="utf-8") as fh:
+                for seq, line in enumerate(fh, 1):
+                    if not line.strip():
+                        continue
+                    e = json.loads(line)
+                    details = json.dumps(e.get("details", {}), ensure_ascii=False)
+                    rows.append((seq, e.get("ts"), e.get("actor"), e.get("action"), details))
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM custody")
+            self._db.executemany("INSERT INTO custody VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def close(self) -> None:
+        conn = self._conn
+        if conn is None:
+            return
+        self.flush()
+        conn.close()
+        self._conn = None
+
+    def query(
+        self,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_from: Optional[str] = None,
+        modified_to: Optional[str] = None,
+        path_glob: Optional[str] = None,
+        exts: Optional[Sequence[str]] = None,
+        mismatch: bool = False,
+        sha256: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Consulta el inventario unido a los hashes; las fechas van en ISO-8601 UTC sin zona."""
+        where, params = self._where(
+            min_size, max_size, modified_from, modified_to, path_glob, exts, mismatch, sha256
+        )
+        sql = _SELECT + where + " ORDER BY i.path_lower"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        self.flush()
+        for row in self._db.execute(sql, params):
+            yield dict(zip(QUERY_COLUMNS, row))
+
+    def count(self, **filters: Any) -> int:
+        filters.pop("limit", None)
+        where, params = self._where(**filters)
+        sql = f"SELECT COUNT(*) FROM inventory i LEFT JOIN hashes h ON h.id = i.id{where}"
+        self.flush()
+        return self._db.execute(sql, params).fetchone()[0]
+
+    @staticmethod
+    def _where(
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_from: Optional[str] = None,
+        modified_to: Optional[str] = None,
+        path_glob: Optional[str] = None,
+        exts: Optional[Sequence[str]] = None,
+        mismatch: bool = False,
+        sha256: Optional[str] = None,
+    ) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if min_size is not None:
+            clauses.append("i.size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append("i.size <= ?")
+            params.append(max_size)
+        if modified_from is not None:
+            clauses.append("i.server_modified >= ?")
+            params.append(modified_from)
+        if modified_to is not None:
+            clauses.append("i.server_modified <= ?")
+            params.append(modified_to)
+        if path_glob:
+            clauses.append("i.path_lower GLOB ?")
+            params.append(path_glob.lower())
+        if exts:
+            clauses.append("(" + " OR ".join("i.path_lower LIKE ?" for _ in exts) + ")")
+            params.extend("%" + e for e in exts)
+        if mismatch:
+            clauses.append("h.dropbox_hash_match = 'no'")
+        if sha256:
+            clauses.append("h.sha256 = ?")
+            params.append(sha256.lower())
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def custody_events(self, action: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        sql = "SELECT seq, ts, actor, action, details FROM custody"
+        params: List[Any] = []
+        if action:
+            sql += " WHERE action = ?"
+            params.append(action.upper())
+        for seq, ts, actor, act, details in self._db.execute(sql + " ORDER BY seq", params):
+            yield {"seq": seq, "ts": ts, "actor": actor, "action": act, "details": details}
+
+
+def rebuild_index(case_dir: Path, batch_size: int = BATCH_SIZE) -> CaseIndex:
+    """Crea (o rehace) indice.db a partir de los archivos planos de un caso existente."""
+    index = CaseIndex(case_dir / INDEX_FILE, batch_size=batch_size)
+    index.reset()
+    inventory = case_dir / "inventario.csv"
+    if inventory.exists():
+        for item in iter_inventory_csv(inventory):
+            index.add_item(item)
+    hashes = case_dir / "hashes.csv"
+    if hashes.exists():
+        with open(hashes, "r", newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                index.add_record(row)
+    index.sync_custody(case_dir / "cadena_custodia.jsonl")
+    index.flush()
+    return index
@@ -2,7 +2,12 @@
 Funciones:
 * hash_file → SHA-256 o MD5 de un archivo local.
 * dropbox_content_hash → implementa el mismo algoritmo de Dropbox para validar descargas.
-* build_hash_record → genera un registro con:
+* parallel_content_hash → el mismo content hash repartiendo los bloques de 4 MiB entre hilos,
+  para archivos muy grandes.
+* MultiHasher / hash_file_multi → calcula SHA-256, MD5 y content hash en una sola lectura.
+* hash_file_digests → lo mismo, pero en archivos grandes el content hash se calcula en
+  paralelo (parallel_content_hash) mientras una lectura secuencial da SHA-256 y MD5.
+* build_hash_record → genera un registro (HashRecord, compacto) con:
 * ruta local y en Dropbox,
 * hashes locales,
 * content_hash remoto,
@@ -12,14 +17,150 @@ Confirma que los archivos adquiridos son idénticos a los de Dropbox. """
 from __future__ import annotations
 
 import hashlib
+import mmap
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from .compact import (
+    pack_hex,
+    pack_int,
+    pack_label,
+    pack_str,
+    pack_ts,
+    unpack_hex,
+    unpack_ts,
+)
 
 try:
    from dropbox.dropbox_content_hasher import DropboxContentHasher
 except Exception:  # pragma: no cover
    DropboxContentHasher = None  # type: ignore
 
+# Dropbox define el content hash sobre bloques de 4 MiB
+DROPBOX_BLOCK_SIZE = 4 * 1024 * 1024
+# A partir de este tamaño hash_file_multi lee con mmap en lugar de readinto
+MMAP_THRESHOLD = 64 * 1024 * 1024
+# Por debajo de este tamaño repartir bloques entre hilos no compensa
+PARALLEL_MIN_SIZE = 64 * 1024 * 1024
+
+
+class BlockHasher:
+    """Content hash de Dropbox incremental: SHA-256 de cada bloque de 4 MiB."""
+
+    def __init__(self) -> None:
+        self.blocks: List[bytes] = []
+        self._block = hashlib.sha256()
+        self._block_len = 0
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        view = memoryview(data)
+        while view:
+            take = min(len(view), DROPBOX_BLOCK_SIZE - self._block_len)
+            self._block.update(view[:take])
+            self._block_len += take
+            view = view[take:]
+            if self._block_len == DROPBOX_BLOCK_SIZE:
+                self.blocks.append(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_len = 0
+
+    def digests(self) -> List[bytes]:
+        """Digests de todos los bloques, incluido el último bloque parcial."""
+        if self._block_len:
+            return self.blocks + [self._block.digest()]
+        return list(self.blocks)
+
+    def hexdigest(self) -> str:
+        return content_hash_from_blocks(self.digests())
+
+
+def content_hash_from_blocks(block_digests: Iterable[bytes]) -> str:
+    """Combina, en orden, los SHA-256 de bloque en el content hash final."""
+    overall = hashlib.sha256()
+    for d in block_digests:
+        overall.update(d)
+    return overall.hexdigest()
+
+
+class MultiHasher:
+    """Alimenta SHA-256, MD5 y el content hash de Dropbox con los mismos bytes."""
+
+    def __init__(self, content_hash: bool = True, md5: bool = True) -> None:
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5() if md5 else None
+        self.size = 0
+        self.blocks: Optional[BlockHasher] = BlockHasher() if content_hash else None
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        view = memoryview(data)
+        self.sha256.update(view)
+        if self.md5 is not None:
+            self.md5.update(view)
+        self.size += len(view)
+        if self.blocks is not None:
+            self.blocks.update(view)
+
+    def content_hash(self) -> Optional[str]:
+        return self.blocks.hexdigest() if self.blocks is not None else None
+
+    def hexdigests(self) -> Dict[str, str]:
+        data = {"sha256": self.sha256.hexdigest()}
+        if self.md5 is not None:
+            data["md5"] = self.md5.hexdigest()
+        if self.blocks is not None:
+            data["dropbox_content_hash"] = self.blocks.hexdigest()
+        return data
+
+
+def hash_file_multi(
+    path: Path,
+    chunk_size: int = DROPBOX_BLOCK_SIZE,
+    content_hash: bool = True,
+    md5: bool = True,
+    mmap_threshold: Optional[int] = MMAP_THRESHOLD,
+) -> MultiHasher:
+    """Lee el archivo una sola vez con un buffer reutilizable (readinto).
+
+    Los archivos de al menos ``mmap_threshold`` bytes se proyectan en memoria (mmap) y se
+    hashean sin copiar a un buffer intermedio; ``None`` desactiva mmap.
+    """
+    hasher = MultiHasher(content_hash=content_hash, md5=md5)
+    with open(path, "rb", buffering=0) as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if mmap_threshold is not None and size and size >= mmap_threshold:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mm)
+                try:
+                    for start in range(0, size, chunk_size):
+                        hasher.update(view[start:start + chunk_size])
+                finally:
+                    view.release()
+            return hasher
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        while True:
+            n = fh.readinto(buf)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher
+
 
 def hash_file(path: Path, algo: str = "sha256", chunk_size: int = 1024 * 1024) -> str:
     if algo not in {"sha256", "md5"}:
@@ -34,8 +175,16 @@ def hash_file(path: Path, algo: str = "sha256", chunk_size: int = 1024 * 1024) -
     return h.hexdigest()
 
 
-def dropbox_content_hash(path: Path, chunk_size: int = 4 * 1024 * 1024) -> Optional[str]:
-    """Calcula el content hash de Dropbox para un archivo local."""
+def dropbox_content_hash(
+    path: Path, chunk_size: int = 4 * 1024 * 1024, workers: Optional[int] = None
+) -> Optional[str]:
+    """Calcula el content hash de Dropbox para un archivo local.
+
+    Con ``workers`` > 1 los archivos grandes se hashean por bloques en paralelo
+    (parallel_content_hash); el resultado es idéntico.
+    """
+    if workers is not None and workers > 1:
+        return parallel_content_hash(path, workers=workers)
     if DropboxContentHasher is not None:
         # Usar helper oficial
         hasher = DropboxContentHasher()
@@ -58,24 +207,185 @@ def dropbox_content_hash(path: Path, chunk_size: int = 4 * 1024 * 1024) -> Optio
         return hashlib.sha256(b"".join(block_hashes)).hexdigest()
 
 
+def _pread_block(fd: int, index: int) -> bytes:
+    """Bloque ``index`` del archivo; os.pread no comparte la posición entre hilos."""
+    offset = index * DROPBOX_BLOCK_SIZE
+    data = os.pread(fd, DROPBOX_BLOCK_SIZE, offset)
+    # pread puede devolver menos bytes sin haber llegado al final
+    while data and len(data) < DROPBOX_BLOCK_SIZE:
+        more = os.pread(fd, DROPBOX_BLOCK_SIZE - len(data), offset + len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def parallel_content_hash(
+    path: Path, workers: Optional[int] = None, min_size: int = PARALLEL_MIN_SIZE
+) -> str:
+    """Content hash de Dropbox con los bloques de 4 MiB repartidos entre hilos.
+
+    Cada bloque se lee con os.pread (o de un mmap donde no existe) y se hashea en un hilo;
+    hashlib libera el GIL, así que escala con los núcleos. Los digests se combinan en
+    orden con una ventana acotada de bloques en vuelo, por lo que la memoria no depende
+    del tamaño del archivo. Los archivos menores que ``min_size`` se hashean en serie.
+    """
+    workers = workers or os.cpu_count() or 4
+    with open(path, "rb", buffering=0) as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if workers < 2 or size < max(min_size, 2 * DROPBOX_BLOCK_SIZE):
+            blocks = BlockHasher()
+            buf = bytearray(DROPBOX_BLOCK_SIZE)
+            while True:
+                n = fh.readinto(buf)
+                if not n:
+                    break
+                blocks.update(memoryview(buf)[:n])
+            return blocks.hexdigest()
+
+        fd = fh.fileno()
+        count = -(-size // DROPBOX_BLOCK_SIZE)
+        mm = None if hasattr(os, "pread") else mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm) if mm is not None else None
+
+        def _block_digest(index: int) -> bytes:
+            if view is not None:
+                start = index * DROPBOX_BLOCK_SIZE
+                return hashlib.sha256(view[start:start + DROPBOX_BLOCK_SIZE]).digest()
+            return hashlib.sha256(_pread_block(fd, index)).digest()
+
+        overall = hashlib.sha256()
+        window: Deque[Future] = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="afrec-blocks") as pool:
+                for index in range(count):
+                    window.append(pool.submit(_block_digest, index))
+                    if len(window) >= 2 * workers:
+                        overall.update(window.popleft().result())
+                while window:
+                    overall.update(window.popleft().result())
+        finally:
+            if view is not None and mm is not None:
+                view.release()
+                mm.close()
+    return overall.hexdigest()
+
+
+def hash_file_digests(
+    path: Path, content_hash: bool = True, md5: bool = True, block_workers: int = 1
+) -> Tuple[int, Dict[str, str]]:
+    """(tamaño, digests) de un archivo, con los mismos valores que hash_file_multi.
+
+    Con ``block_workers`` > 1, en archivos de al menos PARALLEL_MIN_SIZE el content hash
+    se calcula por bloques en otros hilos mientras este hilo lee el archivo para SHA-256
+    y MD5, que necesitan los bytes en orden; ambas lecturas comparten la caché de páginas.
+    """
+    if not content_hash or block_workers < 2 or os.stat(path).st_size < PARALLEL_MIN_SIZE:
+        hasher = hash_file_multi(path, content_hash=content_hash, md5=md5)
+        return hasher.size, hasher.hexdigests()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="afrec-content-hash") as pool:
+        blocks = pool.submit(parallel_content_hash, path, block_workers, 0)
+        hasher = hash_file_multi(path, content_hash=False, md5=md5)
+        digests = hasher.hexdigests()
+        digests["dropbox_content_hash"] = blocks.result()
+    return hasher.size, digests
+
+
+# Columnas de hashes.csv; dedup_of y carried_from solo se llenan en registros por referencia
+HASH_RECORD_FIELDS = [
+    "path_local",
+    "path_dropbox",
+    "size",
+    "sha256",
+    "md5",
+    "dropbox_content_hash_local",
+    "dropbox_content_hash_remote",
+    "server_modified",
+    "rev",
+    "id",
+    "dropbox_hash_match",
+    "dedup_of",
+    "carried_from",
+]
+
+
+_HEX_FIELDS = frozenset(
+    ["sha256", "md5", "dropbox_content_hash_local", "dropbox_content_hash_remote"]
+)
+_PACKERS: Dict[str, Callable[[Any], Any]] = {f: pack_str for f in HASH_RECORD_FIELDS}
+_PACKERS.update({f: pack_hex for f in _HEX_FIELDS})
+_PACKERS.update(size=pack_int, server_modified=pack_ts, dropbox_hash_match=pack_label)
+_UNPACKERS: Dict[str, Callable[[Any], Any]] = {f: unpack_hex for f in _HEX_FIELDS}
+_UNPACKERS["server_modified"] = unpack_ts
+
+
+class HashRecord(Mapping):
+    """Fila de hashes.csv en forma compacta (digests en bytes, fecha como epoch).
 
-def build_hash_record(local_path: Path, remote: Dict[str, str | int | None]) -> Dict[str, str | int | None]:
-    sha256 = hash_file(local_path, "sha256")
-    md5 = hash_file(local_path, "md5")
-    dbx_hash = dropbox_content_hash(local_path)
-    rec: Dict[str, str | int | None] = {
-        "path_local": str(local_path),
-        "path_dropbox": remote.get("path_display"),
-        "size": remote.get("size"),
-        "sha256": sha256,
-        "md5": md5,
-        "dropbox_content_hash_local": dbx_hash,
-        "dropbox_content_hash_remote": remote.get("content_hash"),
-        "server_modified": remote.get("server_modified"),
-        "rev": remote.get("rev"),
-        "id": remote.get("id"),
-    }
-    rec["dropbox_hash_match"] = (
-        "yes" if (dbx_hash and remote.get("content_hash") == dbx_hash) else ("no" if dbx_hash else "n/a")
+    Se comporta como un diccionario de solo lectura con las claves de HASH_RECORD_FIELDS
+    (los valores se devuelven como texto, igual que en el CSV); admite asignar
+    campos conocidos, p.ej. ``rec["dedup_of"] = ...``.
+    """
+
+    __slots__ = tuple(HASH_RECORD_FIELDS)
+
+    def __init__(self, **values: Any) -> None:
+        for f in HASH_RECORD_FIELDS:
+            object.__setattr__(self, f, _PACKERS[f](values.get(f)))
+
+    @classmethod
+    def from_mapping(cls, data: Mapping) -> "HashRecord":
+        """Desde una fila de hashes.csv o un registro del journal ("" se lee como None)."""
+        return cls(**{f: data.get(f) for f in HASH_RECORD_FIELDS})
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _PACKERS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        unpack = _UNPACKERS.get(key)
+        return unpack(value) if unpack is not None else value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in _PACKERS:
+            raise KeyError(key)
+        object.__setattr__(self, key, _PACKERS[key](value))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(HASH_RECORD_FIELDS)
+
+    def __len__(self) -> int:
+        return len(HASH_RECORD_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"HashRecord({dict(self)!r})"
+
+
+def build_hash_record(local_path: Path, remote: Mapping) -> HashRecord:
+    return hash_record_from_digests(local_path, remote, hash_file_multi(local_path).hexdigests())
+
+
+def hash_record_from_digests(
+    local_path: Path,
+    remote: Mapping,
+    digests: Dict[str, str],
+) -> HashRecord:
+    """Arma el registro de integridad a partir de digests ya calculados (p.ej. en streaming)."""
+    dbx_hash = digests["dropbox_content_hash"]
+    remote_hash = remote.get("content_hash")
+    if dbx_hash:
+        match = "yes" if remote_hash == dbx_hash else "no"
+    else:
+        match = "n/a"
+    return HashRecord(
+        path_local=str(local_path),
+        path_dropbox=remote.get("path_display"),
+        size=remote.get("size"),
+        sha256=digests["sha256"],
+        md5=digests["md5"],
+        dropbox_content_hash_local=dbx_hash,
+        dropbox_content_hash_remote=remote_hash,
+        server_modified=remote.get("server_modified"),
+        rev=remote.get("rev"),
+        id=remote.get("id"),
+        dropbox_hash_match=match,
     )
-    return rec
@@ -0,0 +1,111 @@
+""" Aquí se lleva el diario (journal) de una adquisición para poder reanudarla.
+Registra en journal.jsonl, dentro de la carpeta del caso, el estado de cada archivo:
+* pending → descarga iniciada,
+* downloaded → archivo completo pero sin verificar contra el content_hash remoto (o discrepante),
+* verified → archivo completo y verificado, con su registro de hashes.
+Al reanudar (afrec acquire --resume) se omiten los archivos verificados cuya revisión
+y tamaño coinciden, y se descargan de nuevo los parciales o discrepantes. """
+
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from .integrity import HashRecord
+
+PENDING = "pending"
+DOWNLOADED = "downloaded"
+VERIFIED = "verified"
+
+
+def _key(item: Dict[str, Any]) -> str:
+    return str(item.get("id") or item.get("path_display"))
+
+
+class AcquisitionJournal:
+    def __init__(self, file: Path) -> None:
+        self.file = file
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        # Por archivo solo se retiene (estado, rev, registro compacto); el resto queda en disco
+        self._entries: Dict[str, Tuple[str, Optional[str], Optional[HashRecord]]] = {}
+        self._lock = threading.Lock()
+        if self.file.exists():
+            with open(self.file, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última línea cortada por una interrupción: se ignora
+                        continue
+                    self._remember(
+                        entry["key"], entry["state"], entry.get("rev"), entry.get("record")
+                    )
+        self._fh = open(self.file, "a", encoding="utf-8")
+
+    def __enter__(self) -> "AcquisitionJournal":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.close()
+
+    def _remember(
+        self, key: str, state: str, rev: Optional[str], record: Optional[Mapping]
+    ) -> None:
+        compact = None
+        if record is not None:
+            compact = record if isinstance(record, HashRecord) else HashRecord.from_mapping(record)
+        self._entries[key] = (state, rev, compact)
+
+    def state(self, item: Dict[str, Any]) -> Optional[str]:
+        entry = self._entries.get(_key(item))
+        return entry[0] if entry else None
+
+    def mark(self, item: Dict[str, Any], state: str, record: Optional[Mapping] = None) -> None:
+        key = _key(item)
+        rev: Optional[str] = item.get("rev")
+        entry = {
+            "key": key,
+            "path_display": item.get("path_display"),
+            "rev": rev,
+            "state": state,
+            "record": dict(record) if record is not None else None,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, state, rev, record)
+            self._fh.write(line + "\n")
+            self._fh.flush()
+
+    def mark_record(self, item: Dict[str, Any], record: Mapping) -> None:
+        """Registra el resultado de una descarga según la comparación del content hash.
+
+        Sin content_hash remoto no hay contra qué comparar; basta con que la descarga
+        haya llegado completa.
+        """
+        remote = record.get("dropbox_content_hash_remote")
+        mismatch = record.get("dropbox_hash_match") == "no" and remote
+        state = DOWNLOADED if mismatch else VERIFIED
+        self.mark(item, state, record)
+
+    def verified_record(self, item: Dict[str, Any], local_path: Path) -> Optional[HashRecord]:
+        """Devuelve el registro previo si el archivo ya está verificado y sigue intacto en disco."""
+        entry = self._entries.get(_key(item))
+        if not entry or entry[0] != VERIFIED or entry[1] != item.get("rev"):
+            return None
+        try:
+            size = local_path.stat().st_size
+        except FileNotFoundError:
+            return None
+        if item.get("size") is not None and size != int(item["size"]):  # type: ignore[arg-type]
+            return None
+        return entry[2]
@@ -1,46 +1,173 @@
 """ Aquí se Configura un sistema de logging en JSON.
 Registra cada paso importante en log.txt.
-Facilita auditorías y depuración. """
+Facilita auditorías y depuración.
+
+El registro no bloquea a quien escribe: el logger "afrec" solo encola cada evento
+(QueueHandler sobre una cola sin límite) y un hilo de fondo (QueueListener) le da formato
+JSON y lo escribe en log.txt y en la consola. La consola tiene un límite de eventos por
+segundo (los avisos y errores pasan siempre); los eventos suprimidos se cuentan y se
+informan en cuanto vuelve a haber capacidad, pero log.txt los recibe todos. """
 
 from __future__ import annotations
 
+import atexit
+import copy
 import json
 import logging
+import os
+import queue
 import sys
+import threading
+import time
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, TextIO
+
+CONSOLE_RATE = float(os.getenv("AFREC_LOG_CONSOLE_RATE", "20"))
+CONSOLE_BURST = 50
+
+# Atributos propios de LogRecord (más los que agregan Formatter y Python 3.12): el resto
+# son los campos pasados con extra=...
+RESERVED_KEYS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
 
 
 class JsonFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:  
+    def format(self, record: logging.LogRecord) -> str:
         data: Dict[str, Any] = {
-            "ts": datetime.now(timezone.utc).isoformat(),
+            # Hora en que se emitió el evento, no en que lo escribe el hilo de fondo
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
             "level": record.levelname,
             "msg": record.getMessage(),
             "logger": record.name,
         }
         if record.exc_info:
             data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
         for k, v in record.__dict__.items():
-            if k not in ("args", "msg", "levelname", "levelno", "pathname", "filename",
-                         "module", "exc_info", "exc_text", "stack_info", "lineno",
-                         "funcName", "created", "msecs", "relativeCreated", "thread",
-                         "threadName", "processName", "process", "name"):
+            if k not in RESERVED_KEYS:
                 data[k] = v
-        return json.dumps(data, ensure_ascii=False)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _EnqueueHandler(QueueHandler):
+    """Encola el evento sin darle formato (eso ocurre en el hilo de fondo)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Se fijan el mensaje y la traza ahora: los argumentos y la excepción pueden cambiar
+        # antes de que el hilo de fondo procese el evento
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RateLimitedStreamHandler(logging.StreamHandler):
+    """Consola con límite de eventos por segundo (token bucket).
+
+    Sin ``stream`` escribe en el sys.stdout vigente en cada evento, no en el que había al
+    configurar el logging."""
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        rate: float = CONSOLE_RATE,
+        burst: int = CONSOLE_BURST,
+    ) -> None:
+        super().__init__(stream)
+        self._follow_stdout = stream is None
+        self.rate = rate
+        self.burst = burst
+        self.suppressed = 0
+        self._pending_suppressed = 0
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+
+    def _allow(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._follow_stdout:
+            self.stream = sys.stdout
+        if not self._allow(record):
+            self.suppressed += 1
+            self._pending_suppressed += 1
+            return
+        if self._pending_suppressed:
+            notice = logging.makeLogRecord({
+                "name": record.name, "levelno": logging.INFO, "levelname": "INFO",
+                "msg": "console_suppressed", "created": record.created,
+                "count": self._pending_suppressed,
+            })
+            self._pending_suppressed = 0
+            super().emit(notice)
+        super().emit(record)
+
+
+_FORMATTER = JsonFormatter()
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_handlers: List[logging.Handler] = []
+_enqueue: Optional[QueueHandler] = None
 
 
 def setup_logging(log_file: Path | None = None) -> logging.Logger:
+    """Configura el logger "afrec"; si ya estaba configurado, lo reemplaza (otro log.txt)."""
+    global _listener, _handlers, _enqueue
     logger = logging.getLogger("afrec")
     logger.setLevel(logging.INFO)
-   
-    if not logger.handlers:
-        sh = logging.StreamHandler(sys.stdout)
-        sh.setFormatter(JsonFormatter())
-        logger.addHandler(sh)
+    with _lock:
+        _stop()
+        console = RateLimitedStreamHandler()
+        console.setFormatter(_FORMATTER)
+        _handlers = [console]
         if log_file:
             fh = logging.FileHandler(log_file, encoding="utf-8")
-            fh.setFormatter(JsonFormatter())
-            logger.addHandler(fh)
+            fh.setFormatter(_FORMATTER)
+            _handlers.append(fh)
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        _enqueue = _EnqueueHandler(records)
+        logger.addHandler(_enqueue)
+        _listener = QueueListener(records, *_handlers, respect_handler_level=True)
+        _listener.start()
     return logger
+
+
+def shutdown_logging() -> None:
+    """Procesa los eventos pendientes y cierra los archivos de log."""
+    with _lock:
+        _stop()
+
+
+def _stop() -> None:
+    global _listener, _handlers, _enqueue
+    if _enqueue is not None:
+        logging.getLogger("afrec").removeHandler(_enqueue)
+        _enqueue = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for handler in _handlers:
+        handler.close()
+    _handlers = []
+
+
+atexit.register(shutdown_logging)
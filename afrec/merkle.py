@@ -0,0 +1,238 @@
+""" Aquí se Construye el manifiesto Merkle de la evidencia de un caso.
+Permite:
+* Un árbol de Merkle sobre los SHA-256 de hashes.csv, con las hojas ordenadas por ruta
+  de Dropbox; la raíz resume el caso completo y se registra en la cadena de custodia
+  y en el reporte PDF.
+* Pruebas de inclusión: verificar un solo archivo contra la raíz con log2(n) hashes,
+  sin re-hashear el resto de la evidencia.
+* Comparar dos casos (o un caso consigo mismo tras copiarlo) bajando solo por los
+  subárboles cuyo hash difiere.
+Formato:
+* hoja  = SHA-256(0x00 || ruta_dropbox UTF-8 || 0x00 || sha256 del archivo)
+* nodo  = SHA-256(0x01 || izquierdo || derecho); un nodo sin pareja sube sin cambios,
+  de modo que el nodo i del nivel k cubre las hojas [i·2^k, (i+1)·2^k).
+* merkle.json guarda la descripción y la raíz; merkle.bin, todos los niveles seguidos
+  (32 bytes por nodo, desde las hojas hasta la raíz). """
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MANIFEST_FILE = "merkle.json"
+NODES_FILE = "merkle.bin"
+DIGEST_SIZE = 32
+
+_LEAF = b"\x00"
+_NODE = b"\x01"
+
+
+def leaf_hash(path_dropbox: str, sha256_hex: str) -> bytes:
+    h = hashlib.sha256(_LEAF)
+    h.update(path_dropbox.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(bytes.fromhex(sha256_hex))
+    return h.digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE + left + right).digest()
+
+
+def path_order(path_dropbox: str) -> Tuple[str, str]:
+    """Orden de las hojas: ruta sin distinguir mayúsculas (como Dropbox) y luego exacta."""
+    return path_dropbox.lower(), path_dropbox
+
+
+class MerkleTree:
+    """Árbol completo en memoria: un bloque de bytes contiguo por nivel."""
+
+    def __init__(self, levels: List[bytes]) -> None:
+        self.levels = levels
+
+    @classmethod
+    def build(cls, leaves: Iterable[bytes]) -> "MerkleTree":
+        level = b"".join(leaves)
+        levels = [level]
+        while len(level) > DIGEST_SIZE:
+            nxt = bytearray()
+            for i in range(0, len(level), 2 * DIGEST_SIZE):
+                left = level[i:i + DIGEST_SIZE]
+                right = level[i + DIGEST_SIZE:i + 2 * DIGEST_SIZE]
+                nxt += node_hash(left, right) if right else left
+            level = bytes(nxt)
+            levels.append(level)
+        return cls(levels)
+
+    @property
+    def count(self) -> int:
+        return len(self.levels[0]) // DIGEST_SIZE
+
+    @property
+    def root(self) -> Optional[str]:
+        return self.levels[-1].hex() if self.count else None
+
+    def node(self, level: int, index: int) -> bytes:
+        return self.levels[level][index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]
+
+    def _width(self, level: int) -> int:
+        return len(self.levels[level]) // DIGEST_SIZE
+
+    def proof(self, index: int) -> List[Tuple[str, str]]:
+        """Hermanos desde la hoja hasta la raíz como ("L"|"R", hash).
+
+        "L" indica que el hermano va a la izquierda al combinar.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        steps: List[Tuple[str, str]] = []
+        for level in range(len(self.levels) - 1):
+            sibling = index ^ 1
+            if sibling < self._width(level):
+                side = "L" if sibling < index else "R"
+                steps.append((side, self.node(level, sibling).hex()))
+            index //= 2
+        return steps
+
+    def diff(self, other: "MerkleTree") -> List[int]:
+        """Índices de hoja distintos entre dos árboles del mismo tamaño.
+
+        Solo se visitan los subárboles cuya raíz difiere: O(cambios · log n).
+        """
+        if self.count != other.count:
+            raise ValueError("Los árboles tienen distinto número de hojas; compare por ruta")
+        if not self.count:
+            return []
+        top = len(self.levels) - 1
+        pending = [(top, 0)]
+        changed: List[int] = []
+        while pending:
+            level, index = pending.pop()
+            if self.node(level, index) == other.node(level, index):
+                continue
+            if level == 0:
+                changed.append(index)
+                continue
+            for child in (2 * index + 1, 2 * index):
+                if child < self._width(level - 1):
+                    pending.append((level - 1, child))
+        return sorted(changed)
+
+    def save(self, case_dir: Path, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with open(case_dir / NODES_FILE, "wb") as fh:
+            for level in self.levels:
+                fh.write(level)
+        manifest = {
+            "version": 1,
+            "algorithm": "sha256",
+            "leaf": "sha256(0x00 || path_dropbox || 0x00 || sha256)",
+            "node": "sha256(0x01 || left || right); unpaired node promoted",
+            "order": "path_dropbox (lowercase, then exact)",
+            "leaves": self.count,
+            "levels": len(self.levels),
+            "root": self.root,
+            "nodes_file": NODES_FILE,
+            **(extra or {}),
+        }
+        with open(case_dir / MANIFEST_FILE, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, ensure_ascii=False, indent=2)
+        return manifest
+
+    @classmethod
+    def load(cls, case_dir: Path) -> "MerkleTree":
+        with open(case_dir / MANIFEST_FILE, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        data = (case_dir / manifest["nodes_file"]).read_bytes()
+        levels: List[bytes] = []
+        width, offset = manifest["leaves"], 0
+        for _ in range(manifest["levels"]):
+            levels.append(data[offset:offset + width * DIGEST_SIZE])
+            offset += width * DIGEST_SIZE
+            width = (width + 1) // 2
+        tree = cls(levels or [b""])
+        if tree.root != manifest["root"]:
+            raise ValueError(f"{NODES_FILE} no corresponde a la raíz de {MANIFEST_FILE}")
+        return tree
+
+
+def verify_proof(leaf: bytes, proof: Iterable[Tuple[str, str]], root_hex: str) -> bool:
+    node = leaf
+    for side, sibling_hex in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        node = node_hash(sibling, node) if side == "L" else node_hash(node, sibling)
+    return node.hex() == root_hex
+
+
+def case_leaves(hashes_csv: Path) -> List[Tuple[str, str]]:
+    """(ruta, sha256) de hashes.csv en el orden de las hojas."""
+    with open(hashes_csv, "r", newline="", encoding="utf-8") as fh:
+        rows = [
+            (row["path_dropbox"], row["sha256"])
+            for row in csv.DictReader(fh)
+            if row.get("path_dropbox") and row.get("sha256")
+        ]
+    rows.sort(key=lambda r: path_order(r[0]))
+    return rows
+
+
+def find_leaf(leaves: List[Tuple[str, str]], path_dropbox: str) -> Optional[int]:
+    """Índice de la hoja de una ruta; si no hay coincidencia exacta, sin distinguir mayúsculas."""
+    lower = path_dropbox.lower()
+    fallback = None
+    for i, (path, _) in enumerate(leaves):
+        if path == path_dropbox:
+            return i
+        if fallback is None and path.lower() == lower:
+            fallback = i
+    return fallback
+
+
+def build_case_tree(case_dir: Path) -> Tuple[MerkleTree, List[Tuple[str, str]]]:
+    leaves = case_leaves(case_dir / "hashes.csv")
+    return MerkleTree.build(leaf_hash(p, h) for p, h in leaves), leaves
+
+
+def recorded_root(case_dir: Path) -> Optional[str]:
+    """Raíz guardada en merkle.json, o None si el caso no tiene manifiesto."""
+    manifest = case_dir / MANIFEST_FILE
+    if not manifest.exists():
+        return None
+    with open(manifest, "r", encoding="utf-8") as fh:
+        return json.load(fh)["root"]
+
+
+def write_case_manifest(case_dir: Path) -> Dict[str, Any]:
+    """Construye el árbol desde hashes.csv y escribe merkle.json y merkle.bin."""
+    tree, _ = build_case_tree(case_dir)
+    return tree.save(case_dir)
+
+
+def compare_cases(a: Path, b: Path) -> Dict[str, Any]:
+    """Compara dos casos por raíz y, si tienen las mismas rutas, por subárboles."""
+    tree_a, leaves_a = build_case_tree(a)
+    tree_b, leaves_b = build_case_tree(b)
+    if tree_a.root == tree_b.root:
+        return {"identical": True, "root_a": tree_a.root, "root_b": tree_b.root, "changed": []}
+    paths_a = [p for p, _ in leaves_a]
+    paths_b = [p for p, _ in leaves_b]
+    if paths_a == paths_b:
+        changed = [paths_a[i] for i in tree_a.diff(tree_b)]
+        added: List[str] = []
+        removed: List[str] = []
+    else:
+        # Con rutas distintas las hojas se desplazan: se compara por ruta
+        map_a, map_b = dict(leaves_a), dict(leaves_b)
+        changed = [p for p in map_a if p in map_b and map_a[p] != map_b[p]]
+        added = [p for p in map_b if p not in map_a]
+        removed = [p for p in map_a if p not in map_b]
+    return {
+        "identical": False,
+        "root_a": tree_a.root,
+        "root_b": tree_b.root,
+        "changed": changed,
+        "added": added,
+        "removed": removed,
+    }
@@ -0,0 +1,333 @@
+""" Aquí se Miden los tiempos de una adquisición para dimensionar equipos y detectar
+limitaciones de Dropbox.
+* Fases (listado, descarga, manifiesto Merkle, reporte) con su inicio relativo y su
+  duración; el listado se solapa con la descarga.
+* Por petición: latencia de cada página del listado y de cada descarga, y la espera por
+  un turno del planificador (crece cuando Dropbox limita y se reduce la concurrencia).
+* Por archivo: tiempo de descarga, tiempo de hash y bytes/s, con los archivos más lentos.
+* Profundidad de colas: descargas en curso y elementos listados que esperan descarga.
+* Reintentos, limitaciones y segundos de backoff de cada planificador.
+Las series se acumulan en histogramas de tamaño fijo (la memoria no depende del número de
+archivos). Se guardan en metrics.json y, opcionalmente, en un archivo de texto para el
+textfile collector de Prometheus (node_exporter). """
+
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .utils import save_json, utc_now_iso
+
+METRICS_FILE = "metrics.json"
+SLOWEST_FILES = 20
+
+SECONDS_BUCKETS: Tuple[float, ...] = (
+    0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0
+)
+DEPTH_BUCKETS: Tuple[float, ...] = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096, 16384)
+
+# serie → (métrica de Prometheus, etiquetas propias, límites del histograma)
+_LISTING = {"scheduler": "listing"}
+_DOWNLOAD = {"scheduler": "download"}
+_SEGMENT = {"scheduler": "segment"}
+SERIES: Dict[str, Tuple[str, Dict[str, str], Tuple[float, ...]]] = {
+    "listing_request_seconds": ("afrec_request_seconds", _LISTING, SECONDS_BUCKETS),
+    "listing_wait_seconds": ("afrec_slot_wait_seconds", _LISTING, SECONDS_BUCKETS),
+    "download_request_seconds": ("afrec_request_seconds", _DOWNLOAD, SECONDS_BUCKETS),
+    "download_wait_seconds": ("afrec_slot_wait_seconds", _DOWNLOAD, SECONDS_BUCKETS),
+    "segment_request_seconds": ("afrec_request_seconds", _SEGMENT, SECONDS_BUCKETS),
+    "segment_wait_seconds": ("afrec_slot_wait_seconds", _SEGMENT, SECONDS_BUCKETS),
+    "file_seconds": ("afrec_file_seconds", {}, SECONDS_BUCKETS),
+    "hash_seconds": ("afrec_hash_seconds", {}, SECONDS_BUCKETS),
+    "download_window": ("afrec_queue_depth", {"queue": "downloads"}, DEPTH_BUCKETS),
+    "listing_backlog": ("afrec_queue_depth", {"queue": "listing"}, DEPTH_BUCKETS),
+}
+HELP = {
+    "afrec_request_seconds": "Latencia de cada petición (página del listado o descarga).",
+    "afrec_slot_wait_seconds": "Espera por un turno del planificador antes de cada petición.",
+    "afrec_file_seconds": "Tiempo de descarga de cada archivo, con reintentos.",
+    "afrec_hash_seconds": "Tiempo de hash de cada archivo descargado.",
+    "afrec_queue_depth": "Profundidad de las colas, muestreada al encolar cada descarga.",
+}
+
+
+class Histogram:
+    """Cuenta, suma, mínimo, máximo y conteo por límite superior (no acumulado)."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, out = 0, []
+        for bound, n in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += n
+            out.append(("+Inf" if bound == float("inf") else _num(bound), total))
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class AcquisitionMetrics:
+    """Instrumentación compartida por el listado, los workers de descarga y la CLI."""
+
+    def __init__(self, session_id: Optional[str] = None) -> None:
+        self.session_id = session_id
+        self.started_at = utc_now_iso()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases: Dict[str, List[Optional[float]]] = {}
+        self._series = {name: Histogram(spec[2]) for name, spec in SERIES.items()}
+        self._schedulers: Dict[str, Any] = {}
+        self._slowest: List[Tuple[float, str, int, float]] = []
+        self.listed = 0
+        self.listed_bytes = 0
+        self.listing_done = False
+        self.submitted = 0
+        self.files = 0
+        self.downloaded = 0
+        self.bytes = 0
+        self.bytes_transferred = 0
+
+    # Fases
+
+    def begin(self, name: str) -> None:
+        with self._lock:
+            self._phases[name] = [time.perf_counter() - self._t0, None]
+
+    def end(self, name: str) -> None:
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is not None and phase[0] is not None and phase[1] is None:
+                phase[1] = time.perf_counter() - self._t0 - phase[0]
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    # Observaciones
+
+    def observe(self, series: str, value: float) -> None:
+        with self._lock:
+            self._series[series].observe(value)
+
+    def add_scheduler(self, name: str, scheduler: Any) -> None:
+        """Registra un planificador para incluir sus contadores (reintentos, backoff)."""
+        self._schedulers[name] = scheduler
+
+    def item_listed(self, item: Any) -> None:
+        with self._lock:
+            self.listed += 1
+            self.listed_bytes += int(getattr(item, "size", 0) or 0)
+
+    def listing_finished(self) -> None:
+        self.listing_done = True
+        self.end("listing")
+
+    def file_submitted(self, window: int) -> None:
+        """Se llama al encolar cada descarga, con las descargas en curso."""
+        with self._lock:
+            self.submitted += 1
+            self._series["download_window"].observe(window)
+            backlog = max(0, self.listed - self.submitted)
+            self._series["listing_backlog"].observe(backlog)
+
+    def file_done(self, record: Mapping[str, Any], timings: Dict[str, float]) -> None:
+        """Registra un archivo terminado; ``timings`` trae "download" y "hash" si se bajó."""
+        size = int(record.get("size") or 0)
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            if "download" not in timings:
+                return
+            seconds = timings["download"]
+            self.downloaded += 1
+            self.bytes_transferred += size
+            self._series["file_seconds"].observe(seconds)
+            self._series["hash_seconds"].observe(timings.get("hash", 0.0))
+            entry = (seconds, str(record.get("path_dropbox")), size, timings.get("hash", 0.0))
+            if len(self._slowest) < SLOWEST_FILES:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    # Salidas
+
+    def progress(self) -> Dict[str, Any]:
+        """Estado para el panel de progreso."""
+        with self._lock:
+            elapsed = self.elapsed()
+            data = {
+                "files": self.files,
+                "listed": self.listed,
+                "listed_bytes": self.listed_bytes,
+                "listing_done": self.listing_done,
+                "bytes": self.bytes,
+                "bytes_transferred": self.bytes_transferred,
+                "bytes_per_s": self.bytes_transferred / elapsed if elapsed > 0 else 0.0,
+                "queue": max(0, self.listed - self.submitted),
+            }
+        retries = throttled = 0
+        for scheduler in self._schedulers.values():
+            stats = scheduler.stats()
+            retries += int(stats["retries"])
+            throttled += int(stats["throttled"])
+        data.update(retries=retries, throttled=throttled)
+        return data
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            download = self._phases.get("download", [None, None])
+            seconds = download[1] if download[1] is not None else None
+            data: Dict[str, Any] = {
+                "version": 1,
+                "session_id": self.session_id,
+                "started_at": self.started_at,
+                "seconds": round(self.elapsed(), 3),
+                "phases": {
+                    name: {
+                        "start": round(start or 0.0, 3),
+                        "seconds": round(dur, 3) if dur is not None else None,
+                    }
+                    for name, (start, dur) in self._phases.items()
+                },
+                "listing": {
+                    "items": self.listed, "bytes": self.listed_bytes, "complete": self.listing_done,
+                },
+                "files": {
+                    "count": self.files,
+                    "downloaded": self.downloaded,
+                    "reused": self.files - self.downloaded,
+                    "bytes": self.bytes,
+                    "bytes_transferred": self.bytes_transferred,
+                    "bytes_per_s": round(self.bytes_transferred / seconds, 1) if seconds else None,
+                },
+                "timings": {name: h.to_dict() for name, h in self._series.items()},
+                "slowest_files": [
+                    {
+                        "path": path,
+                        "size": size,
+                        "seconds": round(secs, 3),
+                        "hash_seconds": round(hash_secs, 3),
+                        "bytes_per_s": round(size / secs, 1) if secs > 0 else None,
+                    }
+                    for secs, path, size, hash_secs in sorted(self._slowest, reverse=True)
+                ],
+            }
+        data["schedulers"] = {name: s.stats() for name, s in self._schedulers.items()}
+        return data
+
+    def write(self, case_dir: Path) -> Path:
+        out = case_dir / METRICS_FILE
+        save_json(self.to_dict(), out)
+        return out
+
+    def prometheus_text(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """Métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+        labels = dict(labels or {})
+        data = self.to_dict()
+        lines: List[str] = []
+
+        def _metric(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def _sample(name: str, value: Any, **extra: str) -> None:
+            lines.append(f"{name}{_labels({**labels, **extra})} {_num(value)}")
+
+        _metric("afrec_phase_seconds", "gauge", "Duración de cada fase de la adquisición.")
+        for phase, info in data["phases"].items():
+            if info["seconds"] is not None:
+                _sample("afrec_phase_seconds", info["seconds"], phase=phase)
+        _metric("afrec_files_total", "counter", "Archivos procesados (descargados o reutilizados).")
+        _sample("afrec_files_total", data["files"]["count"])
+        _metric("afrec_files_downloaded_total", "counter", "Archivos descargados.")
+        _sample("afrec_files_downloaded_total", data["files"]["downloaded"])
+        _metric("afrec_bytes_transferred_total", "counter", "Bytes descargados de Dropbox.")
+        _sample("afrec_bytes_transferred_total", data["files"]["bytes_transferred"])
+        _metric("afrec_listed_items_total", "counter", "Archivos devueltos por el listado.")
+        _sample("afrec_listed_items_total", data["listing"]["items"])
+
+        seen = set()
+        for series, (name, extra, _) in SERIES.items():
+            if name not in seen:
+                seen.add(name)
+                _metric(name, "histogram", HELP[name])
+            hist = self._series[series]
+            for bound, total in hist.cumulative():
+                _sample(f"{name}_bucket", total, **extra, le=bound)
+            _sample(f"{name}_sum", round(hist.sum, 6), **extra)
+            _sample(f"{name}_count", hist.count, **extra)
+
+        counters = (
+            ("afrec_requests_total", "counter", "requests", "Peticiones a Dropbox."),
+            ("afrec_retries_total", "counter", "retries", "Reintentos."),
+            ("afrec_throttled_total", "counter", "throttled", "Respuestas de limitación (429)."),
+            ("afrec_backoff_seconds_total", "counter", "backoff_seconds", "Segundos de espera."),
+            ("afrec_concurrency_limit", "gauge", "concurrency_limit", "Concurrencia efectiva."),
+        )
+        for name, kind, key, help_text in counters:
+            _metric(name, kind, help_text)
+            for scheduler, stats in data["schedulers"].items():
+                _sample(name, stats[key], scheduler=scheduler)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, out_file: Path, labels: Optional[Dict[str, str]] = None) -> None:
+        """Escribe el textfile de forma atómica (el collector nunca lee un archivo a medias)."""
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out_file.with_name(f".{out_file.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.prometheus_text(labels), encoding="utf-8")
+        os.replace(tmp, out_file)
+
+
+def _num(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
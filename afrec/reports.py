@@ -1,75 +1,296 @@
 """ Aquí se genera el reportes de adquisición:
 write_json → exporta datos a JSON.
-write_csv → exporta a CSV.
+write_csv → exporta a CSV (en streaming si se indican las columnas).
 generate_pdf_report → crea un PDF con datos de sesión y resumen de adquisición.
 El PDF incluye:
 * Fecha de generación.
 * Datos de sesión (ID, actor, IP, timestamp).
 * Resumen (archivos, hashes, rutas).
+* Opcionalmente, un anexo con el hash de cada archivo leído de hashes.csv: se genera por
+  lotes de una página (tablas con encabezado repetido) que se van creando a medida que se
+  maquetan. Los anexos muy grandes se dividen en volúmenes (reporte_anexo_002.pdf, ...)
+  para que la memoria de cada PDF quede acotada; el reporte lista el SHA-256 de cada uno.
 Da un formato legible para peritos y jueces. """
 
 from __future__ import annotations
 
 import csv
+import hashlib
 import json
 from datetime import datetime, timezone
+from itertools import chain, islice
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
 
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.units import mm, cm
 from reportlab.pdfgen import canvas
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.platypus import (
+    BaseDocTemplate,
+    Flowable,
+    Frame,
+    NextPageTemplate,
+    PageBreak,
+    PageTemplate,
+    Table,
+    TableStyle,
+    Paragraph,
+    Spacer,
+    Image,
+)
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 
+# Logo del encabezado; si no está (p.ej. instalación sin datos del paquete) se omite
+LOGO_FILE = Path(__file__).with_name("logo.png")
+# Líneas por página del anexo (A4 apaisado, letra de 6 pt); una ruta larga ocupa varias
+ANNEX_ROWS_PER_PAGE = 40
+# ReportLab guarda todas las páginas en memoria hasta escribir el PDF: a partir de este
+# número de filas el anexo sigue en volúmenes aparte para acotar la memoria
+ANNEX_ROWS_PER_VOLUME = 20_000
+# Caracteres por línea de la ruta en el anexo; las rutas más largas ocupan varias líneas
+ANNEX_PATH_WIDTH = 90
+ANNEX_HEADER = ["#", "Ruta en Dropbox", "Tamaño (bytes)", "SHA-256", "Dropbox"]
+_ANNEX_COL_WIDTHS = [1.4 * cm, 11.5 * cm, 2.2 * cm, 9.0 * cm, 1.6 * cm]
+
 def write_json(data: Any, path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with open(path, "w", encoding="utf-8") as fh:
         json.dump(data, fh, ensure_ascii=False, indent=2)
 
 
-def write_csv(records: Iterable[Dict[str, Any]], path: Path, headers: List[str] | None = None) -> None:
+def write_csv(
+    records: Iterable[Mapping[str, Any]], path: Path, headers: List[str] | None = None
+) -> int:
+    """Escribe los registros en CSV y devuelve cuántos se escribieron.
+
+    Con ``headers`` explícitos los registros se consumen en streaming; sin ellos se
+    materializan para deducir la unión de columnas en orden de aparición.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
-    recs = list(records)
-    if not headers and recs:
-        headers = list(recs[0].keys())
+    if not headers:
+        recs = list(records)
+        headers = list(dict.fromkeys(k for r in recs for k in r.keys()))
+        records = recs
+    count = 0
     with open(path, "w", newline="", encoding="utf-8") as fh:
         writer = csv.DictWriter(fh, fieldnames=headers)
         writer.writeheader()
-        for r in recs:
+        for r in records:
             writer.writerow(r)
+            count += 1
+    return count
 
 
-def generate_pdf_report(
-    out_file: Path,
-    summary: Dict[str, Any],
-    session: Dict[str, Any],
-) -> None:
-    out_file.parent.mkdir(parents=True, exist_ok=True)
+class _StreamingStory(list):
+    """Lista de flowables que se rellena desde un generador a medida que se consume.
+
+    BaseDocTemplate.build saca los flowables del principio de la lista (y reinserta los
+    partidos); con esta lista solo hay en memoria unos pocos lotes del anexo a la vez.
+    """
+
+    def __init__(self, flowables: Iterable[Flowable], lookahead: int = 8) -> None:
+        super().__init__()
+        # None cuando el generador se agota
+        self._source: Optional[Iterator[Flowable]] = iter(flowables)
+        self._lookahead = lookahead
+
+    def _fill(self) -> None:
+        while self._source is not None and super().__len__() < self._lookahead:
+            nxt = next(self._source, None)
+            if nxt is None:
+                self._source = None
+            else:
+                self.append(nxt)
+
+    def __len__(self) -> int:
+        self._fill()
+        return super().__len__()
+
+    def __getitem__(self, index: Any) -> Any:
+        self._fill()
+        return super().__getitem__(index)
+
+
+def _annex_rows(
+    hashes_csv: Path, start: int = 0, stop: Optional[int] = None
+) -> Iterator[List[str]]:
+    with open(hashes_csv, "r", newline="", encoding="utf-8") as fh:
+        rows = islice(enumerate(csv.DictReader(fh), 1), start, stop)
+        for n, row in rows:
+            path = row.get("path_dropbox") or row.get("path_local") or ""
+            lines = [path[i:i + ANNEX_PATH_WIDTH] for i in range(0, len(path), ANNEX_PATH_WIDTH)]
+            yield [
+                str(n),
+                "\n".join(lines),
+                row.get("size") or "",
+                row.get("sha256") or "",
+                row.get("dropbox_hash_match") or "",
+            ]
+
+
+def _count_rows(hashes_csv: Path) -> int:
+    with open(hashes_csv, "r", newline="", encoding="utf-8") as fh:
+        return sum(1 for _ in csv.DictReader(fh))
+
+
+def _annex_table(rows: List[List[str]]) -> Table:
+    table = Table([ANNEX_HEADER] + rows, colWidths=_ANNEX_COL_WIDTHS, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
+        ('FONTNAME', (3,1), (3,-1), 'Courier'),
+        ('FONTSIZE', (0,0), (-1,-1), 6),
+        ('LEADING', (0,0), (-1,-1), 7),
+        ('TOPPADDING', (0,0), (-1,-1), 1.5),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 1.5),
+        ('ALIGN', (2,1), (2,-1), 'RIGHT'),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('GRID', (0,0), (-1,-1), 0.25, colors.grey),
+    ]))
+    return table
+
+
+def _annex_story(
+    hashes_csv: Path, rows: Iterable[List[str]], rows_per_page: int, title: str, styles: Any
+) -> Iterator[Flowable]:
+    """Flowables del anexo: una tabla por página, creadas solo cuando se van a maquetar."""
+    yield Paragraph(f"<b>{title}</b>", styles['Heading2'])
+    yield Paragraph(f"Fuente: {hashes_csv.name}", styles['Normal'])
+    yield Spacer(1, 6)
+    batch: List[List[str]] = []
+    lines = 0
+    first = True
+    for row in rows:
+        height = row[1].count("\n") + 1
+        if batch and lines + height > rows_per_page:
+            if not first:
+                yield PageBreak()
+            yield _annex_table(batch)
+            batch, lines, first = [], 0, False
+        batch.append(row)
+        lines += height
+    if batch or first:
+        if not first:
+            yield PageBreak()
+        yield _annex_table(batch)
+
 
-    # Configuración del documento con márgenes estándar
-    doc = SimpleDocTemplate(
+def _page_number(c: canvas.Canvas, doc: BaseDocTemplate) -> None:
+    c.saveState()
+    c.setFont("Helvetica", 7)
+    c.drawRightString(doc.pagesize[0] - 2 * cm, 1.2 * cm, f"Página {c.getPageNumber()}")
+    c.restoreState()
+
+
+def _document(out_file: Path, annex_only: bool = False) -> BaseDocTemplate:
+    """Documento con una plantilla A4 vertical (reporte) y otra apaisada (anexo)."""
+    doc = BaseDocTemplate(
         str(out_file),
-        pagesize=A4,
+        pagesize=landscape(A4) if annex_only else A4,
         rightMargin=2*cm,
         leftMargin=2*cm,
         topMargin=2*cm,
         bottomMargin=2*cm,
+        pageCompression=1,
+    )
+    portrait_w, portrait_h = A4
+    annex_w, annex_h = landscape(A4)
+    annex = PageTemplate(
+        id="anexo",
+        pagesize=landscape(A4),
+        frames=[Frame(2*cm, 1.5*cm, annex_w - 4*cm, annex_h - 3*cm, id="anexo")],
+        onPage=_page_number,
+    )
+    report = PageTemplate(
+        id="reporte",
+        pagesize=A4,
+        frames=[Frame(2*cm, 2*cm, portrait_w - 4*cm, portrait_h - 4*cm, id="cuerpo")],
+        onPage=_page_number,
     )
+    doc.addPageTemplates([annex] if annex_only else [report, annex])
+    return doc
+
+
+def annex_volume_file(out_file: Path, volume: int) -> Path:
+    return out_file.with_name(f"{out_file.stem}_anexo_{volume:03d}{out_file.suffix}")
+
+
+def _write_annex_volumes(
+    out_file: Path, hashes_csv: Path, rows_per_page: int, rows_per_volume: int, styles: Any
+) -> List[Path]:
+    """Escribe los volúmenes 2..n del anexo; el primero va dentro del reporte principal."""
+    total = _count_rows(hashes_csv)
+    volumes = max(1, -(-total // rows_per_volume))
+    written = []
+    for volume in range(2, volumes + 1):
+        start = (volume - 1) * rows_per_volume
+        stop = min(total, start + rows_per_volume)
+        title = (
+            f"Anexo – Hashes por archivo, volumen {volume} de {volumes} "
+            f"(filas {start + 1} a {stop})"
+        )
+        target = annex_volume_file(out_file, volume)
+        rows = _annex_rows(hashes_csv, start, stop)
+        story = _StreamingStory(_annex_story(hashes_csv, rows, rows_per_page, title, styles))
+        _document(target, annex_only=True).build(story)
+        written.append(target)
+    return written
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def generate_pdf_report(
+    out_file: Path,
+    summary: Dict[str, Any],
+    session: Dict[str, Any],
+    hashes_csv: Optional[Path] = None,
+    rows_per_page: int = ANNEX_ROWS_PER_PAGE,
+    rows_per_volume: int = ANNEX_ROWS_PER_VOLUME,
+    logo_path: Optional[Path] = LOGO_FILE,
+) -> List[Path]:
+    """Genera el PDF; con ``hashes_csv`` agrega el anexo de hashes por archivo.
+
+    Devuelve los archivos escritos: el reporte y, si el anexo supera ``rows_per_volume``
+    filas, sus volúmenes adicionales (cuyo SHA-256 figura en el resumen del reporte).
+    """
+    out_file.parent.mkdir(parents=True, exist_ok=True)
     styles = getSampleStyleSheet()
-    story = []
+    volumes: List[Path] = []
+    if hashes_csv is not None:
+        volumes = _write_annex_volumes(
+            out_file, hashes_csv, rows_per_page, rows_per_volume, styles
+        )
+        if volumes:
+            summary = dict(summary)
+            summary["anexo_volumenes"] = "<br/>".join(
+                f"{v.name}: {_sha256_file(v)}" for v in volumes
+            )
+
+    # Configuración del documento con márgenes estándar; el anexo va en A4 apaisado
+    doc = _document(out_file)
+    story: List[Flowable] = []
 
     # Encabezado
-    logo_path = "C:/Users/ivan_/OneDrive - Consejo Superior de la Judicatura/Documentos/PERSONALES\MAESTRÍA_SEGURIDAD_TIC\M10_TFM/proyecto_afrec/afrec/logo.png"  # ajusta la ruta a tu archivo
-    logo = Image(logo_path, width=6*cm, height=2*cm)  # tamaño del logo
-    logo.hAlign = "LEFT"  # alinear a la izquierda
-    story.append(logo)
-    story.append(Spacer(1, 12))  # espacio debajo del logo
+    if logo_path is not None and Path(logo_path).exists():
+        logo = Image(str(logo_path), width=6*cm, height=2*cm)  # tamaño del logo
+        logo.hAlign = "LEFT"  # alinear a la izquierda
+        story.append(logo)
+        story.append(Spacer(1, 12))  # espacio debajo del logo
 
-    story.append(Paragraph("<b>AFREC – Reporte de Adquisición Forense (Dropbox)</b>", styles['Title']))
+    story.append(
+        Paragraph("<b>AFREC – Reporte de Adquisición Forense (Dropbox)</b>", styles['Title'])
+    )
     story.append(Spacer(1, 12))
-    story.append(Paragraph(f"Fecha de generación (UTC): {datetime.now(timezone.utc).isoformat()}", styles['Normal']))
+    generated = datetime.now(timezone.utc).isoformat()
+    story.append(Paragraph(f"Fecha de generación (UTC): {generated}", styles['Normal']))
     story.append(Spacer(1, 20))
 
     # Datos de la sesión
@@ -111,5 +332,13 @@ def generate_pdf_report(
     ]))
     story.append(table2)
 
+    if hashes_csv is not None:
+        title = "Anexo – Hashes por archivo"
+        if volumes:
+            title += f", volumen 1 de {len(volumes) + 1} (filas 1 a {rows_per_volume})"
+        rows = _annex_rows(hashes_csv, 0, rows_per_volume)
+        annex = _annex_story(hashes_csv, rows, rows_per_page, title, styles)
+        story = _StreamingStory(chain(story, [NextPageTemplate("anexo"), PageBreak()], annex))
     # Construir el PDF
-    doc.build(story)
\ No newline at end of file
+    doc.build(story)
+    return [out_file] + volumes
\ No newline at end of file
@@ -0,0 +1,169 @@
+""" Aquí se Implementa el planificador adaptativo de peticiones a Dropbox.
+Sustituye el reintento ciego con espera exponencial por una política que:
+* respeta el backoff indicado por el servidor (RateLimitError / Retry-After),
+* falla de inmediato ante errores permanentes (path/not_found, autenticación, etc.),
+* reduce la concurrencia al ser limitado (AIMD: aumento aditivo, reducción multiplicativa)
+  y la recupera cuando las respuestas vuelven a ser sanas,
+* lleva contadores de reintentos y limitaciones para el log del caso y, con ``metrics``,
+  registra la latencia de cada intento y la espera por un turno.
+Es compartido por todos los workers de una adquisición. """
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+import requests
+from dropbox.exceptions import HttpError, InternalServerError, RateLimitError
+
+from .metrics import AcquisitionMetrics
+
+T = TypeVar("T")
+
+# Clasificación de errores
+PERMANENT = "permanent"
+TRANSIENT = "transient"
+THROTTLED = "throttled"
+
+
+def classify_error(exc: BaseException) -> Tuple[str, Optional[float]]:
+    """Devuelve (tipo, backoff sugerido por el servidor en segundos o None)."""
+    if isinstance(exc, RateLimitError):
+        return THROTTLED, float(exc.backoff) if exc.backoff is not None else None
+    if isinstance(exc, InternalServerError):
+        return TRANSIENT, None
+    if isinstance(exc, HttpError):
+        if exc.status_code == 429:
+            return THROTTLED, None
+        if exc.status_code >= 500:
+            return TRANSIENT, None
+        return PERMANENT, None
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if status == 429 or status == 503:
+            retry_after = exc.response.headers.get("Retry-After")
+            try:
+                hint = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                hint = None
+            return THROTTLED, hint
+        return (TRANSIENT, None) if status >= 500 else (PERMANENT, None)
+    if isinstance(exc, (requests.exceptions.RequestException, ConnectionError, TimeoutError)):
+        # Incluye IncompleteDownloadError (transferencia truncada)
+        return TRANSIENT, None
+    # ApiError (errores de ruta), AuthError, BadInputError y cualquier otro: no reintentar
+    return PERMANENT, None
+
+
+class AdaptiveScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        retries: int = 6,
+        base_delay: float = 1.5,
+        max_delay: float = 300.0,
+        sleep: Callable[[float], None] = time.sleep,
+        metrics: Optional[AcquisitionMetrics] = None,
+        name: str = "download",
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency debe ser >= 1")
+        self.name = name
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.add_scheduler(name, self)
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self.counters: Dict[str, float] = {
+            "requests": 0,
+            "retries": 0,
+            "throttled": 0,
+            "permanent_failures": 0,
+            "backoff_seconds": 0.0,
+        }
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self._limit))
+
+    def _acquire_slot(self) -> None:
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def _release_slot(self, outcome: str, hint: Optional[float] = None) -> float:
+        """Libera el turno, ajusta la concurrencia y devuelve la espera a aplicar."""
+        with self._cond:
+            self._in_flight -= 1
+            self.counters["requests"] += 1
+            delay = 0.0
+            if outcome == "ok":
+                # Aumento aditivo: ~ +1 de concurrencia por ventana completa de éxitos
+                self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            elif outcome == THROTTLED:
+                self.counters["throttled"] += 1
+                self._limit = max(1.0, self._limit / 2)
+                if hint is not None:
+                    # Pausa compartida: ningún worker envía peticiones hasta que pase el backoff
+                    delay = min(hint, self.max_delay)
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._cond.notify_all()
+            return delay
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def run(self, fn: Callable[[], T]) -> T:
+        """Ejecuta ``fn`` con la política de reintentos y concurrencia del planificador."""
+        for attempt in range(self.retries):
+            waited = time.perf_counter()
+            self._acquire_slot()
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                self._observe(waited, started)
+                kind, hint = classify_error(e)
+                delay = self._release_slot(kind, hint)
+                if kind == PERMANENT or attempt == self.retries - 1:
+                    if kind == PERMANENT:
+                        with self._cond:
+                            self.counters["permanent_failures"] += 1
+                    raise
+                if delay <= 0:
+                    delay = self._backoff(attempt)
+                with self._cond:
+                    self.counters["retries"] += 1
+                    self.counters["backoff_seconds"] += delay
+                self._sleep(delay)
+                continue
+            self._observe(waited, started)
+            self._release_slot("ok")
+            return result
+        raise RuntimeError("retries debe ser >= 1")  # pragma: no cover
+
+    def _observe(self, waited: float, started: float) -> None:
+        if self._metrics is not None:
+            self._metrics.observe(f"{self.name}_wait_seconds", started - waited)
+            self._metrics.observe(f"{self.name}_request_seconds", time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            data: Dict[str, Any] = dict(self.counters)
+            data["backoff_seconds"] = round(data["backoff_seconds"], 3)
+            data["concurrency_limit"] = self.limit
+            return data
@@ -47,6 +47,11 @@ class Session:
             ip_address=_get_ip(),
         )
 
+    @staticmethod
+    def load(path: Path) -> "Session":
+        with open(path, "r", encoding="utf-8") as fh:
+            return Session(**json.load(fh))
+
     def save(self, path: Path) -> None:
         path.parent.mkdir(parents=True, exist_ok=True)
         with open(path, "w", encoding="utf-8") as fh:
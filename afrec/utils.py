@@ -1,13 +1,23 @@
 """ Funciones utilitarias de apoyo.
 Ejemplo:
 utc_now_iso() → timestamp en UTC.
-save_json() → guardar cualquier objeto en JSON. """
+save_json() → guardar cualquier objeto en JSON.
+prefetch() → consume un iterable en un hilo productor a través de una cola acotada.
+prefetch_many() → igual, pero con varias fuentes en paralelo entregadas en orden. """
 
 from __future__ import annotations
 
 import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
 
 
 def utc_now_iso() -> str:
@@ -17,5 +27,105 @@ def utc_now_iso() -> str:
 def save_json(data, path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with open(path, "w", encoding="utf-8") as fh:
-        import json as _json
-        _json.dump(data, fh, ensure_ascii=False, indent=2)
+        json.dump(data, fh, ensure_ascii=False, indent=2)
+
+
+def prefetch(items: Iterable[T], maxsize: int = 1000, name: str = "afrec-prefetch") -> Iterator[T]:
+    """Itera ``items`` en un hilo productor y entrega sus elementos en el mismo orden.
+
+    La cola acotada (``maxsize``) limita cuánto se adelanta el productor. Las excepciones
+    del productor se relanzan en el consumidor; si el consumidor se detiene antes de
+    tiempo, el productor se detiene también.
+    """
+    q: "queue.Queue[object]" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def _put(obj: object) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(obj, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in items:
+                if not _put(item):
+                    return
+        except BaseException as e:  # se entrega al consumidor
+            _put(_Failure(e))
+            return
+        _put(_DONE)
+
+    worker = threading.Thread(target=_produce, name=name, daemon=True)
+    worker.start()
+    try:
+        while True:
+            obj = q.get()
+            if obj is _DONE:
+                break
+            if isinstance(obj, _Failure):
+                raise obj.error
+            yield obj  # type: ignore[misc]
+    finally:
+        stop.set()
+        worker.join(timeout=1)
+
+
+def prefetch_many(
+    sources: Sequence[Callable[[], Iterable[T]]],
+    workers: int = 4,
+    maxsize: int = 10000,
+) -> Iterator[T]:
+    """Produce varias fuentes en paralelo (hasta ``workers``) y las entrega una tras otra.
+
+    Cada fuente tiene su propia cola acotada. Como las fuentes arrancan en orden (FIFO),
+    la que se está consumiendo siempre tiene un hilo asignado y no hay bloqueo mutuo.
+    """
+    stop = threading.Event()
+    queues: "List[queue.Queue[object]]" = [queue.Queue(maxsize=maxsize) for _ in sources]
+
+    def _put(q: "queue.Queue[object]", obj: object) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(obj, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(source: Callable[[], Iterable[T]], q: "queue.Queue[object]") -> None:
+        if stop.is_set():
+            return
+        try:
+            for item in source():
+                if not _put(q, item):
+                    return
+        except BaseException as e:  # se entrega al consumidor
+            _put(q, _Failure(e))
+            return
+        _put(q, _DONE)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="afrec-part")
+    try:
+        for source, q in zip(sources, queues):
+            pool.submit(_produce, source, q)
+        for q in queues:
+            while True:
+                obj = q.get()
+                if obj is _DONE:
+                    break
+                if isinstance(obj, _Failure):
+                    raise obj.error
+                yield obj  # type: ignore[misc]
+    finally:
+        stop.set()
+        # Las fuentes pendientes ven ``stop`` activo y terminan sin producir
+        pool.shutdown(wait=False)
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
@@ -0,0 +1,229 @@
+""" Aquí se Re-verifica la evidencia de un caso existente contra su hashes.csv.
+Permite comprobar un caso archivado o copiado a otro soporte (afrec verify):
+* Re-hashea cada archivo de evidence/ en paralelo (hilos: hashlib libera el GIL) y con
+  mmap para archivos grandes, en una ventana acotada de trabajos. Con --full, el content
+  hash de los archivos grandes se calcula por bloques en paralelo.
+* Cada archivo físico se lee una sola vez aunque varias filas lo referencien (dedup).
+* Informa archivos faltantes, modificados (tamaño o hash distinto) y sobrantes
+  (presentes en evidence/ pero ausentes de hashes.csv).
+* Las rutas se resuelven dentro de la carpeta del caso, no con la ruta absoluta original,
+  para que la verificación funcione tras mover o copiar el caso (los archivos trasladados
+  con --since-case se buscan en el caso anterior).
+* Con una caché de hashes (cache_hashes.db) los archivos cuya identidad (ruta, tamaño,
+  mtime, inodo) no cambió desde la verificación anterior no se vuelven a leer.
+* Si el caso tiene merkle.json, se recalcula la raíz desde hashes.csv y se compara con
+  la registrada en la adquisición. """
+
+from __future__ import annotations
+
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .hashcache import HashCache
+from .integrity import HashRecord, hash_file_digests
+from .merkle import build_case_tree, recorded_root
+
+EVIDENCE_DIR = "evidence"
+
+
+@dataclass
+class VerifyReport:
+    checked: int = 0
+    ok: int = 0
+    bytes_hashed: int = 0
+    seconds: float = 0.0
+    # Archivos cuyos digests salieron de la caché, sin leerlos
+    cache_hits: int = 0
+    missing: List[str] = field(default_factory=list)
+    modified: List[Dict[str, Any]] = field(default_factory=list)
+    extra: List[str] = field(default_factory=list)
+    # Archivos presentes que no se pudieron leer (permisos, un directorio en su lugar...)
+    unreadable: List[Dict[str, str]] = field(default_factory=list)
+    # None si el caso no tiene manifiesto Merkle
+    merkle_root_ok: Optional[bool] = None
+
+    @property
+    def intact(self) -> bool:
+        if self.merkle_root_ok is False:
+            return False
+        return not (self.missing or self.modified or self.extra or self.unreadable)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "checked": self.checked,
+            "ok": self.ok,
+            "missing": len(self.missing),
+            "modified": len(self.modified),
+            "extra": len(self.extra),
+            "unreadable": len(self.unreadable),
+        }
+
+    def to_report(self) -> Dict[str, Any]:
+        mb_s = self.bytes_hashed / self.seconds / 1e6 if self.seconds else 0.0
+        return {
+            "intact": self.intact,
+            "counts": self.counts(),
+            "bytes_hashed": self.bytes_hashed,
+            "seconds": round(self.seconds, 3),
+            "throughput_mb_s": round(mb_s, 1),
+            "cache_hits": self.cache_hits,
+            "merkle_root_ok": self.merkle_root_ok,
+            "missing": self.missing,
+            "modified": self.modified,
+            "extra": self.extra,
+            "unreadable": self.unreadable,
+        }
+
+
+def evidence_path(case_dir: Path, path_local: str) -> Path:
+    """Ubica path_local dentro de case_dir/evidence aunque el caso se haya movido.
+
+    Se corta en la carpeta evidence que cuelga del caso (la que sigue al nombre de la
+    carpeta del caso o, si el caso se renombró, la primera): una carpeta de Dropbox que
+    también se llame evidence queda dentro de la ruta relativa."""
+    parts = Path(path_local.replace("\\", "/")).parts
+    cuts = [i for i, part in enumerate(parts) if part == EVIDENCE_DIR]
+    if cuts:
+        under_case = [i for i in cuts if i > 0 and parts[i - 1] == case_dir.name]
+        cut = under_case[0] if under_case else cuts[0]
+        return case_dir.joinpath(EVIDENCE_DIR, *parts[cut + 1:])
+    p = Path(path_local)
+    return p if p.is_absolute() else case_dir / p
+
+
+def record_path(case_dir: Path, record: HashRecord) -> Path:
+    """Archivo local de un registro; los trasladados (--since-case) viven en el caso anterior."""
+    base = case_dir
+    carried = record["carried_from"]
+    if carried:
+        previous = Path(carried)
+        # Si los casos se copiaron juntos, el anterior está al lado de este
+        sibling = case_dir.parent / previous.name
+        base = sibling if sibling.exists() else previous
+    return evidence_path(base, record["path_local"])
+
+
+def _iter_records(hashes_csv: Path) -> Iterator[HashRecord]:
+    with open(hashes_csv, "r", newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            yield HashRecord.from_mapping(row)
+
+
+def _hash(
+    path: Path, full: bool, cache: Optional[HashCache], block_workers: int = 1
+) -> Optional[Dict[str, Any]]:
+    try:
+        if cache is not None:
+            size, digests, cached = cache.hash_file(
+                path, content_hash=full, md5=full, block_workers=block_workers
+            )
+            return {"size": size, "cached": cached, **digests}
+        size, digests = hash_file_digests(
+            path, content_hash=full, md5=full, block_workers=block_workers
+        )
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        # Se informa en la entrada en vez de abortar toda la verificación
+        return {"error": f"{type(exc).__name__}: {exc}"}
+    return {"size": size, "cached": False, **digests}
+
+
+def _compare(record: HashRecord, actual: Dict[str, Any]) -> Optional[Tuple[str, Any, Any]]:
+    """Primera discrepancia entre el registro y el archivo en disco, o None."""
+    checks = [
+        ("size", record["size"], actual["size"]),
+        ("sha256", record["sha256"], actual["sha256"]),
+    ]
+    if "md5" in actual:
+        checks.append(("md5", record["md5"], actual["md5"]))
+    if "dropbox_content_hash" in actual:
+        expected = record["dropbox_content_hash_local"]
+        checks.append(("dropbox_content_hash", expected, actual["dropbox_content_hash"]))
+    for name, expected, got in checks:
+        if expected is not None and expected != got:
+            return name, expected, got
+    return None
+
+
+def verify_case(
+    case_dir: Path,
+    workers: Optional[int] = None,
+    full: bool = False,
+    cache: Optional[HashCache] = None,
+) -> VerifyReport:
+    """Re-hashea la evidencia del caso y la compara con hashes.csv.
+
+    Por defecto comprueba tamaño y SHA-256; ``full`` añade MD5 y el content hash de
+    Dropbox (más lento: tres digests). En los archivos grandes el content hash se reparte
+    por bloques entre los núcleos que no ocupan los ``workers`` (ver hash_file_digests).
+    Sin ``cache`` se lee cada archivo completo.
+    """
+    cpus = os.cpu_count() or 4
+    workers = workers or cpus
+    block_workers = max(2, cpus // workers)
+    report = VerifyReport()
+    started = time.monotonic()
+    # path local -> registros que lo referencian (más de uno con deduplicación)
+    by_path: Dict[Path, List[HashRecord]] = {}
+    for rec in _iter_records(case_dir / "hashes.csv"):
+        if rec["path_local"] is None:
+            continue
+        by_path.setdefault(record_path(case_dir, rec), []).append(rec)
+
+    def _check(path: Path, actual: Optional[Dict[str, Any]]) -> None:
+        for rec in by_path[path]:
+            report.checked += 1
+            name = rec["path_dropbox"] or str(path)
+            if actual is None:
+                report.missing.append(name)
+                continue
+            if "error" in actual:
+                report.unreadable.append({"path_dropbox": name, "error": actual["error"]})
+                continue
+            diff = _compare(rec, actual)
+            if diff is None:
+                report.ok += 1
+            else:
+                report.modified.append(
+                    {"path_dropbox": name, "field": diff[0], "expected": diff[1], "actual": diff[2]}
+                )
+        if actual is None or "error" in actual:
+            return
+        if actual["cached"]:
+            report.cache_hits += 1
+        else:
+            report.bytes_hashed += actual["size"]
+
+    # Ventana acotada: no se crean millones de futures de golpe
+    window: Deque[Tuple[Path, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="afrec-verify") as pool:
+        for path in by_path:
+            window.append((path, pool.submit(_hash, path, full, cache, block_workers)))
+            if len(window) >= 2 * workers:
+                done_path, fut = window.popleft()
+                _check(done_path, fut.result())
+        while window:
+            done_path, fut = window.popleft()
+            _check(done_path, fut.result())
+
+    evidence_root = case_dir / EVIDENCE_DIR
+    if evidence_root.exists():
+        for dirpath, _dirs, files in os.walk(evidence_root):
+            for name in files:
+                p = Path(dirpath) / name
+                if p not in by_path:
+                    report.extra.append(p.relative_to(evidence_root).as_posix())
+    report.extra.sort()
+    root = recorded_root(case_dir)
+    if root is not None:
+        # hashes.csv alterado después de la adquisición cambia la raíz
+        report.merkle_root_ok = build_case_tree(case_dir)[0].root == root
+    report.seconds = time.monotonic() - started
+    return report
@@ -0,0 +1,67 @@
+""" Aquí se Mide el content hash de Dropbox en serie y por bloques en paralelo.
+Crea un archivo temporal de N MiB, lo lee una vez para dejarlo en la caché de páginas y
+compara dropbox_content_hash (un bloque tras otro) con parallel_content_hash para 1, 2,
+4, ... hilos hasta el número de núcleos. Comprueba que todos los resultados son idénticos.
+Con la caché fría el límite suele ser el disco, no la CPU.
+
+Uso:
+    python benchmarks/bench_content_hash.py [MiB] [directorio]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from afrec.integrity import dropbox_content_hash, parallel_content_hash
+
+
+def _write(path: Path, mib: int) -> None:
+    chunk = os.urandom(1024 * 1024)
+    with open(path, "wb") as fh:
+        for _ in range(mib):
+            fh.write(chunk)
+
+
+def _timed(fn: Callable[[], str]) -> Tuple[str, float]:
+    started = time.perf_counter()
+    digest = fn()
+    return digest, time.perf_counter() - started
+
+
+def main() -> None:
+    mib = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    directory = sys.argv[2] if len(sys.argv) > 2 else None
+    cores = os.cpu_count() or 1
+    threads: List[int] = []
+    t = 1
+    while t < cores:
+        threads.append(t)
+        t *= 2
+    threads.append(cores)
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = Path(tmp) / "grande.bin"
+        _write(path, mib)
+        dropbox_content_hash(path)  # calienta la caché de páginas
+
+        expected, serial = _timed(lambda: dropbox_content_hash(path))
+        print(f"Archivo: {mib} MiB, núcleos: {cores}")
+        print(f"  serie          {serial:7.2f} s  {mib / serial:8.1f} MiB/s")
+        for n in threads:
+            digest, secs = _timed(lambda: parallel_content_hash(path, workers=n, min_size=0))
+            if digest != expected:
+                raise SystemExit(f"content hash distinto con {n} hilos: {digest} != {expected}")
+            print(
+                f"  {n:3d} hilos      {secs:7.2f} s  {mib / secs:8.1f} MiB/s"
+                f"  x{serial / secs:.2f}"
+            )
+    print(f"content hash: {expected} (idéntico en todas las variantes)")
+
+
+if __name__ == "__main__":
+    main()
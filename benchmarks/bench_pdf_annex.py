@@ -0,0 +1,75 @@
+""" Aquí se Mide el tiempo y la memoria del anexo de hashes del reporte PDF.
+Genera un hashes.csv sintético de N filas (rutas de longitud variable, algunas en dos
+líneas) y construye el PDF con el anexo. Informa el tiempo total, las páginas y el pico
+de memoria residente del proceso (Unix) de una corrida con N/10 filas y otra con N, para
+comprobar que la memoria no crece con el número de archivos: las tablas se crean por
+lotes a medida que se maquetan y, como ReportLab guarda las páginas de cada PDF en
+memoria hasta escribirlo, los anexos grandes se dividen en volúmenes.
+
+Uso:
+    python benchmarks/bench_pdf_annex.py [N]
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+from afrec.integrity import HASH_RECORD_FIELDS
+from afrec.reports import generate_pdf_report, write_csv
+
+
+def _rows(n: int) -> Iterator[Dict[str, object]]:
+    for i in range(n):
+        folder = "subcarpeta_con_nombre_largo/" * (i % 5)
+        yield {
+            "path_dropbox": f"/Caso/{folder}documento_{i:07d}.pdf",
+            "size": i * 1024,
+            "sha256": hashlib.sha256(i.to_bytes(8, "big")).hexdigest(),
+            "dropbox_hash_match": "yes",
+        }
+
+
+def _peak_rss_mib() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KiB y macOS bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def _run(tmp: Path, n: int) -> Tuple[float, int, int, Optional[float]]:
+    hashes = tmp / f"hashes_{n}.csv"
+    write_csv(_rows(n), hashes, headers=HASH_RECORD_FIELDS)
+    pdf = tmp / f"reporte_{n}.pdf"
+    started = time.perf_counter()
+    files = generate_pdf_report(pdf, {"archivos": n}, {"id": "bench"}, hashes_csv=hashes)
+    secs = time.perf_counter() - started
+    pages = sum(len(re.findall(rb"/Type /Page\b", f.read_bytes())) for f in files)
+    return secs, len(files), pages, _peak_rss_mib()
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in (n // 10, n):
+            secs, files, pages, peak = _run(Path(tmp), rows)
+            rss = f"{peak:7.1f} MiB" if peak is not None else "n/d"
+            print(
+                f"{rows:8d} filas: {secs:7.1f} s, {files:3d} PDF, {pages:6d} páginas, "
+                f"{rows / secs:8.0f} filas/s, pico de memoria residente {rss}"
+            )
+
+
+if __name__ == "__main__":
+    main()
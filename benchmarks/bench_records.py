@@ -0,0 +1,120 @@
+""" Aquí se Mide la memoria por elemento de InventoryItem y de los registros de hash.
+Compara la representación anterior (dataclass con fechas ISO y digests en texto, más la
+copia en dict que recibía el descargador y el registro como dict) con la compacta
+(__slots__, fechas epoch y digests en bytes).
+
+Uso:
+    python benchmarks/bench_records.py [N]
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from afrec.explorer import InventoryItem
+from afrec.integrity import HashRecord
+
+BASE = datetime.datetime(2024, 1, 1)
+
+
+@dataclass
+class LegacyInventoryItem:
+    path_display: str
+    id: str
+    size: int
+    client_modified: str
+    server_modified: str
+    rev: str
+    content_hash: Optional[str]
+
+
+def _fields(n: int) -> Dict[str, Any]:
+    # Cadenas nuevas en cada llamada, como las que llegan del SDK o del CSV
+    ts = BASE + datetime.timedelta(seconds=n * 37)
+    return {
+        "path_display": f"/Caso/Carpeta {n % 97}/documento_{n:07d}.pdf",
+        "id": f"id:{n:022d}",
+        "size": 1000 + n,
+        "client_modified": ts,
+        "server_modified": ts,
+        "rev": f"{n:015x}",
+        "content_hash": hashlib.sha256(str(n).encode()).hexdigest(),
+    }
+
+
+def _digests(n: int) -> Dict[str, str]:
+    b = str(n).encode()
+    return {"sha256": hashlib.sha256(b).hexdigest(), "md5": hashlib.md5(b).hexdigest()}
+
+
+def legacy(n: int) -> List[Any]:
+    f = _fields(n)
+    item = LegacyInventoryItem(**{
+        **f,
+        "client_modified": f["client_modified"].isoformat(),
+        "server_modified": f["server_modified"].isoformat(),
+    })
+    d = _digests(n)
+    record = {
+        "path_local": "cases/x/evidence" + item.path_display,
+        "path_dropbox": item.path_display,
+        "size": item.size,
+        "sha256": d["sha256"],
+        "md5": d["md5"],
+        "dropbox_content_hash_local": item.content_hash,
+        "dropbox_content_hash_remote": item.content_hash,
+        "server_modified": item.server_modified,
+        "rev": item.rev,
+        "id": item.id,
+        "dropbox_hash_match": "yes",
+    }
+    return [item, dict(item.__dict__), record]
+
+
+def compact(n: int) -> List[Any]:
+    item = InventoryItem(**_fields(n))
+    d = _digests(n)
+    record = HashRecord(
+        path_local="cases/x/evidence" + item.path_display,
+        path_dropbox=item.path_display,
+        size=item.size,
+        sha256=d["sha256"],
+        md5=d["md5"],
+        dropbox_content_hash_local=item.content_hash,
+        dropbox_content_hash_remote=item.content_hash,
+        server_modified=item.server_modified,
+        rev=item.rev,
+        id=item.id,
+        dropbox_hash_match="yes",
+    )
+    # El dict para el descargador se crea y se descarta por elemento (to_dict)
+    return [item, record]
+
+
+def per_item(build: Callable[[int], List[Any]], n: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    old = per_item(legacy, n)
+    new = per_item(compact, n)
+    print(f"N = {n}")
+    print(f"  antes (dataclass + dict + registro dict): {old:8.1f} bytes/elemento")
+    print(f"  ahora (slots, epoch, bytes):              {new:8.1f} bytes/elemento")
+    print(f"  reducción: {100 * (1 - new / old):.1f} %")
+
+
+if __name__ == "__main__":
+    main()
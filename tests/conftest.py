@@ -0,0 +1,55 @@
+""" Cliente de Dropbox falso compartido por las pruebas de descarga.
+FakeDropbox entrega el contenido de ``blobs`` (o la propia ruta en bytes), respeta la
+cabecera Range, puede truncar las respuestas y anota cada ruta pedida en ``calls``.
+El fixture fake_dropbox devuelve la clase para que cada prueba la configure o la extienda. """
+
+import random
+import time
+from pathlib import Path
+
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+
+    def iter_content(self, chunk_size=1):
+        # Trozos pequeños para cuerpos cortos: así se ejercita la escritura por bloques
+        step = 3 if len(self.body) < 1024 else chunk_size
+        for n in range(0, len(self.body), step):
+            yield self.body[n:n + step]
+
+    def close(self):
+        pass
+
+
+class FakeDropbox:
+    def __init__(self, truncate: int = 0, blobs=None, latency: float = 0.0) -> None:
+        self.truncate = truncate
+        self.blobs = blobs or {}
+        self.latency = latency
+        self.calls = []
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(random.random() * self.latency)
+
+    def files_download(self, path, rev=None, extra_headers=None):
+        self.calls.append(path)
+        self._wait()
+        body = self.blobs.get(path, path.encode("utf-8"))
+        if extra_headers and "Range" in extra_headers:
+            start, end = extra_headers["Range"][len("bytes="):].split("-")
+            body = body[int(start): int(end) + 1]
+        return None, FakeResponse(body[: len(body) - self.truncate])
+
+    def files_download_to_file(self, download_path, path):
+        self.calls.append(path)
+        self._wait()
+        Path(download_path).write_bytes(self.blobs.get(path, path.encode("utf-8")))
+
+
+@pytest.fixture
+def fake_dropbox():
+    return FakeDropbox
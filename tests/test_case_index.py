@@ -0,0 +1,94 @@
+""" Verifica el índice SQLite del caso (indice.db).
+Escribe inventario y hashes por lotes, consulta por tamaño, fecha, ruta y hash no
+coincidente, comprueba que rebuild_index produce lo mismo desde los archivos planos y
+que un índice cerrado no se puede usar. """
+
+import json
+from pathlib import Path
+
+import pytest
+
+from afrec.custody import ChainOfCustody, CustodyEntry
+from afrec.explorer import InventoryItem, save_inventory_csv
+from afrec.index import INDEX_FILE, CaseIndex, rebuild_index
+from afrec.integrity import HASH_RECORD_FIELDS
+from afrec.reports import write_csv
+
+MB = 1024 * 1024
+
+
+def _case():
+    items, records = [], []
+    for n in range(25):
+        month = 3 if n % 2 else 4
+        item = InventoryItem(
+            f"/Caso/Doc{n}.{'pdf' if n % 3 else 'txt'}", f"id:{n}", n * 10 * MB,
+            "2025-01-01T00:00:00", f"2025-{month:02d}-{n % 28 + 1:02d}T10:00:00", f"rev{n:06d}",
+            f"ch{n}",
+        )
+        items.append(item)
+        records.append({
+            "path_local": f"evidence/Caso/Doc{n}", "path_dropbox": item.path_display,
+            "size": item.size, "sha256": f"{n:064x}", "md5": f"{n:032x}",
+            "dropbox_content_hash_local": f"ch{n}" if n % 5 else "otro",
+            "dropbox_content_hash_remote": f"ch{n}", "server_modified": item.server_modified,
+            "rev": item.rev, "id": item.id, "dropbox_hash_match": "yes" if n % 5 else "no",
+            "dedup_of": None, "carried_from": None,
+        })
+    return items, records
+
+
+def _expected(items, records):
+    match = {r["id"]: r["dropbox_hash_match"] for r in records}
+    return sorted(
+        i.path_display for i in items
+        if i.size > 100 * MB and i.server_modified.startswith("2025-03") and match[i.id] == "no"
+    )
+
+
+def test_batched_writes_and_queries(tmp_path: Path):
+    items, records = _case()
+    with CaseIndex(tmp_path / INDEX_FILE, batch_size=4) as index:
+        for i in items:
+            index.add_item(i)
+        for r in records:
+            index.add_record(r)
+        filters = dict(min_size=100 * MB + 1, modified_from="2025-03-01T00:00:00",
+                       modified_to="2025-03-31T23:59:59", mismatch=True)
+        found = [r["path_display"] for r in index.query(**filters)]
+        assert found == _expected(items, records) and found
+        assert index.count(**filters) == len(found)
+        assert index.count(exts=[".txt"]) == 9
+        assert index.count(path_glob="/caso/doc1*") == 11
+        hit = next(index.query(sha256=f"{7:064X}"))
+        assert hit["path_display"] == "/Caso/Doc7.pdf" and hit["md5"] == f"{7:032x}"
+        assert len(list(index.query(limit=5))) == 5
+
+
+def test_rebuild_from_case_files(tmp_path: Path):
+    items, records = _case()
+    save_inventory_csv(items, tmp_path / "inventario.csv")
+    write_csv(records, tmp_path / "hashes.csv", headers=HASH_RECORD_FIELDS)
+    custody = ChainOfCustody(tmp_path / "cadena_custodia.jsonl")
+    custody.append(CustodyEntry.create(actor="perito", action="PREVIEW", count=25))
+    custody.append(CustodyEntry.create(actor="perito", action="ACQUIRE", count=25))
+
+    with CaseIndex(tmp_path / "live.db") as live:
+        for i in items:
+            live.add_item(i)
+        for r in records:
+            live.add_record(r)
+        expected = list(live.query())
+    with rebuild_index(tmp_path) as index:
+        assert list(index.query()) == expected
+        events = list(index.custody_events("acquire"))
+        assert [e["seq"] for e in events] == [2]
+        assert json.loads(events[0]["details"]) == {"count": 25}
+
+
+def test_closed_index_rejects_queries(tmp_path: Path):
+    index = CaseIndex(tmp_path / INDEX_FILE)
+    index.close()
+    index.close()
+    with pytest.raises(RuntimeError, match="cerrado"):
+        index.count()
@@ -0,0 +1,78 @@
+""" Verifica la exportación columnar (afrec.columnar).
+Comprueba la conversión de tipos (fechas UTC, digests en binario) sin pyarrow y, si
+está instalado, que export_case escribe Parquet y Arrow por row groups con el mismo
+contenido que los CSV del caso, y que se rechazan compresiones que el formato no admite. """
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from afrec.columnar import (
+    HASH_COLUMNS,
+    INVENTORY_COLUMNS,
+    check_compression,
+    convert_row,
+    to_binary,
+    to_timestamp,
+)
+from afrec.explorer import InventoryItem, InventoryWriter
+from afrec.integrity import HASH_RECORD_FIELDS
+from afrec.reports import write_csv
+
+SHA = "ab" * 32
+
+
+def test_conversions():
+    utc = timezone.utc
+    assert to_timestamp("2024-03-01T10:20:30") == datetime(2024, 3, 1, 10, 20, 30, tzinfo=utc)
+    assert to_timestamp("2024-03-01T12:20:30+02:00") == datetime(2024, 3, 1, 10, 20, 30, tzinfo=utc)
+    assert to_timestamp("") is None
+    assert to_binary(SHA) == bytes.fromhex(SHA) and to_binary("no-hex") == b"no-hex"
+    row = convert_row({"size": "12", "sha256": SHA, "dedup_of": ""}, HASH_COLUMNS)
+    assert row["size"] == 12 and row["sha256"] == bytes.fromhex(SHA) and row["dedup_of"] is None
+
+
+def _make_case(case: Path, n: int) -> None:
+    with InventoryWriter(case / "inventario.json", case / "inventario.csv") as writer:
+        for i in range(n):
+            writer.write(InventoryItem(
+                path_display=f"/f{i}", id=f"id:{i}", size=i, client_modified="2024-01-01T00:00:00",
+                server_modified="2024-01-02T00:00:00", rev=f"{i:09x}", content_hash=SHA,
+            ))
+    rows = [{"path_dropbox": f"/f{i}", "id": f"id:{i}", "size": i, "sha256": SHA} for i in range(n)]
+    write_csv(rows, case / "hashes.csv", headers=HASH_RECORD_FIELDS)
+
+
+def test_compression_must_fit_the_format():
+    check_compression("parquet", "snappy")
+    check_compression("arrow", "lz4")
+    check_compression("arrow", None)
+    with pytest.raises(ValueError, match="arrow no admite la compresión snappy"):
+        check_compression("arrow", "snappy")
+    with pytest.raises(ValueError, match="Formato no soportado"):
+        check_compression("orc", "zstd")
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_export_case_in_row_groups(tmp_path: Path, fmt: str):
+    pa = pytest.importorskip("pyarrow")
+    from afrec.columnar import export_case
+
+    _make_case(tmp_path, 25)
+    written = export_case(tmp_path, out_dir=tmp_path / "out", fmt=fmt, row_group_size=10)
+    assert {k: n for k, (_, n) in written.items()} == {"inventario": 25, "hashes": 25}
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        meta = pq.ParquetFile(written["hashes"][0]).metadata
+        assert meta.num_row_groups == 3
+        table = pq.read_table(written["inventario"][0])
+    else:
+        import pyarrow.ipc as ipc
+
+        table = ipc.open_file(written["inventario"][0]).read_all()
+    assert table.schema.names == [name for name, _ in INVENTORY_COLUMNS]
+    assert table.schema.field("server_modified").type == pa.timestamp("us", tz="UTC")
+    assert table.column("content_hash")[3].as_py() == bytes.fromhex(SHA)
+    assert table.column("size").to_pylist() == list(range(25))
@@ -0,0 +1,98 @@
+""" Verifica la cadena de custodia encadenada por hashes (afrec.custody).
+Comprueba que verify_chain acepta una cadena íntegra (también tras entradas antiguas sin
+enlace), que detecta ediciones, borrados y líneas añadidas, que el escritor continúa la
+cadena al reabrir el archivo, que no continúa una cadena con la última línea rota ni
+escribe tras cerrarse, y que las confirmaciones por grupo respetan la política de
+fsync. """
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from afrec.custody import (
+    FSYNC_BATCH,
+    FSYNC_CLOSE,
+    FSYNC_NEVER,
+    BrokenChainError,
+    ChainOfCustody,
+    CustodyEntry,
+    line_hash,
+    verify_chain,
+)
+
+
+def _write(file: Path, n: int, **kwargs) -> None:
+    with ChainOfCustody(file, **kwargs) as custody:
+        for i in range(n):
+            custody.append(CustodyEntry.create(actor="perito", action="VERIFY", n=i))
+
+
+def test_chain_links_and_resumes(tmp_path: Path):
+    file = tmp_path / "cadena_custodia.jsonl"
+    _write(file, 3)
+    _write(file, 2)
+    lines = file.read_bytes().splitlines()
+    entries = [json.loads(line) for line in lines]
+    assert [e["seq"] for e in entries] == [1, 2, 3, 4, 5]
+    assert entries[3]["prev_hash"] == line_hash(lines[2])
+    report = verify_chain(file)
+    assert report.ok and report.entries == 5 and report.last_hash == line_hash(lines[-1])
+
+
+def test_legacy_prefix_is_accepted(tmp_path: Path):
+    file = tmp_path / "cadena_custodia.jsonl"
+    legacy = {"ts": "2024-01-01T00:00:00+00:00", "actor": "p", "action": "PREVIEW", "details": {}}
+    file.write_text(json.dumps(legacy) + "\n", encoding="utf-8")
+    _write(file, 2)
+    report = verify_chain(file)
+    assert report.ok and report.legacy == 1 and report.last_seq == 3
+
+
+@pytest.mark.parametrize("tamper", ["edit", "delete", "insert"])
+def test_tampering_is_detected(tmp_path: Path, tamper: str):
+    file = tmp_path / "cadena_custodia.jsonl"
+    _write(file, 5)
+    lines = file.read_text(encoding="utf-8").splitlines()
+    if tamper == "edit":
+        lines[1] = lines[1].replace('"n": 1', '"n": 7')
+    elif tamper == "delete":
+        del lines[2]
+    else:
+        lines.insert(3, json.dumps({"ts": "x", "actor": "p", "action": "ACQUIRE", "details": {}}))
+    file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    report = verify_chain(file)
+    assert not report.ok and report.errors[0][0] in (3, 4)
+
+
+def test_torn_last_line_and_closed_writer(tmp_path: Path):
+    file = tmp_path / "cadena_custodia.jsonl"
+    _write(file, 2)
+    with open(file, "ab") as fh:
+        fh.write(b'{"seq": 3, "ts": "2025-')
+    with pytest.raises(BrokenChainError, match="línea incompleta"):
+        ChainOfCustody(file)
+
+    custody = ChainOfCustody(tmp_path / "otra.jsonl")
+    custody.close()
+    with pytest.raises(ValueError, match="cerrada"):
+        custody.append(CustodyEntry.create(actor="p", action="FILE"))
+
+
+def test_group_commit_and_fsync_policy(tmp_path: Path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(fd))
+    file = tmp_path / "cadena_custodia.jsonl"
+    with ChainOfCustody(file, batch_size=4, fsync=FSYNC_BATCH) as custody:
+        for i in range(10):
+            custody.append(CustodyEntry.create(actor="p", action="FILE", n=i))
+        # Dos grupos confirmados; las dos entradas restantes esperan al cierre
+        assert len(file.read_bytes().splitlines()) == 8 and len(calls) == 2
+    assert len(file.read_bytes().splitlines()) == 10 and len(calls) == 3
+    calls.clear()
+    _write(file, 10, batch_size=4, fsync=FSYNC_CLOSE)
+    assert len(calls) == 1
+    calls.clear()
+    _write(file, 10, batch_size=4, fsync=FSYNC_NEVER)
+    assert calls == [] and verify_chain(file).ok
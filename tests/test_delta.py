@@ -0,0 +1,133 @@
+""" Verifica la comparación de inventarios para la re-adquisición incremental.
+Comprueba que se detectan archivos nuevos, modificados (rev o content_hash),
+sin cambios y eliminados usando el id de Dropbox, y que al re-adquirir con un caso
+anterior los archivos sin cambios se trasladan (apuntando a la evidencia previa), los
+modificados se descargan de nuevo y los eliminados no aparecen. """
+
+import datetime
+import hashlib
+from pathlib import Path
+
+import pytest
+from dropbox import files as F
+
+from afrec.delta import (
+    CarryOver,
+    DeltaTracker,
+    apply_listing_changes,
+    carried_record,
+    diff_inventories,
+    load_hash_records,
+)
+from afrec.downloader import download_files
+from afrec.explorer import InventoryItem
+from afrec.integrity import HASH_RECORD_FIELDS
+from afrec.reports import write_csv
+
+
+def _item(id_: str, rev: str = "1", ch: str = "h", path: str = "") -> InventoryItem:
+    return InventoryItem(
+        path_display=path or f"/{id_}",
+        id=id_,
+        size=1,
+        client_modified="2025-01-01T00:00:00",
+        server_modified="2025-01-01T00:00:00",
+        rev=rev,
+        content_hash=ch,
+    )
+
+
+def _meta(path, id_, rev="0123456789", content_hash=None, size=1):
+    d = datetime.datetime(2025, 1, 1)
+    return F.FileMetadata(
+        name=path.rsplit("/", 1)[-1], id=id_, client_modified=d, server_modified=d,
+        rev=rev, size=size, path_display=path, path_lower=path.lower(), content_hash=content_hash,
+    )
+
+
+def test_diff_inventories():
+    prev = [_item("a"), _item("b"), _item("c"), _item("d")]
+    cur = [_item("a", path="/renombrado"), _item("b", rev="2"), _item("c", ch="x"), _item("e")]
+    diff = diff_inventories(prev, cur)
+    assert diff.unchanged == 1
+    assert [i.id for i in diff.modified] == ["b", "c"]
+    assert [i.id for i in diff.added] == ["e"]
+    assert [i.id for i in diff.deleted] == ["d"]
+    assert diff.counts() == {"added": 1, "modified": 2, "unchanged": 1, "deleted": 1}
+
+
+def test_apply_listing_changes():
+    prev = [_item("a", path="/x/a.pdf"), _item("b", path="/x/b.pdf"), _item("c", path="/y/c.pdf")]
+    changes = [
+        F.DeletedMetadata(name="y", path_lower="/y"),
+        _meta("/x/b.pdf", "b", rev="0123456789b"),
+        _meta("/x/nuevo.pdf", "n"),
+        _meta("/x/ignorado.txt", "t"),
+    ]
+    items, diff = apply_listing_changes(prev, changes, exts=[".pdf"])
+    assert [i.path_display for i in items] == ["/x/a.pdf", "/x/b.pdf", "/x/nuevo.pdf"]
+    assert [i.id for i in diff.added] == ["n"]
+    assert [i.id for i in diff.modified] == ["b"]
+    assert [i.id for i in diff.deleted] == ["c"]
+    assert diff.unchanged == 1
+
+
+def _blob_item(path: str, body: bytes, rev: str) -> InventoryItem:
+    ch = hashlib.sha256(hashlib.sha256(body).digest()).hexdigest()
+    return InventoryItem(path, f"id:{path}", len(body), "2025-01-01T00:00:00",
+                         "2025-01-01T00:00:00", rev, ch)
+
+
+def _previous_case(tmp_path: Path, fake_dropbox, blobs) -> Path:
+    case = tmp_path / "caso1"
+    items = [_blob_item(p, body, "0123456789").to_dict() for p, body in blobs.items()]
+    recs = download_files(fake_dropbox(blobs=blobs), items, case / "evidence")
+    write_csv(recs, case / "hashes.csv", headers=HASH_RECORD_FIELDS)
+    return case
+
+
+@pytest.mark.parametrize("listing", ["full", "changes"])
+def test_carry_over_redownloads_only_changes(tmp_path: Path, fake_dropbox, listing: str):
+    v1 = {"/a.pdf": b"uno", "/b.pdf": b"dos", "/c.pdf": b"tres"}
+    prev_case = _previous_case(tmp_path, fake_dropbox, v1)
+    previous = [_blob_item(p, body, "0123456789") for p, body in v1.items()]
+    # b.pdf cambia de contenido (nueva rev) y c.pdf se elimina
+    changed = _blob_item("/b.pdf", b"dos v2", "0123456789b")
+    if listing == "full":
+        tracker = DeltaTracker(previous)
+        current = [previous[0], changed]
+        for item in current:
+            tracker.classify(item)
+        diff = tracker.finish()
+    else:
+        changes = [
+            _meta("/b.pdf", changed.id, changed.rev, changed.content_hash, changed.size),
+            F.DeletedMetadata(name="c.pdf", path_lower="/c.pdf"),
+        ]
+        current, diff = apply_listing_changes(previous, changes)
+    assert [i.id for i in diff.modified] == ["id:/b.pdf"]
+    assert [i.id for i in diff.deleted] == ["id:/c.pdf"] and diff.unchanged == 1
+
+    dbx = fake_dropbox(blobs={"/a.pdf": b"uno", "/b.pdf": b"dos v2"})
+    carry = CarryOver(prev_case, load_hash_records(prev_case / "hashes.csv"))
+    new_ev = tmp_path / "caso2" / "evidence"
+    a, b = download_files(dbx, [i.to_dict() for i in current], new_ev, reuse=carry)
+    assert dbx.calls == ["/b.pdf"]
+    assert a["path_local"] == str(prev_case / "evidence" / "a.pdf")
+    assert a["carried_from"] == str(prev_case) and a["dropbox_hash_match"] == "yes"
+    assert b["path_local"] == str(new_ev / "b.pdf") and not b["carried_from"]
+    assert (new_ev / "b.pdf").read_bytes() == b"dos v2"
+    assert sorted(p.name for p in new_ev.iterdir()) == ["b.pdf"]
+
+
+def test_unverified_previous_record_is_not_carried(tmp_path: Path, fake_dropbox):
+    prev_case = _previous_case(tmp_path, fake_dropbox, {"/a.pdf": b"uno"})
+    (prev,) = load_hash_records(prev_case / "hashes.csv").values()
+    item = _blob_item("/a.pdf", b"uno", "0123456789").to_dict()
+    assert carried_record(item, prev, prev_case)["sha256"] == prev["sha256"]
+    unverified = dict(prev, dropbox_hash_match="no")
+    assert carried_record(item, unverified, prev_case) is None
+    # Misma rev pero otro content_hash: no se reutiliza
+    carry = CarryOver(prev_case, {prev["id"]: prev})
+    assert carry(dict(item, content_hash="otro")) is None
+    assert carry(dict(item, rev="otra")) is None
@@ -0,0 +1,213 @@
+""" Verifica que download_files conserva el orden del inventario.
+Usa un cliente falso que entrega el contenido con latencias distintas,
+de modo que las descargas concurrentes terminan desordenadas.
+Asegura que hashes.csv es determinista con cualquier número de workers
+y que una transferencia truncada o cortada no deja evidencia parcial, mientras que
+una más larga que el listado queda registrada como discrepancia sin reintentos. """
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from afrec.downloader import (
+    IncompleteDownloadError,
+    SegmentPolicy,
+    download_files,
+    iter_download_files,
+)
+from afrec.integrity import MultiHasher, build_hash_record
+from afrec.scheduler import AdaptiveScheduler
+
+
+def _items():
+    return [
+        {"path_display": f"/d/f{n}.txt", "size": len(f"/d/f{n}.txt"), "content_hash": None}
+        for n in range(20)
+    ]
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_download_order_is_deterministic(tmp_path: Path, stream: bool, fake_dropbox):
+    items = _items()
+    dbx = fake_dropbox(latency=0.01)
+    recs = download_files(dbx, items, tmp_path / "ev", workers=4, stream=stream)
+    assert [r["path_dropbox"] for r in recs] == [i["path_display"] for i in items]
+    assert (tmp_path / "ev" / "d" / "f7.txt").read_bytes() == b"/d/f7.txt"
+    local = tmp_path / "ev" / "d" / "f7.txt"
+    assert recs[7] == build_hash_record(local, items[7])
+
+
+def test_truncated_stream_is_rejected(tmp_path: Path, fake_dropbox):
+    scheduler = AdaptiveScheduler(sleep=lambda s: None)
+    with pytest.raises(IncompleteDownloadError):
+        download_files(fake_dropbox(truncate=2), _items()[:1], tmp_path / "ev", scheduler=scheduler)
+    assert scheduler.stats()["retries"] == scheduler.retries - 1
+    assert list((tmp_path / "ev" / "d").iterdir()) == []
+
+
+def test_broken_stream_removes_part_file(tmp_path: Path, fake_dropbox):
+    class BrokenResponse:
+        def iter_content(self, chunk_size=1):
+            yield b"mitad"
+            raise RuntimeError("conexión cortada")
+
+        def close(self):
+            pass
+
+    class BrokenDropbox(fake_dropbox):
+        def files_download(self, path, rev=None, extra_headers=None):
+            return None, BrokenResponse()
+
+    scheduler = AdaptiveScheduler(sleep=lambda s: None)
+    with pytest.raises(RuntimeError):
+        download_files(BrokenDropbox(), _items()[:1], tmp_path / "ev", scheduler=scheduler)
+    assert list((tmp_path / "ev" / "d").iterdir()) == []
+
+
+def test_oversized_stream_is_recorded_as_mismatch(tmp_path: Path, fake_dropbox):
+    listed = MultiHasher()
+    listed.update(b"hola!")
+    item = {
+        "path_display": "/x.txt", "size": 5, "rev": "r7",
+        "content_hash": listed.hexdigests()["dropbox_content_hash"],
+    }
+
+    class RevDropbox(fake_dropbox):
+        revs = []
+
+        def files_download(self, path, rev=None, extra_headers=None):
+            self.revs.append(rev)
+            return super().files_download(path, rev=rev, extra_headers=extra_headers)
+
+    dbx = RevDropbox(blobs={"/x.txt": b"hola! y mas."})
+    scheduler = AdaptiveScheduler(sleep=lambda s: None)
+    rec = download_files(dbx, [item], tmp_path / "ev", scheduler=scheduler)[0]
+    assert dbx.revs == ["r7"] and scheduler.stats()["retries"] == 0
+    assert rec["dropbox_hash_match"] == "no"
+    assert (tmp_path / "ev" / "x.txt").read_bytes() == b"hola! y mas."
+
+
+def test_segmented_download_matches_single_stream(tmp_path: Path, fake_dropbox):
+    blob = os.urandom(4 * 1024 * 1024 * 5 + 99)
+    item = {"path_display": "/big.bin", "size": len(blob), "rev": "r1", "content_hash": None}
+    dbx = fake_dropbox(blobs={"/big.bin": blob})
+    policy = SegmentPolicy(threshold=1, segment_size=2 * 4 * 1024 * 1024, workers=3)
+    seg = download_files(dbx, [item], tmp_path / "a", segments=policy)[0]
+    single = download_files(dbx, [item], tmp_path / "b")[0]
+    assert (tmp_path / "a" / "big.bin").read_bytes() == blob
+    for k in ("sha256", "md5", "dropbox_content_hash_local"):
+        assert seg[k] == single[k]
+
+
+def test_segments_overlap_with_one_worker(tmp_path: Path, fake_dropbox):
+    lock = threading.Lock()
+    active = [0, 0]
+
+    class SlowRanges(fake_dropbox):
+        def files_download(self, path, rev=None, extra_headers=None):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return super().files_download(path, rev=rev, extra_headers=extra_headers)
+
+    blob = os.urandom(4 * 1024 * 1024 * 4)
+    item = {"path_display": "/big.bin", "size": len(blob), "rev": "r1", "content_hash": None}
+    policy = SegmentPolicy(threshold=1, segment_size=4 * 1024 * 1024, workers=4)
+    download_files(SlowRanges(blobs={"/big.bin": blob}), [item], tmp_path / "ev", segments=policy)
+    # Con --workers 1 los cuatro segmentos se piden a la vez
+    assert active[1] == 4
+
+
+def test_failed_segment_removes_part_file(tmp_path: Path, fake_dropbox):
+    blob = os.urandom(4 * 1024 * 1024 * 3)
+
+    class FailingDropbox(fake_dropbox):
+        def files_download(self, path, rev=None, extra_headers=None):
+            if extra_headers and extra_headers["Range"].startswith("bytes=4194304-"):
+                raise ValueError("segmento roto")
+            return super().files_download(path, rev=rev, extra_headers=extra_headers)
+
+    item = {"path_display": "/big.bin", "size": len(blob), "rev": "r1", "content_hash": None}
+    policy = SegmentPolicy(threshold=1, segment_size=4 * 1024 * 1024, workers=2)
+    scheduler = AdaptiveScheduler(sleep=lambda s: None)
+    dbx = FailingDropbox(blobs={"/big.bin": blob})
+    with pytest.raises(ValueError):
+        download_files(dbx, [item], tmp_path / "ev", segments=policy, scheduler=scheduler)
+    assert list((tmp_path / "ev").iterdir()) == []
+
+
+@pytest.mark.parametrize("mode", ["hardlink", "reference"])
+def test_dedup_downloads_each_content_once(tmp_path: Path, mode: str, fake_dropbox):
+    content_hash = hashlib.sha256(hashlib.sha256(b"same").digest()).hexdigest()
+    paths = ("/a", "/x/b", "/c")
+    items = [{"path_display": p, "size": 4, "content_hash": content_hash} for p in paths]
+    dbx = fake_dropbox(blobs={p: b"same" for p in paths})
+    recs = download_files(dbx, items, tmp_path / "ev", workers=2, dedup=mode)
+    assert dbx.calls == ["/a"]
+    assert [r["dedup_of"] for r in recs] == [None, "/a", "/a"]
+    assert len({r["sha256"] for r in recs}) == 1
+    assert (tmp_path / "ev" / "x" / "b").exists() == (mode == "hardlink")
+
+
+def test_duplicates_do_not_hold_workers(tmp_path: Path, fake_dropbox):
+    started = threading.Event()
+
+    class SlowPrimary(fake_dropbox):
+        overlapped = False
+
+        def files_download(self, path, rev=None, extra_headers=None):
+            if path == "/a":
+                # Con dos workers, /c solo empieza si la ruta duplicada no ocupa el otro
+                SlowPrimary.overlapped = started.wait(5)
+            elif path == "/c":
+                started.set()
+            return super().files_download(path, rev=rev, extra_headers=extra_headers)
+
+    same = hashlib.sha256(hashlib.sha256(b"same").digest()).hexdigest()
+    items = [{"path_display": p, "size": 4, "content_hash": same} for p in ("/a", "/b")]
+    items.append({"path_display": "/c", "size": 4, "content_hash": None})
+    dbx = SlowPrimary(blobs={"/a": b"same", "/b": b"same", "/c": b"otro"})
+    recs = download_files(dbx, items, tmp_path / "ev", workers=2, dedup="hardlink")
+    assert SlowPrimary.overlapped and [r["dedup_of"] for r in recs] == [None, "/a", None]
+
+    # Si la primaria no coincide con el hash remoto, cada ruta se descarga por separado
+    items = [{"path_display": p, "size": 4, "content_hash": "0" * 64} for p in ("/x", "/y")]
+    dbx = fake_dropbox(blobs={"/x": b"same", "/y": b"same"})
+    recs = download_files(dbx, items, tmp_path / "ev2", workers=2, dedup="hardlink")
+    assert sorted(dbx.calls) == ["/x", "/y"] and [r["dedup_of"] for r in recs] == [None, None]
+
+
+def test_iter_download_files_is_lazy(tmp_path: Path, fake_dropbox):
+    pulled = []
+
+    def gen():
+        for i in _items():
+            pulled.append(i["path_display"])
+            yield i
+
+    records = iter_download_files(fake_dropbox(), gen(), tmp_path / "ev", workers=2)
+    first = next(records)
+    assert first["path_dropbox"] == "/d/f0.txt"
+    assert len(pulled) <= 5
+    assert len(list(records)) == 19
+
+
+def test_reused_items_leave_no_empty_folders(tmp_path: Path, fake_dropbox):
+    carried = {"path_display": "/otra/carpeta/f.txt", "size": 1, "content_hash": None}
+    items = _items()[:2] + [carried]
+
+    def reuse(item):
+        if item["path_display"].startswith("/otra/"):
+            return {"path_dropbox": item["path_display"], "carried_from": "caso_anterior"}
+        return None
+
+    recs = download_files(fake_dropbox(), items, tmp_path / "ev", reuse=reuse)
+    assert recs[2]["carried_from"] == "caso_anterior"
+    assert sorted(p.name for p in (tmp_path / "ev").iterdir()) == ["d"]
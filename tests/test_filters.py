@@ -3,11 +3,70 @@ Comprueba que:
 .docx y .pdf coincidan,
 .txt no coincida,
 comparación insensible a mayúsculas/minúsculas. 
-Asegura que el inventario filtra bien los tipos de archivo."""
+Asegura que el inventario filtra bien los tipos de archivo.
+También cubre el filtro precompilado (FilterSpec/EntryFilter): rutas, tamaños y fechas
+con y sin zona horaria."""
+
+import datetime
+from pathlib import Path
+
+import pytest
+from dropbox import files as F
 
 from afrec.explorer import _ext_matches
+from afrec.filters import FilterSpec, parse_size
+
+D = datetime.datetime(2025, 3, 1, 12, 0)
+
+
+def _file(p, size=100, server=D, client=D):
+    return F.FileMetadata(
+        name=p.rsplit("/", 1)[-1], id="id:" + p, client_modified=client, server_modified=server,
+        rev="0123456789", size=size, path_display=p, path_lower=p.lower(),
+    )
+
 
 def test_ext_matches():
     assert _ext_matches("/a/b/c.docx", [".docx", ".pdf"])
     assert not _ext_matches("/a/b/c.txt", [".docx", ".pdf"])
     assert _ext_matches("/a/b/c.TXT", ["txt"])
+
+
+def test_compiled_ext_matches_path_suffix():
+    flt = FilterSpec.create([".pdf", "GZ", ".bashrc"]).compile()
+    for p in ["/a/x.PDF", "/a.pdf/b", "/a/.bashrc", "/a/b.tar.gz", "/a/b.", "/a/pdf"]:
+        assert flt.matches(_file(p)) == (Path(p.lower()).suffix in {".pdf", ".gz", ".bashrc"})
+
+
+def test_paths_and_sizes():
+    spec = FilterSpec.create(
+        include=["*/Facturas/*"],
+        exclude=["*/borrador*"],
+        exclude_regex=[r"\.tmp$"],
+        min_size=parse_size("1K"),
+        max_size=parse_size("1.5MB"),
+    )
+    flt = spec.compile()
+    assert flt.matches(_file("/Caso/facturas/enero.pdf", size=2048))
+    assert not flt.matches(_file("/Caso/Facturas/borrador.pdf", size=2048))
+    assert not flt.matches(_file("/Caso/Facturas/x.tmp", size=2048))
+    assert not flt.matches(_file("/Caso/Otros/enero.pdf", size=2048))
+    assert not flt.matches(_file("/Caso/Facturas/enero.pdf", size=10))
+    assert not flt.matches(_file("/Caso/Facturas/enero.pdf", size=2 * 1024**2))
+    assert FilterSpec.from_dict(spec.to_dict()) == spec
+    with pytest.raises(ValueError):
+        FilterSpec.create(include_regex=["(sin cerrar"]).compile()
+    with pytest.raises(ValueError):
+        parse_size("mucho")
+
+
+def test_dates_naive_and_aware():
+    # 14:00+02:00 es 12:00 UTC: el límite con zona se compara con la fecha UTC de Dropbox
+    flt = FilterSpec.create(date_from="2025-03-01T14:00:00+02:00").compile()
+    assert flt.matches(_file("/a.pdf"))
+    assert not FilterSpec.create(date_from="2025-03-01T12:00:01").compile().matches(_file("/a"))
+
+    flt = FilterSpec.create(client_date_to="2025-02-01").compile()
+    old = datetime.datetime(2024, 12, 31, tzinfo=datetime.timezone.utc)
+    assert flt.matches(_file("/a.pdf", client=old))
+    assert not flt.matches(_file("/a.pdf"))
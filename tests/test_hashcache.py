@@ -0,0 +1,57 @@
+""" Verifica la caché de hashes (cache_hashes.db) usada por afrec verify.
+Comprueba que una segunda verificación no lee los archivos intactos, que un cambio de
+contenido con el mismo tamaño se detecta por el mtime, que pedir más digests invalida
+la entrada y que sin caché siempre se lee todo. """
+
+import os
+from pathlib import Path
+
+from afrec.hashcache import HashCache
+from afrec.integrity import HASH_RECORD_FIELDS, build_hash_record
+from afrec.reports import write_csv
+from afrec.verify import verify_case
+
+
+def _make_case(case: Path) -> Path:
+    records = []
+    for name, data in {"a.txt": b"a" * 5000, "b.bin": bytes(range(256)) * 40}.items():
+        local = case / "evidence" / name
+        local.parent.mkdir(parents=True, exist_ok=True)
+        local.write_bytes(data)
+        records.append(build_hash_record(local, {"path_display": f"/{name}", "size": len(data)}))
+    write_csv(records, case / "hashes.csv", headers=HASH_RECORD_FIELDS)
+    return case
+
+
+def test_repeat_run_skips_untouched_files(tmp_path: Path):
+    case = _make_case(tmp_path)
+    with HashCache(tmp_path / "cache.db") as cache:
+        first = verify_case(case, cache=cache)
+    with HashCache(tmp_path / "cache.db") as cache:
+        second = verify_case(case, cache=cache)
+    assert first.intact and first.cache_hits == 0 and first.bytes_hashed == 5000 + 256 * 40
+    assert second.intact and second.cache_hits == 2 and second.bytes_hashed == 0
+    assert verify_case(case).cache_hits == 0
+
+
+def test_changed_file_is_rehashed(tmp_path: Path):
+    case = _make_case(tmp_path)
+    with HashCache(tmp_path / "cache.db") as cache:
+        verify_case(case, cache=cache)
+        target = case / "evidence" / "a.txt"
+        st = target.stat()
+        target.write_bytes(b"b" * 5000)
+        os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        report = verify_case(case, cache=cache)
+    assert report.cache_hits == 1
+    assert [m["field"] for m in report.modified] == ["sha256"]
+
+
+def test_missing_digest_forces_read(tmp_path: Path):
+    case = _make_case(tmp_path)
+    with HashCache(tmp_path / "cache.db") as cache:
+        verify_case(case, cache=cache)
+        full = verify_case(case, full=True, cache=cache)
+        again = verify_case(case, full=True, cache=cache)
+    assert full.cache_hits == 0 and full.intact
+    assert again.cache_hits == 2
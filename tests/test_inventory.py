@@ -0,0 +1,34 @@
+""" Verifica que InventoryWriter (escritura en streaming) produce exactamente
+los mismos inventario.json e inventario.csv que las funciones sobre la lista completa,
+y que iter_inventory_csv devuelve los mismos elementos. """
+
+from pathlib import Path
+
+import pytest
+
+from afrec.explorer import (
+    InventoryItem,
+    InventoryWriter,
+    iter_inventory_csv,
+    save_inventory_csv,
+    save_inventory_json,
+)
+
+ITEMS = [
+    InventoryItem(
+        "/año/informe.pdf", "id:1", 10, "2025-01-01T00:00:00", "2025-01-02T00:00:00", "r1", "h"
+    ),
+    InventoryItem("/b.txt", "id:2", 0, "2025-01-01T00:00:00", "2025-01-02T00:00:00", "r2", None),
+]
+
+
+@pytest.mark.parametrize("items", [ITEMS, ITEMS[:1], []])
+def test_streaming_writer_is_byte_compatible(tmp_path: Path, items):
+    save_inventory_json(items, tmp_path / "a.json")
+    save_inventory_csv(items, tmp_path / "a.csv")
+    with InventoryWriter(tmp_path / "b.json", tmp_path / "b.csv") as w:
+        for i in items:
+            w.write(i)
+    assert (tmp_path / "a.json").read_bytes() == (tmp_path / "b.json").read_bytes()
+    assert (tmp_path / "a.csv").read_bytes() == (tmp_path / "b.csv").read_bytes()
+    assert list(iter_inventory_csv(tmp_path / "b.csv")) == items
@@ -0,0 +1,49 @@
+""" Verifica la reanudación de adquisiciones con el journal.
+Simula una primera corrida, borra un archivo de evidencia y reanuda:
+solo se vuelve a descargar el archivo faltante y hashes.csv queda completo.
+Un registro sin content_hash remoto se da por verificado si la descarga llegó completa. """
+
+import hashlib
+from pathlib import Path
+
+from afrec.downloader import download_files
+from afrec.journal import VERIFIED, AcquisitionJournal
+
+
+def test_resume_skips_verified(tmp_path: Path, fake_dropbox):
+    items = [
+        {
+            "path_display": f"/f{n}",
+            "id": f"id:{n}",
+            "rev": "1",
+            "size": len(f"/f{n}"),
+            "content_hash": hashlib.sha256(hashlib.sha256(f"/f{n}".encode()).digest()).hexdigest(),
+        }
+        for n in range(3)
+    ]
+    ev = tmp_path / "evidence"
+    with AcquisitionJournal(tmp_path / "journal.jsonl") as j:
+        first = download_files(fake_dropbox(), items, ev, journal=j)
+    (ev / "f1").unlink()
+
+    dbx = fake_dropbox()
+    with AcquisitionJournal(tmp_path / "journal.jsonl") as j:
+        assert j.state(items[0]) == VERIFIED
+        second = download_files(dbx, items, ev, journal=j)
+    assert dbx.calls == ["/f1"]
+    assert second == first
+    assert all(r["dropbox_hash_match"] == "yes" for r in second)
+
+
+def test_record_without_remote_hash_is_verified(tmp_path: Path, fake_dropbox):
+    items = [{"path_display": "/sin_hash", "id": "id:x", "rev": "1", "size": 9,
+              "content_hash": None}]
+    ev = tmp_path / "evidence"
+    with AcquisitionJournal(tmp_path / "journal.jsonl") as j:
+        (rec,) = download_files(fake_dropbox(), items, ev, journal=j)
+        assert not rec["dropbox_content_hash_remote"] and j.state(items[0]) == VERIFIED
+
+    dbx = fake_dropbox()
+    with AcquisitionJournal(tmp_path / "journal.jsonl") as j:
+        assert download_files(dbx, items, ev, journal=j) == [rec]
+    assert dbx.calls == []
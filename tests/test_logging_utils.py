@@ -0,0 +1,74 @@
+""" Verifica el logging JSON por cola (afrec.logging_utils).
+Comprueba que el formato toma la hora de record.created e incluye solo los campos extra,
+que un handler lento no bloquea a quien registra, que la consola respeta el límite de
+eventos por segundo sin perder avisos y que reconfigurar cambia el archivo de log. """
+
+import io
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+from afrec.logging_utils import (
+    JsonFormatter,
+    RateLimitedStreamHandler,
+    setup_logging,
+    shutdown_logging,
+)
+
+
+def _record(msg: str, level: int = logging.INFO, **extra) -> logging.LogRecord:
+    return logging.makeLogRecord({"name": "afrec", "levelno": level,
+                                  "levelname": logging.getLevelName(level), "msg": msg, **extra})
+
+
+def test_formatter_uses_record_time_and_extras():
+    record = _record("end_preview", count=3, session_id="s")
+    record.created = 0.5
+    data = json.loads(JsonFormatter().format(record))
+    assert data["ts"] == "1970-01-01T00:00:00.500000+00:00"
+    assert {k: data[k] for k in ("msg", "count", "session_id")} == {
+        "msg": "end_preview", "count": 3, "session_id": "s"
+    }
+    assert not {"args", "created", "thread", "levelno"} & set(data)
+
+
+def test_console_is_rate_limited(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    out = io.StringIO()
+    handler = RateLimitedStreamHandler(out, rate=1, burst=2)
+    handler.setFormatter(JsonFormatter())
+    for i in range(5):
+        handler.handle(_record(f"file_{i}"))
+    handler.handle(_record("fallo", logging.ERROR))
+    clock[0] += 1
+    handler.handle(_record("file_5"))
+    msgs = [json.loads(line)["msg"] for line in out.getvalue().splitlines()]
+    assert msgs == ["file_0", "file_1", "console_suppressed", "fallo", "file_5"]
+    assert handler.suppressed == 3
+
+
+def test_queue_does_not_block_and_reconfigures(tmp_path: Path, monkeypatch):
+    release = threading.Event()
+    emit = RateLimitedStreamHandler.emit
+
+    def slow_console(self, record):
+        release.wait(5)
+        emit(self, record)
+
+    monkeypatch.setattr(RateLimitedStreamHandler, "emit", slow_console)
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    logger = setup_logging(first)
+    started = time.perf_counter()
+    for i in range(1000):
+        logger.info("file_done", extra={"n": i})
+    # La consola está detenida, pero quien registra solo encola
+    assert time.perf_counter() - started < 1
+    release.set()
+    setup_logging(second).info("otro_caso")
+    shutdown_logging()
+    lines = first.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1000 and json.loads(lines[-1])["n"] == 999
+    assert json.loads(second.read_text(encoding="utf-8"))["msg"] == "otro_caso"
@@ -0,0 +1,75 @@
+""" Verifica el manifiesto Merkle (afrec.merkle).
+Comprueba que toda hoja tiene una prueba de inclusión válida para cualquier tamaño de
+árbol, que el manifiesto se guarda y recarga, que la comparación por subárboles
+encuentra exactamente los archivos modificados y que verify detecta un hashes.csv
+alterado después de la adquisición. """
+
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from afrec.integrity import HASH_RECORD_FIELDS
+from afrec.merkle import (
+    MerkleTree,
+    compare_cases,
+    leaf_hash,
+    recorded_root,
+    verify_proof,
+    write_case_manifest,
+)
+from afrec.reports import write_csv
+from afrec.verify import verify_case
+
+
+def _sha(i: int) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _write_hashes(case: Path, files: dict) -> None:
+    rows = [{"path_dropbox": p, "sha256": h, "path_local": None} for p, h in files.items()]
+    write_csv(rows, case / "hashes.csv", headers=HASH_RECORD_FIELDS)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 8, 13])
+def test_every_leaf_has_a_valid_proof(n: int):
+    leaves = [leaf_hash(f"/f{i}", _sha(i)) for i in range(n)]
+    tree = MerkleTree.build(leaves)
+    for i, leaf in enumerate(leaves):
+        assert verify_proof(leaf, tree.proof(i), tree.root)
+    assert not verify_proof(leaf_hash("/f0", _sha(99)), tree.proof(0), tree.root)
+
+
+def test_manifest_roundtrip_and_order_independent_of_csv(tmp_path: Path):
+    files = {f"/Docs/{i:03}.txt": _sha(i) for i in range(10)}
+    a, b = tmp_path / "a", tmp_path / "b"
+    _write_hashes(a, files)
+    _write_hashes(b, dict(reversed(list(files.items()))))
+    manifest = write_case_manifest(a)
+    assert manifest["leaves"] == 10 and recorded_root(a) == manifest["root"]
+    assert MerkleTree.load(a).root == manifest["root"]
+    assert compare_cases(a, b)["identical"]
+
+
+def test_compare_finds_changed_added_and_removed(tmp_path: Path):
+    files = {f"/d/{i:04}": _sha(i) for i in range(100)}
+    a, b, c = tmp_path / "a", tmp_path / "b", tmp_path / "c"
+    _write_hashes(a, files)
+    _write_hashes(b, {**files, "/d/0007": _sha(-7), "/d/0050": _sha(-50)})
+    result = compare_cases(a, b)
+    assert not result["identical"] and result["changed"] == ["/d/0007", "/d/0050"]
+
+    moved = {p: h for p, h in files.items() if p != "/d/0003"}
+    _write_hashes(c, {**moved, "/d/nuevo": _sha(1000)})
+    result = compare_cases(a, c)
+    assert result["removed"] == ["/d/0003"] and result["added"] == ["/d/nuevo"]
+
+
+def test_verify_detects_altered_hashes_csv(tmp_path: Path):
+    files = {"/x": _sha(1), "/y": _sha(2)}
+    _write_hashes(tmp_path, files)
+    write_case_manifest(tmp_path)
+    assert verify_case(tmp_path).merkle_root_ok is True
+    _write_hashes(tmp_path, {**files, "/y": _sha(3)})
+    report = verify_case(tmp_path)
+    assert report.merkle_root_ok is False and not report.intact
@@ -0,0 +1,61 @@
+""" Verifica la telemetría de la adquisición (afrec.metrics).
+Comprueba los histogramas acumulados y el formato de texto de Prometheus, y que una
+descarga instrumentada registra tiempos por archivo y por petición, la profundidad de
+la ventana y los archivos reutilizados sin contarlos como descargas. """
+
+import json
+from pathlib import Path
+
+from afrec.downloader import download_files
+from afrec.metrics import METRICS_FILE, AcquisitionMetrics, Histogram
+
+
+def _items():
+    return [
+        {"path_display": f"/d/f{n}.txt", "size": len(f"/d/f{n}.txt"), "content_hash": None}
+        for n in range(20)
+    ]
+
+
+def test_histogram_and_prometheus_text(tmp_path: Path):
+    hist = Histogram((1, 5))
+    for value in (0.5, 1, 3, 9):
+        hist.observe(value)
+    assert hist.cumulative() == [("1", 2), ("5", 3), ("+Inf", 4)]
+    assert hist.to_dict()["mean"] == 3.375
+
+    metrics = AcquisitionMetrics("s")
+    with metrics.phase("download"):
+        metrics.observe("download_request_seconds", 0.3)
+    out = tmp_path / "prom" / "afrec.prom"
+    metrics.write_prometheus(out, {"case": 'caso "1"'})
+    text = out.read_text(encoding="utf-8")
+    case = 'case="caso \\"1\\""'
+    assert "# TYPE afrec_request_seconds histogram" in text
+    assert f'afrec_request_seconds_bucket{{{case},scheduler="download",le="0.5"}} 1' in text
+    assert f'afrec_request_seconds_count{{{case},scheduler="listing"}} 0' in text
+    assert list(out.parent.iterdir()) == [out]
+
+
+def test_instrumented_download(tmp_path: Path, fake_dropbox):
+    items = _items()
+    metrics = AcquisitionMetrics("s")
+
+    def reuse_first(item):
+        if item["path_display"] == "/d/f0.txt":
+            return {"path_dropbox": item["path_display"], "size": 3}
+        return None
+
+    with metrics.phase("download"):
+        download_files(
+            fake_dropbox(), items, tmp_path / "ev", workers=4, metrics=metrics, reuse=reuse_first
+        )
+    data = json.loads(metrics.write(tmp_path).read_text(encoding="utf-8"))
+    assert (tmp_path / METRICS_FILE).exists()
+    assert data["files"]["count"] == 20 and data["files"]["downloaded"] == 19
+    assert data["timings"]["file_seconds"]["count"] == 19
+    assert data["timings"]["hash_seconds"]["count"] == 19
+    assert data["timings"]["download_request_seconds"]["count"] == 19
+    assert data["timings"]["download_window"]["max"] <= 8
+    assert len(data["slowest_files"]) == 19 and data["schedulers"]["download"]["requests"] == 19
+    assert data["phases"]["download"]["seconds"] > 0
@@ -0,0 +1,78 @@
+""" Verifica que hash_file_multi produce los mismos valores que las funciones de una sola pasada.
+Usa un archivo de más de 4 MiB (varios bloques de Dropbox) y buffers de tamaño no alineado.
+Asegura que la lectura única no altera SHA-256, MD5 ni el content hash, y que el content
+hash por bloques en paralelo es idéntico al del helper oficial, también cuando se calcula
+a la vez que SHA-256 y MD5 (hash_file_digests). """
+
+import os
+from pathlib import Path
+
+import pytest
+
+from afrec import integrity
+from afrec.integrity import (
+    DROPBOX_BLOCK_SIZE,
+    dropbox_content_hash,
+    hash_file,
+    hash_file_digests,
+    hash_file_multi,
+    parallel_content_hash,
+)
+
+
+def test_multi_hash_matches_single_pass(tmp_path: Path):
+    p = tmp_path / "big.bin"
+    p.write_bytes(os.urandom(9 * 1024 * 1024 + 123))
+    for chunk in (1024 * 1024, 3 * 1024 * 1024 + 7):
+        d = hash_file_multi(p, chunk_size=chunk).hexdigests()
+        assert d["sha256"] == hash_file(p, "sha256")
+        assert d["md5"] == hash_file(p, "md5")
+        assert d["dropbox_content_hash"] == dropbox_content_hash(p)
+
+
+def test_multi_hash_empty_file(tmp_path: Path):
+    p = tmp_path / "empty.bin"
+    p.write_bytes(b"")
+    assert hash_file_multi(p).content_hash() == dropbox_content_hash(p)
+
+
+@pytest.mark.parametrize("extra", [0, 1, DROPBOX_BLOCK_SIZE - 1])
+def test_parallel_content_hash_is_identical(tmp_path: Path, extra: int):
+    p = tmp_path / "blocks.bin"
+    p.write_bytes(os.urandom(5 * DROPBOX_BLOCK_SIZE + extra))
+    expected = dropbox_content_hash(p)
+    assert parallel_content_hash(p, workers=3, min_size=0) == expected
+    assert dropbox_content_hash(p, workers=2) == expected
+
+
+def test_parallel_content_hash_mmap_fallback(tmp_path: Path, monkeypatch):
+    p = tmp_path / "blocks.bin"
+    p.write_bytes(os.urandom(3 * DROPBOX_BLOCK_SIZE + 5))
+    expected = dropbox_content_hash(p)
+    # Windows no tiene os.pread: se lee de un mmap
+    monkeypatch.delattr(os, "pread")
+    assert parallel_content_hash(p, workers=4, min_size=0) == expected
+    small = tmp_path / "small.bin"
+    small.write_bytes(b"abc")
+    assert parallel_content_hash(small, workers=4) == dropbox_content_hash(small)
+
+
+def test_digests_with_parallel_content_hash(tmp_path: Path, monkeypatch):
+    p = tmp_path / "big.bin"
+    p.write_bytes(os.urandom(3 * DROPBOX_BLOCK_SIZE + 11))
+    expected = hash_file_multi(p).hexdigests()
+    calls = []
+    parallel = integrity.parallel_content_hash
+
+    def spy(*args):
+        calls.append(args)
+        return parallel(*args)
+
+    monkeypatch.setattr(integrity, "PARALLEL_MIN_SIZE", 0)
+    monkeypatch.setattr(integrity, "parallel_content_hash", spy)
+    assert hash_file_digests(p, block_workers=3) == (p.stat().st_size, expected)
+    assert len(calls) == 1
+    assert hash_file_digests(p, md5=False, block_workers=1)[1] == {
+        k: v for k, v in expected.items() if k != "md5"
+    }
+    assert len(calls) == 1
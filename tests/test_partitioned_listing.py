@@ -0,0 +1,54 @@
+""" Verifica el listado particionado (--partitions).
+Usa un cliente falso con varias subcarpetas de primer nivel y comprueba que el
+listado en paralelo devuelve los mismos archivos que el recursivo, en orden estable. """
+
+import datetime
+import types
+
+from dropbox import files as F
+
+from afrec.explorer import list_inventory
+
+D = datetime.datetime(2025, 1, 1)
+TREE = ["/raiz.txt", "/a/1.pdf", "/a/x/2.pdf", "/b/3.pdf", "/c/4.txt", "/c/5.pdf"]
+
+
+def _file(p):
+    return F.FileMetadata(
+        name=p.rsplit("/", 1)[-1], id="id:" + p, client_modified=D, server_modified=D,
+        rev="0123456789", size=1, path_display=p, path_lower=p,
+    )
+
+
+def _folder(p):
+    return F.FolderMetadata(name=p.rsplit("/", 1)[-1], id="id:" + p, path_display=p, path_lower=p)
+
+
+class TreeDropbox:
+    def files_list_folder(self, path, recursive, include_non_downloadable_files, limit):
+        base = "" if path in ("", "/") else path
+        inside = [p for p in TREE if p.startswith(base + "/")]
+        if recursive:
+            entries = [_file(p) for p in inside]
+        else:
+            direct = [p for p in inside if "/" not in p[len(base) + 1:]]
+            tops = {base + "/" + p[len(base) + 1:].split("/")[0] for p in inside}
+            subdirs = sorted(tops - set(direct))
+            entries = [_folder(d) for d in subdirs] + [_file(p) for p in direct]
+        # Una entrada por página para ejercitar la cadena de cursores
+        return self._page(entries, 0)
+
+    def _page(self, entries, n):
+        return types.SimpleNamespace(
+            entries=entries[n:n + 1], has_more=n + 1 < len(entries), cursor=(entries, n + 1)
+        )
+
+    def files_list_folder_continue(self, cursor):
+        return self._page(*cursor)
+
+
+def test_partitioned_listing_matches_recursive():
+    full = list_inventory(TreeDropbox(), exts=[".pdf"])
+    parted = list_inventory(TreeDropbox(), exts=[".pdf"], partitions=3)
+    assert sorted(i.path_display for i in parted) == sorted(i.path_display for i in full)
+    assert [i.path_display for i in parted] == ["/a/1.pdf", "/a/x/2.pdf", "/b/3.pdf", "/c/5.pdf"]
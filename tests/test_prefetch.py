@@ -0,0 +1,36 @@
+""" Verifica prefetch (cola acotada entre el listado y las descargas).
+Comprueba que conserva el orden, que relanza los errores del productor
+y que el productor se detiene si el consumidor abandona la iteración. """
+
+import pytest
+
+from afrec.utils import prefetch
+
+
+def test_prefetch_keeps_order():
+    assert list(prefetch(range(5000), maxsize=7)) == list(range(5000))
+
+
+def test_prefetch_propagates_errors():
+    def listing():
+        yield 1
+        raise RuntimeError("corte de red")
+
+    it = prefetch(listing())
+    assert next(it) == 1
+    with pytest.raises(RuntimeError):
+        next(it)
+
+
+def test_prefetch_stops_producer_on_close():
+    produced = []
+
+    def listing():
+        for n in range(10**6):
+            produced.append(n)
+            yield n
+
+    it = prefetch(listing(), maxsize=2)
+    next(it)
+    it.close()
+    assert len(produced) < 10
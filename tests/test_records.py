@@ -0,0 +1,70 @@
+""" Verifica la representación compacta de InventoryItem y HashRecord.
+Las fechas (epoch) y los digests (bytes) deben volver exactamente a las mismas cadenas,
+de modo que inventario.json/csv y hashes.csv no cambian byte a byte. """
+
+import csv
+import datetime
+import io
+import json
+import sys
+
+from afrec.compact import pack_hex, pack_ts, unpack_hex, unpack_ts
+from afrec.explorer import INVENTORY_FIELDS, InventoryItem
+from afrec.integrity import HASH_RECORD_FIELDS, HashRecord
+from afrec.reports import write_csv
+
+SHA = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+ROW = {
+    "path_display": "/año/informe.pdf",
+    "id": "id:AAA",
+    "size": 12,
+    "client_modified": "2024-02-29T23:59:59",
+    "server_modified": "2025-01-02T03:04:05",
+    "rev": "015f0a1b2c3d",
+    "content_hash": SHA,
+}
+
+
+def test_timestamps_and_digests_round_trip():
+    for ts in ["2025-01-02T03:04:05", "1969-12-31T23:59:59", "2025-01-02T03:04:05.500000",
+               "2025-01-02T03:04:05+00:00", "", None]:
+        assert unpack_ts(pack_ts(ts)) == ts
+    assert isinstance(pack_ts("2025-01-02T03:04:05"), int)
+    dt = datetime.datetime(2025, 1, 2, 3, 4, 5)
+    assert unpack_ts(pack_ts(dt)) == dt.isoformat()
+    for h in [SHA, SHA.upper(), "d41d8cd98f00b204e9800998ecf8427e", "no-hex", "", None]:
+        assert unpack_hex(pack_hex(h)) == h
+    assert isinstance(pack_hex(SHA), bytes)
+
+
+def test_inventory_item_output_is_unchanged():
+    item = InventoryItem(**ROW)
+    assert item.to_dict() == ROW
+    assert item == InventoryItem(**ROW) and item != InventoryItem(**{**ROW, "rev": "x" * 9})
+    assert not hasattr(item, "__dict__")
+    assert json.dumps(item.to_dict(), ensure_ascii=False, indent=2) == json.dumps(
+        ROW, ensure_ascii=False, indent=2
+    )
+
+
+def test_hash_record_csv_is_unchanged(tmp_path):
+    legacy = {
+        "path_local": "cases/x/evidence/año/informe.pdf", "path_dropbox": ROW["path_display"],
+        "size": 12, "sha256": SHA, "md5": "d41d8cd98f00b204e9800998ecf8427e",
+        "dropbox_content_hash_local": SHA, "dropbox_content_hash_remote": SHA,
+        "server_modified": ROW["server_modified"], "rev": ROW["rev"], "id": ROW["id"],
+        "dropbox_hash_match": "yes",
+    }
+    rec = HashRecord(**legacy)
+    rec["dedup_of"] = "/otro.pdf"
+    legacy["dedup_of"] = "/otro.pdf"
+    assert dict(rec) == {**dict.fromkeys(HASH_RECORD_FIELDS), **legacy}
+    write_csv([rec], tmp_path / "new.csv", headers=HASH_RECORD_FIELDS)
+    write_csv([legacy], tmp_path / "old.csv", headers=HASH_RECORD_FIELDS)
+    assert (tmp_path / "new.csv").read_bytes() == (tmp_path / "old.csv").read_bytes()
+
+    row = next(csv.DictReader(io.StringIO((tmp_path / "old.csv").read_text("utf-8"))))
+    again = HashRecord.from_mapping(row)
+    assert again == rec and again["size"] == 12 and again.get("carried_from") is None
+    assert sys.getsizeof(rec) < sys.getsizeof(legacy)
+    assert list(InventoryItem(**ROW).to_dict()) == INVENTORY_FIELDS
@@ -0,0 +1,48 @@
+""" Verifica el reporte PDF con el anexo de hashes por archivo.
+Comprueba que el reporte se genera sin depender de la ruta del logo, que el anexo ocupa
+las páginas esperadas (una tabla por página, rutas largas en varias líneas) y que los
+anexos grandes se dividen en volúmenes. """
+
+import re
+from pathlib import Path
+
+from afrec.integrity import HASH_RECORD_FIELDS
+from afrec.reports import annex_volume_file, generate_pdf_report, write_csv
+
+
+def _pages(pdf: Path) -> int:
+    return len(re.findall(rb"/Type /Page\b", pdf.read_bytes()))
+
+
+def _hashes(path: Path, n: int, long_every: int = 0) -> Path:
+    rows = []
+    for i in range(n):
+        name = "x" * 120 if long_every and i % long_every == 0 else f"f{i}"
+        rows.append({"path_dropbox": f"/c/{name}", "size": i, "sha256": f"{i:064x}"})
+    write_csv(rows, path, headers=HASH_RECORD_FIELDS)
+    return path
+
+
+def test_report_without_logo_or_annex(tmp_path: Path):
+    out = tmp_path / "reporte.pdf"
+    files = generate_pdf_report(out, {"archivos": 0}, {"id": "s"}, logo_path=tmp_path / "no.png")
+    assert files == [out] and out.read_bytes().startswith(b"%PDF")
+
+
+def test_annex_pages_follow_line_budget(tmp_path: Path):
+    hashes = _hashes(tmp_path / "hashes.csv", 100, long_every=4)
+    out = tmp_path / "reporte.pdf"
+    generate_pdf_report(out, {"archivos": 100}, {"id": "s"}, hashes_csv=hashes, rows_per_page=25)
+    # 125 líneas (25 rutas largas ocupan dos) a 25 por página: 5 páginas de anexo
+    assert _pages(out) == 1 + 5
+
+
+def test_large_annex_is_split_in_volumes(tmp_path: Path):
+    hashes = _hashes(tmp_path / "hashes.csv", 120)
+    out = tmp_path / "reporte.pdf"
+    files = generate_pdf_report(
+        out, {"archivos": 120}, {"id": "s"}, hashes_csv=hashes, rows_per_page=20,
+        rows_per_volume=50, logo_path=None,
+    )
+    assert files == [out, annex_volume_file(out, 2), annex_volume_file(out, 3)]
+    assert [_pages(f) for f in files] == [1 + 3, 3, 1]
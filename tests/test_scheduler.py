@@ -0,0 +1,46 @@
+""" Verifica el planificador adaptativo de peticiones.
+Comprueba que:
+los errores permanentes (ApiError) no se reintentan,
+el backoff del servidor (RateLimitError.backoff) se respeta,
+la concurrencia se reduce a la mitad al ser limitado y se recupera con éxitos. """
+
+import pytest
+from dropbox.exceptions import ApiError, RateLimitError
+
+from afrec.scheduler import AdaptiveScheduler
+
+
+def test_permanent_error_fails_fast():
+    sleeps = []
+    s = AdaptiveScheduler(sleep=sleeps.append)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ApiError("req", "path/not_found", None, None)
+
+    with pytest.raises(ApiError):
+        s.run(fn)
+    assert len(calls) == 1 and sleeps == []
+    assert s.stats()["permanent_failures"] == 1
+
+
+def test_rate_limit_backoff_and_aimd():
+    sleeps = []
+    s = AdaptiveScheduler(max_concurrency=8, sleep=sleeps.append)
+    attempts = iter([RateLimitError("req", backoff=0.01), None])
+
+    def fn():
+        exc = next(attempts)
+        if exc:
+            raise exc
+        return "ok"
+
+    assert s.run(fn) == "ok"
+    assert sleeps == [0.01]
+    stats = s.stats()
+    assert stats["throttled"] == 1 and stats["retries"] == 1
+    assert s.limit == 4
+    for _ in range(40):
+        s.run(lambda: None)
+    assert s.limit == 8
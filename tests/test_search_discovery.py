@@ -0,0 +1,80 @@
+""" Verifica el descubrimiento por búsqueda en servidor (--discovery).
+Usa un cliente falso que lista y busca sobre el mismo árbol y comprueba que ambos
+motores producen el mismo inventario y que auto recurre al listado cuando una consulta
+alcanza el tope, que se cuenta por extensión y no sobre la suma. """
+
+import datetime
+import types
+
+from dropbox import files as F
+
+from afrec import explorer
+from afrec.explorer import discover_inventory, list_inventory, search_inventory
+
+D = datetime.datetime(2025, 1, 1)
+TREE = ["/a/1.pdf", "/a/x/2.PDF", "/b/3.docx", "/b/4.txt", "/otra/5.pdf"]
+
+
+def _file(p):
+    return F.FileMetadata(
+        name=p.rsplit("/", 1)[-1], id="id:" + p, client_modified=D, server_modified=D,
+        rev="0123456789", size=1, path_display=p, path_lower=p.lower(),
+    )
+
+
+class SearchDropbox:
+    def __init__(self):
+        self.searches = 0
+
+    def files_list_folder(self, path, recursive, include_non_downloadable_files, limit):
+        base = "" if path in ("", "/") else path
+        entries = [_file(p) for p in TREE if p.startswith(base + "/")]
+        return types.SimpleNamespace(entries=entries, has_more=False, cursor="c")
+
+    def files_search_v2(self, query, options):
+        self.searches += 1
+        return self._page(options.path or "", options.file_extensions[0], 0)
+
+    def files_search_continue_v2(self, cursor):
+        base, ext, n = cursor.split("|")
+        return self._page(base, ext, int(n))
+
+    def _page(self, base, ext, n):
+        hits = [p for p in TREE if p.startswith(base + "/") and p.lower().endswith("." + ext)]
+        # Una coincidencia por página para ejercitar files_search_continue_v2
+        matches = [F.SearchMatchV2(metadata=F.MetadataV2.metadata(_file(p))) for p in hits]
+        return F.SearchV2Result(
+            matches=matches[n:n + 1], has_more=n + 1 < len(matches), cursor=f"{base}|{ext}|{n + 1}"
+        )
+
+
+def test_search_matches_listing():
+    exts = ["pdf", ".docx"]
+    listed = list_inventory(SearchDropbox(), root="/", exts=exts)
+    found = search_inventory(SearchDropbox(), root="/", exts=exts)
+    assert sorted(i.path_display for i in found) == sorted(i.path_display for i in listed)
+    assert found == sorted(listed, key=lambda i: i.path_display.lower())
+
+    engine, items = discover_inventory(SearchDropbox(), root="/a", exts=exts)
+    assert engine == "search"
+    assert [i.path_display for i in items] == ["/a/1.pdf", "/a/x/2.PDF"]
+
+
+def test_cap_counts_each_extension_query(monkeypatch):
+    monkeypatch.setattr(explorer, "SEARCH_RESULT_CAP", 2)
+    # Dos coincidencias en total, una por consulta: ninguna llega al tope
+    found = search_inventory(SearchDropbox(), exts=[".docx", ".txt"])
+    assert [i.path_display for i in found] == ["/b/3.docx", "/b/4.txt"]
+    # .pdf por sí sola sí lo alcanza
+    assert search_inventory(SearchDropbox(), exts=[".docx", "pdf"]) is None
+
+
+def test_auto_falls_back_to_listing_at_cap(monkeypatch):
+    monkeypatch.setattr(explorer, "SEARCH_RESULT_CAP", 2)
+    engine, items = discover_inventory(SearchDropbox(), exts=[".pdf"])
+    assert engine == "list"
+    assert sorted(i.path_display for i in items) == ["/a/1.pdf", "/a/x/2.PDF", "/otra/5.pdf"]
+
+    dbx = SearchDropbox()
+    engine, _ = discover_inventory(dbx, exts=None)
+    assert engine == "list" and dbx.searches == 0
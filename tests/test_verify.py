@@ -0,0 +1,86 @@
+""" Verifica afrec verify (verify_case) sobre un caso construido en disco.
+Comprueba que un caso intacto verifica, que se detectan archivos faltantes, modificados,
+sobrantes e ilegibles, que las rutas se resuelven aunque el caso se haya movido (también con
+carpetas de Dropbox llamadas evidence) y que el hash con mmap coincide con la lectura
+normal. """
+
+import shutil
+from pathlib import Path
+
+from afrec.integrity import HASH_RECORD_FIELDS, build_hash_record, hash_file_multi
+from afrec.reports import write_csv
+from afrec.verify import verify_case
+
+FILES = {"/a/uno.txt": b"uno" * 1000, "/a/dos.bin": bytes(range(256)) * 300, "/tres": b""}
+
+
+def _make_case(root: Path, files=FILES) -> Path:
+    case = root / "cases" / "2025-01-01_abcd"
+    records = []
+    for p, data in files.items():
+        local = case / "evidence" / p.strip("/")
+        local.parent.mkdir(parents=True, exist_ok=True)
+        local.write_bytes(data)
+        records.append(build_hash_record(local, {"path_display": p, "size": len(data), "id": p}))
+    # Referencia deduplicada: otra ruta de Dropbox apunta al mismo archivo local
+    uno = case / "evidence" / "a" / "uno.txt"
+    records.append(build_hash_record(uno, {"path_display": "/copia", "size": 3000}))
+    write_csv(records, case / "hashes.csv", headers=HASH_RECORD_FIELDS)
+    return case
+
+
+def test_intact_case_verifies_after_move(tmp_path: Path):
+    case = _make_case(tmp_path / "original")
+    # Caso posterior (--since-case) cuyo único registro se trasladó del caso anterior
+    later = case.parent / "2025-02-01_ef01"
+    carried = build_hash_record(case / "evidence" / "tres", {"path_display": "/tres", "size": 0})
+    carried["carried_from"] = str(case)
+    write_csv([carried], later / "hashes.csv", headers=HASH_RECORD_FIELDS)
+
+    media = tmp_path / "medio_judicial"
+    shutil.copytree(case.parent, media)
+    shutil.rmtree(tmp_path / "original")
+    report = verify_case(media / case.name, workers=3, full=True)
+    assert report.intact and report.counts()["checked"] == 4 and report.ok == 4
+    assert verify_case(media / later.name).ok == 1
+
+
+def test_dropbox_folder_named_evidence(tmp_path: Path):
+    files = {**FILES, "/Legal/evidence/x.pdf": b"%PDF", "/evidence/y.txt": b"y"}
+    case = _make_case(tmp_path / "original", files)
+    report = verify_case(case)
+    assert report.intact and report.ok == 6
+    moved = tmp_path / "medio" / "copia_del_caso"
+    shutil.copytree(case, moved)
+    report = verify_case(moved)
+    assert report.intact and report.ok == 6
+
+
+def test_reports_missing_modified_and_extra(tmp_path: Path):
+    case = _make_case(tmp_path)
+    (case / "evidence" / "a" / "dos.bin").unlink()
+    (case / "evidence" / "tres").write_bytes(b"x")
+    (case / "evidence" / "a" / "nuevo.txt").write_bytes(b"?")
+    report = verify_case(case, workers=2)
+    assert not report.intact
+    assert report.missing == ["/a/dos.bin"]
+    assert [(m["path_dropbox"], m["field"]) for m in report.modified] == [("/tres", "size")]
+    assert report.extra == ["a/nuevo.txt"]
+
+
+def test_unreadable_entry_is_reported_not_fatal(tmp_path: Path):
+    case = _make_case(tmp_path)
+    # Un directorio en el lugar del archivo: open() falla con IsADirectoryError
+    (case / "evidence" / "a" / "dos.bin").unlink()
+    (case / "evidence" / "a" / "dos.bin").mkdir()
+    report = verify_case(case, workers=2)
+    assert not report.intact and report.ok == 3 and not report.missing
+    assert [u["path_dropbox"] for u in report.unreadable] == ["/a/dos.bin"]
+    assert "IsADirectoryError" in report.unreadable[0]["error"]
+
+
+def test_mmap_hash_matches_buffered_read(tmp_path: Path):
+    p = tmp_path / "grande.bin"
+    p.write_bytes(bytes(range(251)) * 40000)
+    mapped = hash_file_multi(p, chunk_size=65536, mmap_threshold=1).hexdigests()
+    assert mapped == hash_file_multi(p, mmap_threshold=None).hexdigests()